@@ -0,0 +1,258 @@
+import argparse
+import dataclasses
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Marker of the rows of snippets that exceeded their budget
+SKIPPED_BUDGET = 'skipped: budget'
+# Marker of the rows of snippets that failed in their worker
+SKIPPED_ERROR = 'skipped: error'
+
+
+@dataclasses.dataclass
+class Budget:
+    """
+    Limits of the resources that computing a single snippet may use, None for no limit.
+    """
+    # Wall-clock time in seconds
+    time_limit: Optional[float] = None
+    # Growth of the resident set size of the worker process in megabytes, over its size when the snippet started
+    memory_limit: Optional[float] = None
+
+    @property
+    def is_limited(self) -> bool:
+        return self.time_limit is not None or self.memory_limit is not None
+
+    @staticmethod
+    def from_args(args: argparse.Namespace) -> "Budget":
+        return Budget(time_limit=args.time_limit, memory_limit=args.memory_limit)
+
+
+def add_budget_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help='Wall-clock seconds a single snippet may take, otherwise it is skipped. '
+                             'Snippets are computed in worker processes that are killed if a limit is exceeded.')
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help='Megabytes of resident memory a worker may use for a single snippet on top of '
+                             'its memory when the snippet starts, otherwise the snippet is skipped. '
+                             'Only supported on Linux.')
+
+
+def get_rss(pid: int) -> Optional[int]:
+    """
+    :param pid: id of a process
+    :return: resident set size of the process in bytes, None if it is not known
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@dataclasses.dataclass
+class TaskResult:
+    # Index of the item of the task
+    index: int
+    value: Any = None
+    over_budget: bool = False
+    # Description of the error if the task failed
+    error: Optional[str] = None
+
+
+def _worker_main(
+        connection: Connection,
+        func: Callable[[Any], Any],
+        initializer: Optional[Callable[..., Any]],
+        initargs: Tuple,
+):
+    if initializer is not None:
+        initializer(*initargs)
+    # Tasks are only sent to ready workers, so the initialization does not count to the budget of a task
+    connection.send(None)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        index, item = task
+        try:
+            connection.send(TaskResult(index, value=func(item)))
+        except Exception as e:
+            connection.send(TaskResult(index, error=f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, context, func, initializer, initargs):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_connection, func, initializer, initargs), daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.alive = True
+        # Resident set size when the current task was sent, the memory budget of the task is on top of it
+        self.base_rss = 0
+        # Index of the current task and when it was sent
+        self.task: Optional[int] = None
+        self.started = 0.0
+
+    def send(self, index: int, item: Any):
+        self.base_rss = get_rss(self.process.pid) or 0
+        self.connection.send((index, item))
+        self.task = index
+        self.started = time.monotonic()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+        self.alive = False
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+        self.alive = False
+
+
+class BudgetedPool:
+    """
+    Pool of worker processes that computes a function for every item within a budget.
+    A worker that exceeds the budget with an item is killed and replaced by a new worker, the item is
+    reported as over budget. So a single snippet that blows up cannot stall the whole run.
+
+    Unlike a ``ProcessPoolExecutor``, a worker only gets one item at a time, so that a killed worker
+    does not take other items with it.
+    """
+
+    # Seconds between two checks of the budgets
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+            self,
+            func: Callable[[Any], Any],
+            budget: Budget,
+            workers: int = 1,
+            initializer: Callable[..., Any] = None,
+            initargs: Tuple = (),
+            mp_context=None,
+    ):
+        """
+        :param func: the function computing an item in a worker, it must be picklable
+        :param budget: limits of a single item
+        :param workers: number of worker processes
+        :param initializer: called in every worker when it starts, e.g. to warm it up
+        :param initargs: arguments of the initializer
+        :param mp_context: multiprocessing context that starts the workers, by default the default context
+        """
+        self.func = func
+        self.budget = budget
+        self.workers = max(workers, 1)
+        self.initializer = initializer
+        self.initargs = initargs
+        self._context = mp_context if mp_context is not None else multiprocessing.get_context()
+
+    def imap(self, items: Iterable[Any], ordered: bool = True) -> Iterator[TaskResult]:
+        """
+        Compute the function for all items.
+        :param items: the items
+        :param ordered: yield the results in the order of the items, otherwise in the order they are finished
+        :return: iterator of the results
+        """
+        pending = deque(enumerate(items))
+        workers = [self._start_worker() for _ in range(min(self.workers, len(pending)))]
+        # Results that are finished before the results in front of them
+        finished: Dict[int, TaskResult] = {}
+        next_index = 0
+        try:
+            while workers:
+                results = self._receive(workers) + self._enforce_budget(workers)
+                workers = self._schedule(workers, pending)
+                for result in results:
+                    if not ordered:
+                        yield result
+                        continue
+                    finished[result.index] = result
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+        finally:
+            for worker in workers:
+                if worker.alive:
+                    worker.kill()
+
+    def _start_worker(self) -> _Worker:
+        return _Worker(self._context, self.func, self.initializer, self.initargs)
+
+    def _receive(self, workers: List[_Worker]) -> List[TaskResult]:
+        results = []
+        connections = wait([worker.connection for worker in workers], timeout=self.POLL_INTERVAL)
+        for worker in workers:
+            if worker.connection not in connections:
+                continue
+            try:
+                message = worker.connection.recv()
+            except EOFError:
+                # Crashed without a result, e.g. in libclang
+                worker.process.join()
+                worker.connection.close()
+                worker.alive = False
+                if not worker.ready:
+                    raise RuntimeError(f'Worker failed to start with exit code {worker.process.exitcode}')
+                if worker.task is not None:
+                    results.append(TaskResult(
+                        worker.task, error=f'Worker died with exit code {worker.process.exitcode}'))
+                continue
+            if message is None:
+                worker.ready = True
+            else:
+                results.append(message)
+                worker.task = None
+        return results
+
+    def _enforce_budget(self, workers: List[_Worker]) -> List[TaskResult]:
+        results = []
+        now = time.monotonic()
+        for worker in workers:
+            if not worker.alive or worker.task is None:
+                continue
+            over_time = self.budget.time_limit is not None and now - worker.started > self.budget.time_limit
+            over_memory = False
+            if self.budget.memory_limit is not None:
+                rss = get_rss(worker.process.pid)
+                over_memory = rss is not None and rss - worker.base_rss > self.budget.memory_limit * 1024 * 1024
+            if over_time or over_memory:
+                results.append(TaskResult(worker.task, over_budget=True))
+                worker.kill()
+        return results
+
+    def _schedule(self, workers: List[_Worker], pending: Deque[Tuple[int, Any]]) -> List[_Worker]:
+        """
+        Send the pending items to the idle workers, replace the dead workers and stop the workers
+        that are not needed anymore.
+        :return: the workers that are still running
+        """
+        running = []
+        for worker in workers:
+            if not worker.alive:
+                if pending:
+                    running.append(self._start_worker())
+                continue
+            if worker.ready and worker.task is None:
+                if not pending:
+                    worker.stop()
+                    continue
+                worker.send(*pending.popleft())
+            running.append(worker)
+        return running
@@ -5,6 +5,7 @@ import extract_readability_cmd
 import metrics_cmd
 import readability_cmd
 from cli_cmd import Command
+from code_processing.clang_index import INDEX_POOL
 
 command_executors = {
     str(Command.CRAWL): crawl_cmd,
@@ -34,7 +35,12 @@ def _parse_args() -> argparse.Namespace:
 def run_cli():
     args = _parse_args()
     assert args.command in command_executors, f'Not supported command: {args.command}'
-    command_executors[args.command].run(args)
+    try:
+        command_executors[args.command].run(args)
+    finally:
+        print(f'Created {INDEX_POOL.indexes_created} clang indexes and '
+              f'{INDEX_POOL.translation_units_created} translation units')
+        INDEX_POOL.dispose()
 
 
 if __name__ == '__main__':
@@ -1,13 +1,86 @@
 import re
-from typing import List
+from typing import List, Tuple, Optional
+
+import numpy as np
 
 from code_processing import filter_manager, bodycomment
+from code_processing.lexer import SourceLocator, TokenTable
 
 
 class CodeAnalyzer:
+    # Tokens ending or starting with one of these characters cannot merge with an adjacent token
+    _SEPARATING_CHARACTERS = ';,(){}[]?~'
+    # Whitespace and line splices between tokens
+    _BLANK_PATTERN = re.compile(r'(?:\s|\\[ \t\v\f]*(?:\r\n|\n\r|\n|\r))*')
+
     def delete_comments(self, code: str) -> str:
+        return ''.join(code[start:end] for start, end in self.get_comment_free_ranges(code))
+
+    def get_comment_free_ranges(self, code: str) -> List[Tuple[int, int]]:
+        """
+        Get the ranges of code that are kept when deleting comments.
+        :param code: the code
+        :return: sorted list of start (inclusive) and end (exclusive) positions
+        """
         raise NotImplementedError()
 
+    def delete_comments_from_tokens(self, code: str, tokens: TokenTable) -> Optional[TokenTable]:
+        """
+        Derive the tokens of the code without comments from the tokens of the code,
+        i.e. deleted tokens are dropped and the locations of the others are remapped.
+        :param code: the code
+        :param tokens: tokens of the code
+        :return: the tokens of ``delete_comments(code)`` or None if deleting cuts a token or joins two tokens,
+        then the code without comments has to be lexed again
+        """
+        ranges = self.get_comment_free_ranges(code)
+        if ranges == [(0, len(code))]:
+            return tokens
+        if len(ranges) == 0:
+            return tokens.take(np.zeros(len(tokens), dtype=bool))
+
+        # Adjacent tokens may be lexed differently
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            left, right = code[end - 1], code[start]
+            if not (left.isspace() or right.isspace()
+                    or left in self._SEPARATING_CHARACTERS or right in self._SEPARATING_CHARACTERS):
+                return None
+
+        range_starts = np.array([start for start, _ in ranges], dtype=np.int64)
+        range_ends = np.array([end for _, end in ranges], dtype=np.int64)
+        new_range_starts = np.concatenate([[0], np.cumsum(range_ends - range_starts)])[:-1]
+
+        locator = SourceLocator(code)
+        starts = locator.to_positions(tokens.start_offsets.astype(np.int64))
+        ends = locator.to_positions(tokens.end_offsets.astype(np.int64))
+
+        # The only range that may contain a token is the first range that ends after the token start
+        range_indices = np.searchsorted(range_ends, starts, side='right')
+        in_range = range_indices < len(ranges)
+        range_indices = np.minimum(range_indices, len(ranges) - 1)
+        kept = in_range & (ends > range_starts[range_indices])
+        if np.any(kept & ((starts < range_starts[range_indices]) | (ends > range_ends[range_indices]))):
+            return None
+
+        new_code = ''.join(code[start:end] for start, end in ranges)
+        new_starts = new_range_starts[range_indices[kept]] + starts[kept] - range_starts[range_indices[kept]]
+        new_ends = new_starts + ends[kept] - starts[kept]
+
+        # Code between tokens that was not lexed before (e.g. in an unterminated comment) may be lexed now
+        gap_starts = np.concatenate([[0], new_ends])
+        gap_ends = np.concatenate([new_starts, [len(new_code)]])
+        for gap_start, gap_end in zip(gap_starts.tolist(), gap_ends.tolist()):
+            if gap_start < gap_end and not self._BLANK_PATTERN.fullmatch(new_code, gap_start, gap_end):
+                return None
+
+        new_locator = SourceLocator(new_code)
+        return TokenTable.from_columns(
+            [value for value, keep in zip(tokens.values, kept.tolist()) if keep],
+            tokens.kinds[kept],
+            *new_locator.locate(new_starts),
+            *new_locator.locate(new_ends),
+        )
+
     def delete_inline_comments(self, code: str) -> str:
         raise NotImplementedError()
 
@@ -42,11 +115,63 @@ class CodeAnalyzer:
 
 
 class CppCodeAnalyzer(CodeAnalyzer):
-    def delete_comments(self, code: str) -> str:
-        return self.workaround_remove_comments(self.delete_inline_comments(code))
+    _INLINE_COMMENT_PATTERN = re.compile(r'(?://[^\n]*\n)')
+
+    def __init__(self):
+        self._comment_free_ranges = (None, [])
+
+    def get_comment_free_ranges(self, code: str) -> List[Tuple[int, int]]:
+        """
+        The inline comments are deleted first, then the multiline comments of the remaining code.
+        The ranges of the last code are cached since all features of a snippet delete its comments.
+        """
+        cached_code, ranges = self._comment_free_ranges
+        if cached_code == code:
+            return ranges
+
+        ranges = self._delete_ranges(
+            [(0, len(code))], [match.span() for match in self._INLINE_COMMENT_PATTERN.finditer(code)])
+        if '/*' in code:
+            code_without_inline_comments = ''.join(code[start:end] for start, end in ranges)
+            multiline_comments = [
+                (start, end + 1)
+                for start, end in self.workaround_get_comments_ranges(code_without_inline_comments, True)
+            ]
+            ranges = self._delete_ranges(ranges, multiline_comments)
+
+        self._comment_free_ranges = (code, ranges)
+        return ranges
+
+    @staticmethod
+    def _delete_ranges(ranges: List[Tuple[int, int]], deleted: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Delete parts of a code that consists of ranges of an original code.
+        :param ranges: ranges of the original code that form the code
+        :param deleted: sorted ranges of the code (not the original code) to delete
+        :return: ranges of the original code that remain
+        """
+        result = []
+        deleted_index = 0
+        code_start = 0
+        for start, end in ranges:
+            code_end = code_start + end - start
+            pos = code_start
+            while deleted_index < len(deleted) and deleted[deleted_index][0] < code_end:
+                deleted_start, deleted_end = deleted[deleted_index]
+                if deleted_start > pos:
+                    result.append((start + pos - code_start, start + deleted_start - code_start))
+                pos = max(pos, deleted_end)
+                if deleted_end > code_end:
+                    # Continues in the next range
+                    break
+                deleted_index += 1
+            if pos < code_end:
+                result.append((start + pos - code_start, end))
+            code_start = code_end
+        return result
 
     def delete_inline_comments(self, code: str) -> str:
-        return re.sub(r'(?://[^\n]*\n)', '', code)
+        return self._INLINE_COMMENT_PATTERN.sub('', code)
 
     def get_identifiers_from_source(self, source_code: str) -> List[str]:
         keywords = bodycomment.get_cpp_keywords()
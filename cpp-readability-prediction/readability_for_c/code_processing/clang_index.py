@@ -0,0 +1,92 @@
+import os
+import threading
+from typing import List, Tuple, Dict
+
+import clang.cindex
+
+
+class ClangIndexPool:
+    """
+    Pool of clang indexes that live for the whole run, one index per thread.
+
+    Creating and disposing an index for every parsed snippet is measurable overhead on large runs,
+    so lexers and parsers share the indexes of this pool instead.
+    The pool also counts how many indexes and translation units were created.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._indexes: List[clang.cindex.Index] = []
+        self._indexes_created = 0
+        self._translation_units_created = 0
+
+    @property
+    def indexes_created(self) -> int:
+        return self._indexes_created
+
+    @property
+    def translation_units_created(self) -> int:
+        return self._translation_units_created
+
+    def get_index(self) -> clang.cindex.Index:
+        """
+        Get the index of the current thread, the index is created on the first call.
+        :return: the index of the current thread
+        """
+        index = getattr(self._local, 'index', None)
+        if index is None:
+            index = clang.cindex.Index.create()
+            self._local.index = index
+            with self._lock:
+                self._indexes.append(index)
+                self._indexes_created += 1
+        return index
+
+    def parse(
+            self,
+            path: str,
+            args: List[str] = None,
+            unsaved_files: List[Tuple[str, str]] = None,
+            options: int = 0,
+    ) -> clang.cindex.TranslationUnit:
+        """
+        Parse a translation unit with the index of the current thread.
+        Arguments are the same as ``clang.cindex.Index.parse``.
+        """
+        tu = self.get_index().parse(path, args, unsaved_files, options)
+        with self._lock:
+            self._translation_units_created += 1
+        return tu
+
+    def dispose(self):
+        """
+        Release the indexes of all threads. An index is disposed by libclang as soon as the translation units
+        created by it are released. Later parses create new indexes.
+        """
+        with self._lock:
+            self._indexes.clear()
+            self._local = threading.local()
+
+    def reset_after_fork(self):
+        """
+        Forget the indexes of the parent process in a forked child, the child creates its own indexes.
+        The lock is replaced too, since it might have been held by another thread of the parent.
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._indexes = []
+        self._indexes_created = 0
+        self._translation_units_created = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'indexes_created': self._indexes_created,
+            'translation_units_created': self._translation_units_created,
+            'indexes_alive': len(self._indexes),
+        }
+
+
+# Shared by all lexers and parsers of the process
+INDEX_POOL = ClangIndexPool()
+os.register_at_fork(after_in_child=INDEX_POOL.reset_after_fork)
@@ -0,0 +1,128 @@
+import dataclasses
+import json
+import os
+import shlex
+from pathlib import Path
+from typing import Dict, List
+
+# Suffixes of the C++ translation units of a compilation database, other languages are not parsed
+CPP_SUFFIXES = ('.cpp', '.cc', '.cxx', '.c++')
+
+# Options of the compiler that only affect its outputs, with the number of values they take
+OUTPUT_OPTIONS = {
+    '-c': 0, '-M': 0, '-MM': 0, '-MD': 0, '-MMD': 0, '-MP': 0, '-MG': 0,
+    '-o': 1, '-MF': 1, '-MT': 1, '-MQ': 1,
+}
+
+# Options that add system include paths, they take a value either joined or as next argument
+SYSTEM_INCLUDE_OPTIONS = ('-isystem', '-idirafter', '-isysroot', '--sysroot')
+
+# Options whose value is a path, they take a value either joined or as next argument.
+# Longer options come first, since the joined form is detected by the prefix.
+PATH_OPTIONS = ('-isystem', '-iquote', '-idirafter', '-isysroot', '-include', '-imacros', '--sysroot', '-I', '-F')
+
+
+@dataclasses.dataclass
+class CompileCommand:
+    # Absolute path of the translation unit
+    file: Path
+    # Working directory of the compiler, relative paths of the file and the arguments are relative to it
+    directory: Path
+    # Arguments of the compiler without the compiler itself
+    arguments: List[str]
+
+
+class CompilationDatabase:
+    """
+    Compilation database (``compile_commands.json``) of a project, as written by CMake, Bear or similar tools.
+    It lists the translation units that are built together with the flags they are compiled with, so that
+    only these files are parsed and their includes and macros are resolved like in the build.
+    """
+
+    def __init__(self, commands: List[CompileCommand], drop_system_includes: bool = False):
+        """
+        :param commands: the commands of the database, only the first command of every file is used
+        :param drop_system_includes: do not resolve includes of system headers, including the standard library.
+        Parsing is much faster, but the types of system headers are unknown.
+        """
+        self.drop_system_includes = drop_system_includes
+        self._commands: Dict[Path, CompileCommand] = {}
+        for command in commands:
+            self._commands.setdefault(command.file, command)
+
+    @classmethod
+    def load(cls, path: Path, drop_system_includes: bool = False) -> "CompilationDatabase":
+        """
+        :param path: path of a ``compile_commands.json`` or of the directory that contains it
+        :param drop_system_includes: see ``__init__``
+        :return: the compilation database
+        """
+        if path.is_dir():
+            path = path / 'compile_commands.json'
+        with path.open() as f:
+            entries = json.load(f)
+
+        commands = []
+        for entry in entries:
+            directory = Path(entry['directory'])
+            arguments = entry['arguments'] if 'arguments' in entry else shlex.split(entry['command'])
+            commands.append(CompileCommand(
+                file=Path(os.path.normpath(directory / entry['file'])),
+                directory=directory,
+                arguments=arguments[1:],
+            ))
+        return cls(commands, drop_system_includes)
+
+    def get_translation_units(self, input_path: Path) -> List[Path]:
+        """
+        Get the C++ translation units below a directory, the largest files first. Then parsing threads that
+        take the next file when they are done are balanced, since no large file is left over at the end.
+        :param input_path: the directory
+        :return: paths of the translation units that exist
+        """
+        cpp_files = [
+            cpp_file for cpp_file in self._commands
+            if cpp_file.suffix in CPP_SUFFIXES and cpp_file.is_relative_to(input_path) and cpp_file.is_file()
+        ]
+        # The path breaks ties, so the order does not depend on the order of the database
+        return sorted(cpp_files, key=lambda cpp_file: (-cpp_file.stat().st_size, str(cpp_file)))
+
+    def get_clang_args(self, cpp_file: Path) -> List[str]:
+        """
+        Get the arguments of clang that parse a translation unit like the compiler of the build.
+        The outputs of the compiler and the translation unit itself are removed from its arguments.
+        :param cpp_file: path of a translation unit of the database
+        :return: the arguments
+        """
+        command = self._commands[cpp_file]
+        # The code is parsed from memory, so quoted includes are resolved with the directory of the file
+        clang_args = ['-x', 'c++', f'-iquote{cpp_file.parent}']
+        arguments = iter(command.arguments)
+        for argument in arguments:
+            if argument in OUTPUT_OPTIONS:
+                for _ in range(OUTPUT_OPTIONS[argument]):
+                    next(arguments, None)
+                continue
+            if self.drop_system_includes and argument.startswith(SYSTEM_INCLUDE_OPTIONS):
+                if argument in SYSTEM_INCLUDE_OPTIONS:
+                    next(arguments, None)
+                continue
+            if not argument.startswith('-') and Path(os.path.normpath(command.directory / argument)) == cpp_file:
+                continue
+            if argument in PATH_OPTIONS:
+                clang_args += [argument, self._get_absolute_path(command, next(arguments, ''))]
+                continue
+            option = next((option for option in PATH_OPTIONS if argument.startswith(option)), None)
+            if option is not None:
+                value = argument[len(option):]
+                separator = '=' if value.startswith('=') else ''
+                argument = option + separator + self._get_absolute_path(command, value[len(separator):])
+            clang_args.append(argument)
+        if self.drop_system_includes:
+            clang_args += ['-nostdinc', '-nostdinc++']
+        return clang_args
+
+    @staticmethod
+    def _get_absolute_path(command: CompileCommand, path: str) -> str:
+        # Clang resolves relative paths with the working directory of the process, not the one of the command
+        return os.path.normpath(command.directory / path)
@@ -0,0 +1,247 @@
+import re
+from typing import Generator, List, Tuple
+
+import clang.cindex
+
+from code_processing.lexer import Lexer, Token, CLangLexer, SourceLocator, TokenTable
+
+
+class FastCppLexer(Lexer):
+    """
+    Pure-Python C++ lexer that emits the same tokens as ``CLangLexer`` without loading libclang.
+
+    It follows the raw lexer of clang that libclang uses for tokenizing: comments, (raw) string and character
+    literals with encoding prefixes and user-defined suffixes, preprocessing numbers, identifiers, keywords of the
+    default C++ dialect of clang (gnu++17) and punctuators. Kinds are classified by ``CLangLexer.classify_token``,
+    so operators, strings and numbers are recognized exactly the same. Locations use byte offsets and columns
+    as clang does.
+
+    Known difference from clang: non-ASCII characters outside literals and comments are always part of an
+    identifier, clang only accepts the characters allowed in identifiers by the standard.
+    """
+
+    KEYWORDS = frozenset([
+        'alignas', 'alignof', 'and', 'and_eq', 'asm', 'auto', 'bitand', 'bitor', 'bool', 'break', 'case',
+        'catch', 'char', 'char16_t', 'char32_t', 'class', 'compl', 'const', 'const_cast', 'constexpr',
+        'continue', 'decltype', 'default', 'delete', 'do', 'double', 'dynamic_cast', 'else', 'enum',
+        'explicit', 'export', 'extern', 'false', 'float', 'for', 'friend', 'goto', 'if', 'inline', 'int',
+        'long', 'mutable', 'namespace', 'new', 'noexcept', 'not', 'not_eq', 'nullptr', 'operator', 'or',
+        'or_eq', 'private', 'protected', 'public', 'register', 'reinterpret_cast', 'return', 'short',
+        'signed', 'sizeof', 'static', 'static_assert', 'static_cast', 'struct', 'switch', 'template',
+        'this', 'thread_local', 'throw', 'true', 'try', 'typedef', 'typeid', 'typename', 'typeof', 'union',
+        'unsigned', 'using', 'virtual', 'void', 'volatile', 'wchar_t', 'while', 'xor', 'xor_eq',
+        # Extensions of clang, including built-in type traits
+        '_Alignas', '_Alignof', '_Atomic', '_BitInt', '_Complex', '_Decimal128', '_Decimal32', '_Decimal64',
+        '_ExtInt', '_Float16', '_Generic', '_Imaginary', '_Nonnull', '_Noreturn', '_Null_unspecified',
+        '_Nullable', '_Nullable_result', '_Static_assert', '_Thread_local', '__FUNCTION__',
+        '__PRETTY_FUNCTION__', '__add_lvalue_reference', '__add_pointer', '__add_rvalue_reference',
+        '__alignof', '__alignof__', '__arm_in', '__arm_inout', '__arm_locally_streaming', '__arm_new',
+        '__arm_out', '__arm_preserves', '__arm_streaming', '__arm_streaming_compatible', '__array_extent',
+        '__array_rank', '__asm', '__asm__', '__attribute', '__attribute__', '__auto_type', '__bf16',
+        '__builtin_COLUMN', '__builtin_FILE', '__builtin_FILE_NAME', '__builtin_FUNCTION', '__builtin_LINE',
+        '__builtin_available', '__builtin_bit_cast', '__builtin_choose_expr', '__builtin_convertvector',
+        '__builtin_offsetof', '__builtin_omp_required_simd_align', '__builtin_source_location',
+        '__builtin_va_arg', '__builtin_vectorelements', '__can_pass_in_regs', '__cdecl', '__char16_t',
+        '__char32_t', '__complex', '__complex__', '__const', '__const__', '__datasizeof', '__decay',
+        '__decltype', '__extension__', '__fastcall', '__float128', '__fp16', '__func__', '__funcref',
+        '__has_nothrow_assign', '__has_nothrow_constructor', '__has_nothrow_copy',
+        '__has_nothrow_move_assign', '__has_trivial_assign', '__has_trivial_constructor',
+        '__has_trivial_copy', '__has_trivial_destructor', '__has_trivial_move_assign',
+        '__has_trivial_move_constructor', '__has_unique_object_representations', '__has_virtual_destructor',
+        '__ibm128', '__imag', '__imag__', '__inline', '__inline__', '__int128', '__is_abstract',
+        '__is_aggregate', '__is_arithmetic', '__is_array', '__is_assignable', '__is_base_of',
+        '__is_bounded_array', '__is_class', '__is_complete_type', '__is_compound', '__is_const',
+        '__is_constructible', '__is_convertible', '__is_convertible_to', '__is_destructible', '__is_empty',
+        '__is_enum', '__is_final', '__is_floating_point', '__is_function', '__is_fundamental',
+        '__is_integral', '__is_literal', '__is_literal_type', '__is_lvalue_expr', '__is_lvalue_reference',
+        '__is_member_function_pointer', '__is_member_object_pointer', '__is_member_pointer',
+        '__is_nothrow_assignable', '__is_nothrow_constructible', '__is_nothrow_destructible',
+        '__is_nullptr', '__is_object', '__is_pod', '__is_pointer', '__is_polymorphic', '__is_reference',
+        '__is_referenceable', '__is_rvalue_expr', '__is_rvalue_reference', '__is_same', '__is_same_as',
+        '__is_scalar', '__is_scoped_enum', '__is_signed', '__is_standard_layout', '__is_trivial',
+        '__is_trivially_assignable', '__is_trivially_constructible', '__is_trivially_copyable',
+        '__is_trivially_destructible', '__is_trivially_equality_comparable', '__is_trivially_relocatable',
+        '__is_unbounded_array', '__is_union', '__is_unsigned', '__is_void', '__is_volatile', '__label__',
+        '__make_signed', '__make_unsigned', '__module_private__', '__null', '__nullptr', '__objc_no',
+        '__objc_yes', '__pascal', '__private_extern__', '__real', '__real__',
+        '__reference_binds_to_temporary', '__reference_constructs_from_temporary', '__regcall',
+        '__remove_all_extents', '__remove_const', '__remove_cv', '__remove_cvref', '__remove_extent',
+        '__remove_pointer', '__remove_reference_t', '__remove_restrict', '__remove_volatile', '__restrict',
+        '__restrict__', '__signed', '__signed__', '__stdcall', '__thiscall', '__thread', '__typeof',
+        '__typeof__', '__underlying_type', '__vectorcall', '__volatile', '__volatile__'
+    ])
+
+    # Standard suffixes of user-defined string literals, other suffixes must start with an underscore
+    # or a non-ASCII character
+    _STANDARD_UD_SUFFIXES = frozenset(['s', 'sv', 'h', 'min', 'ms', 'us', 'ns', 'if', 'i', 'il'])
+
+    _PUNCTUATORS = [
+        '%:%:',
+        '->*', '...', '<<=', '>>=',
+        '->', '++', '--', '<<', '>>', '<=', '>=', '==', '!=', '&&', '||', '*=', '/=', '%=', '+=', '-=', '&=', '^=',
+        '|=', '##', '::', '.*', '<:', ':>', '<%', '%>', '%:',
+        '[', ']', '(', ')', '{', '}', '.', '&', '*', '+', '-', '~', '!', '/', '%', '<', '>', '^', '|', '?', ':', ';',
+        '=', ',', '#', '@',
+    ]
+
+    _ENCODING_PREFIX = '(?:u8|u|U|L)?'
+    _IDENTIFIER = '[A-Za-z_$\\u0080-\\U0010FFFF][A-Za-z0-9_$\\u0080-\\U0010FFFF]*'
+    _UD_SUFFIX = '[A-Za-z_\\u0080-\\U0010FFFF][A-Za-z0-9_\\u0080-\\U0010FFFF]*'
+    TOKEN_PATTERN = re.compile('|'.join([
+        r'(?P<whitespace>\s+)',
+        r'(?P<comment>//[^\r\n]*|/\*[\s\S]*?\*/)',
+        r'(?P<unterminated_comment>/\*[\s\S]*)',
+        rf'(?P<raw_string>{_ENCODING_PREFIX}R"(?P<delimiter>[^ ()\\\t\v\f\n]{{0,16}})\([\s\S]*?\)(?P=delimiter)")'
+        rf'(?P<raw_string_suffix>{_UD_SUFFIX})?',
+        # Unterminated raw strings are lexed until the end of file, raw strings with an invalid delimiter
+        # until the next double quote
+        rf'(?P<unterminated_raw_string>{_ENCODING_PREFIX}R"[^ ()\\\t\v\f\n]{{0,16}}\([\s\S]*)',
+        rf'(?P<invalid_raw_string>{_ENCODING_PREFIX}R"[^"]*"?)',
+        rf'(?P<string>{_ENCODING_PREFIX}"(?:[^"\\\r\n]|\\[\s\S])*")(?P<string_suffix>{_UD_SUFFIX})?',
+        rf'(?P<char>{_ENCODING_PREFIX}\'(?:[^\'\\\r\n]|\\[\s\S])+\')(?P<char_suffix>{_UD_SUFFIX})?',
+        # Unterminated string and character literals are lexed until the end of line, empty characters as one token
+        rf'(?P<unterminated_literal>{_ENCODING_PREFIX}(?:\'\'|["\'][^\r\n]*))',
+        r'(?P<number>\.?[0-9](?:[eEpP][+-]|\'[0-9A-Za-z_]|[0-9A-Za-z_.\u0080-\U0010FFFF])*)',
+        rf'(?P<identifier>{_IDENTIFIER})',
+        '(?P<punctuator>' + '|'.join(re.escape(p) for p in _PUNCTUATORS) + ')',
+        r'(?P<unknown>.)',
+    ]))
+
+    # As in clang, whitespace between the backslash and the newline is allowed
+    _LINE_SPLICE_PATTERN = re.compile(r'\\[ \t\v\f]*(?:\r\n|\n\r|\n|\r)')
+
+    @property
+    def file_ext(self):
+        return 'cpp'
+
+    def lex(self, sourcefile_path) -> Generator[Token, None, None]:
+        with open(sourcefile_path) as f:
+            code = f.read()
+        yield from self.lexing(code)
+
+    def lexing(self, code: str) -> TokenTable:
+        if self._LINE_SPLICE_PATTERN.search(code) is None:
+            spans = self._scan(code)
+        else:
+            spans = self._scan_with_line_splices(code)
+
+        values = []
+        kinds = []
+        for clang_kind, start, end in spans:
+            value = code[start:end]
+            if clang_kind in [clang.cindex.TokenKind.IDENTIFIER, clang.cindex.TokenKind.KEYWORD]:
+                # clang spells identifiers without line splices
+                value = self._LINE_SPLICE_PATTERN.sub('', value)
+            values.append(value)
+            kinds.append(CLangLexer.classify_token(clang_kind, value).value)
+
+        locator = SourceLocator(code)
+        start_lines, start_columns, start_offsets = locator.locate([start for _, start, _ in spans])
+        end_lines, end_columns, end_offsets = locator.locate([end for _, _, end in spans])
+        return TokenTable.from_columns(
+            values, kinds, start_lines, start_columns, start_offsets, end_lines, end_columns, end_offsets)
+
+    def _scan(self, code: str) -> List[Tuple[clang.cindex.TokenKind, int, int]]:
+        """
+        Find the tokens of code without line splices.
+        :param code: the code
+        :return: list of clang kind, start and end position of every token
+        """
+        spans = []
+        pos = 0
+        while pos < len(code):
+            match = self.TOKEN_PATTERN.match(code, pos)
+            group = match.lastgroup
+            end = match.end()
+            clang_kind = None
+
+            if group == 'whitespace' or group == 'unterminated_comment':
+                pass
+            elif group == 'comment':
+                clang_kind = clang.cindex.TokenKind.COMMENT
+            elif group in ['raw_string', 'string', 'char', 'raw_string_suffix', 'string_suffix', 'char_suffix']:
+                end = self._literal_end(match)
+                clang_kind = clang.cindex.TokenKind.LITERAL
+            elif group == 'number':
+                clang_kind = clang.cindex.TokenKind.LITERAL
+                end = self._number_end(code, pos, end)
+            elif group == 'identifier':
+                keyword = match.group() in self.KEYWORDS
+                clang_kind = clang.cindex.TokenKind.KEYWORD if keyword else clang.cindex.TokenKind.IDENTIFIER
+            elif group == 'punctuator':
+                clang_kind = clang.cindex.TokenKind.PUNCTUATION
+                # C++11: "<::" is lexed as "<" and "::" unless it is followed by ':' or '>'
+                if (match.group() == '<:' and code.startswith(':', end)
+                        and not code.startswith(':', end + 1) and not code.startswith('>', end + 1)):
+                    end -= 1
+            else:
+                clang_kind = clang.cindex.TokenKind.PUNCTUATION
+
+            if clang_kind is not None:
+                spans.append((clang_kind, pos, end))
+            pos = end
+        return spans
+
+    def _scan_with_line_splices(self, code: str) -> List[Tuple[clang.cindex.TokenKind, int, int]]:
+        """
+        Find the tokens of code that contains line splices (backslash-newline).
+        The code is scanned without the line splices, then the tokens are mapped back to the original code.
+        As in clang, line splices right before a token are a part of the token.
+        """
+        spliced_code = ''
+        origins = []
+        pos = 0
+        for match in self._LINE_SPLICE_PATTERN.finditer(code):
+            spliced_code += code[pos:match.start()]
+            origins.extend(range(pos, match.start()))
+            pos = match.end()
+        spliced_code += code[pos:]
+        origins.extend(range(pos, len(code)))
+
+        spans = []
+        for clang_kind, start, end in self._scan(spliced_code):
+            original_start = origins[start - 1] + 1 if start > 0 else 0
+            original_end = origins[end - 1] + 1
+            # Line comments and unterminated literals include the splices up to the end of line
+            if self._runs_to_line_end(spliced_code, start):
+                original_end = origins[end] if end < len(spliced_code) else len(code)
+            spans.append((clang_kind, original_start, original_end))
+        return spans
+
+    @classmethod
+    def _runs_to_line_end(cls, code: str, start: int) -> bool:
+        match = cls.TOKEN_PATTERN.match(code, start)
+        if match.lastgroup == 'comment':
+            return match.group().startswith('//')
+        return match.lastgroup == 'unterminated_raw_string' or (
+            match.lastgroup == 'unterminated_literal' and not match.group().endswith("''"))
+
+    @classmethod
+    def _literal_end(cls, match: re.Match) -> int:
+        """
+        A user-defined suffix is only a part of a string or character literal if it starts with
+        an underscore or a non-ASCII character. Suffixes of string literals are also accepted if they begin with
+        a suffix of the standard library.
+        """
+        for literal_group in ['raw_string', 'string', 'char']:
+            suffix = match.group(f'{literal_group}_suffix')
+            if match.group(literal_group) is not None:
+                if suffix is None or suffix.startswith('_') or not suffix[0].isascii():
+                    return match.end()
+                ascii_part = re.match('[A-Za-z0-9_]*', suffix).group()
+                if literal_group != 'char' and ascii_part in cls._STANDARD_UD_SUFFIXES:
+                    return match.end()
+                return match.end(literal_group)
+        return match.end()
+
+    @staticmethod
+    def _number_end(code: str, start: int, end: int) -> int:
+        """
+        A sign after 'p' or 'P' only continues a hexadecimal number.
+        """
+        number = code[start:end]
+        if not re.match('0[xX]', number):
+            sign = re.search('[pP][+-]', number)
+            if sign is not None:
+                return start + sign.start() + 1
+        return end
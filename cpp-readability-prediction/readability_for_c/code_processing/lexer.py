@@ -1,13 +1,19 @@
+import hashlib
 import os
 import re
+import sys
 import tempfile
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
-from typing import Generator, List
+from typing import Generator, Iterable, List, Optional, Dict, Sequence, Tuple
 
 import clang
+import numpy as np
 from clang.cindex import Config
 
+from code_processing.clang_index import INDEX_POOL
+
 
 class TokenKind(Enum):
     IDENTIFIER = 1
@@ -40,6 +46,267 @@ class Token:
         return self.value
 
 
+class TokenTable(Sequence):
+    """
+    Tokens of a code stored as struct of arrays: kinds as ``TokenKind`` values in an uint8 array,
+    lines, columns and offsets of the start and end locations in int32 arrays and values as interned strings.
+
+    Large snippets have hundreds of thousands of tokens, so the tokens are not stored as ``Token`` objects.
+    The table is still a sequence of tokens for convenience, the ``Token`` objects are created when
+    the table is accessed as a sequence and kept for later accesses.
+    Tables are immutable, derived tables (e.g. with other kinds) share the arrays.
+    """
+
+    _KINDS = {kind.value: kind for kind in TokenKind}
+
+    def __init__(
+            self,
+            values: List[str],
+            kinds: np.ndarray,
+            start_lines: np.ndarray,
+            start_columns: np.ndarray,
+            start_offsets: np.ndarray,
+            end_lines: np.ndarray,
+            end_columns: np.ndarray,
+            end_offsets: np.ndarray,
+    ):
+        self.values = values
+        self.kinds = kinds
+        self.start_lines = start_lines
+        self.start_columns = start_columns
+        self.start_offsets = start_offsets
+        self.end_lines = end_lines
+        self.end_columns = end_columns
+        self.end_offsets = end_offsets
+        self._tokens: Optional[List[Token]] = None
+        self._line_offsets: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_columns(
+            cls,
+            values: List[str],
+            kinds: Iterable[int],
+            start_lines: Iterable[int],
+            start_columns: Iterable[int],
+            start_offsets: Iterable[int],
+            end_lines: Iterable[int],
+            end_columns: Iterable[int],
+            end_offsets: Iterable[int],
+    ) -> "TokenTable":
+        """
+        Create a table from the columns of the tokens, kinds are the values of ``TokenKind``.
+        """
+        return TokenTable(
+            [sys.intern(value) for value in values],
+            np.asarray(kinds, dtype=np.uint8),
+            *[np.asarray(column, dtype=np.int32) for column in [
+                start_lines, start_columns, start_offsets, end_lines, end_columns, end_offsets,
+            ]],
+        )
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Token]) -> "TokenTable":
+        if isinstance(tokens, TokenTable):
+            return tokens
+        tokens = list(tokens)
+        return cls.from_columns(
+            [token.value for token in tokens],
+            [token.kind.value for token in tokens],
+            [token.start_location.line for token in tokens],
+            [token.start_location.column for token in tokens],
+            [token.start_location.offset for token in tokens],
+            [token.end_location.line for token in tokens],
+            [token.end_location.column for token in tokens],
+            [token.end_location.offset for token in tokens],
+        )
+
+    def with_kinds(self, kinds: np.ndarray) -> "TokenTable":
+        """
+        :param kinds: new kinds of the tokens
+        :return: a table with the same tokens but other kinds
+        """
+        table = TokenTable(
+            self.values, kinds.astype(np.uint8, copy=False),
+            self.start_lines, self.start_columns, self.start_offsets,
+            self.end_lines, self.end_columns, self.end_offsets,
+        )
+        # The locations are the same, so is the line index
+        table._line_offsets = self._line_offsets
+        return table
+
+    def take(self, indices: np.ndarray) -> "TokenTable":
+        """
+        :param indices: indices or boolean mask of the tokens to take
+        :return: a table of the selected tokens
+        """
+        indices = np.flatnonzero(indices) if indices.dtype == bool else indices
+        return TokenTable(
+            [self.values[i] for i in indices.tolist()], self.kinds[indices],
+            self.start_lines[indices], self.start_columns[indices], self.start_offsets[indices],
+            self.end_lines[indices], self.end_columns[indices], self.end_offsets[indices],
+        )
+
+    def line_offsets(self, line_count: int) -> np.ndarray:
+        """
+        Index of the tokens by their start line in compressed sparse row format,
+        the tokens starting at line ``i + 1`` are the tokens ``offsets[i]:offsets[i + 1]``.
+        The index is built once and shared by the tables with other kinds, so all line-based features
+        of a snippet read the same index instead of grouping the tokens by line again.
+        :param line_count: number of lines of the code, tokens starting after the last line are not indexed
+        :return: the ``line_count + 1`` offsets
+        """
+        offsets = self._line_offsets.get(line_count)
+        if offsets is None:
+            # Tokens are ordered by their locations, so the lines are sorted
+            offsets = np.searchsorted(self.start_lines, np.arange(1, line_count + 2), side='left')
+            self._line_offsets[line_count] = offsets
+        return offsets
+
+    def count_by_line(self, mask: np.ndarray, line_count: int) -> np.ndarray:
+        """
+        :param mask: boolean mask of the tokens to count
+        :param line_count: number of lines of the code
+        :return: the number of selected tokens starting at each line
+        """
+        offsets = self.line_offsets(line_count)
+        counts = np.concatenate([[0], np.cumsum(mask, dtype=np.int64)])
+        return counts[offsets[1:]] - counts[offsets[:-1]]
+
+    def expand_tabs(self, code: str, tab_size: int) -> "TokenTable":
+        """
+        Move the tokens to the code where every tab is replaced by ``tab_size`` spaces.
+        :param code: the code of the tokens
+        :param tab_size: number of spaces of a tab
+        :return: the tokens of the code with expanded tabs
+        """
+        if '\t' not in code:
+            return self
+        # Tabs are single bytes, so the number of tabs before each byte offset moves the offsets and columns
+        tabs = np.frombuffer(code.encode('utf-8'), dtype=np.uint8) == ord('\t')
+        tabs_before = np.concatenate([[0], np.cumsum(tabs, dtype=np.int32)])
+        shift = tab_size - 1
+
+        def expand(offsets: np.ndarray, columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            line_tabs = tabs_before[offsets] - tabs_before[offsets - (columns - 1)]
+            return offsets + shift * tabs_before[offsets], columns + shift * line_tabs
+
+        start_offsets, start_columns = expand(self.start_offsets, self.start_columns)
+        end_offsets, end_columns = expand(self.end_offsets, self.end_columns)
+        spaces = ' ' * tab_size
+        return TokenTable.from_columns(
+            [value.replace('\t', spaces) if '\t' in value else value for value in self.values], self.kinds,
+            self.start_lines, start_columns, start_offsets, self.end_lines, end_columns, end_offsets,
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(np.arange(len(self))[index])
+        return self.tokens[index]
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenTable):
+            return (self.values == other.values
+                    and all(np.array_equal(a, b) for a, b in zip(self._arrays, other._arrays)))
+        if isinstance(other, (list, tuple)):
+            return self.tokens == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.tokens)
+
+    @property
+    def _arrays(self) -> List[np.ndarray]:
+        return [self.kinds, self.start_lines, self.start_columns, self.start_offsets,
+                self.end_lines, self.end_columns, self.end_offsets]
+
+    @property
+    def tokens(self) -> List[Token]:
+        """
+        The tokens as ``Token`` objects, created on the first access.
+        """
+        if self._tokens is None:
+            kinds = self._KINDS
+            self._tokens = [
+                Token(
+                    value=value,
+                    start_location=Location(line=start_line, column=start_column, offset=start_offset),
+                    end_location=Location(line=end_line, column=end_column, offset=end_offset),
+                    kind=kinds[kind],
+                )
+                for value, kind, start_line, start_column, start_offset, end_line, end_column, end_offset in zip(
+                    self.values, *[array.tolist() for array in self._arrays])
+            ]
+        return self._tokens
+
+
+class SourceLocator:
+    """
+    Computes clang locations of character positions in code, i.e. lines and columns are 1-based and
+    columns and offsets count UTF-8 bytes. As in clang, '\\r\\n', '\\r' and '\\n' are line breaks.
+    """
+
+    _NEWLINE_PATTERN = re.compile(r'\r\n|\r|\n')
+
+    def __init__(self, code: str):
+        self.code = code
+        self._line_starts = np.array(
+            [0] + [match.end() for match in self._NEWLINE_PATTERN.finditer(code)], dtype=np.int64)
+        if code.isascii():
+            self._byte_offsets = None
+        else:
+            # Byte offset of every character and of the end of code
+            code_points = np.frombuffer(code.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+            sizes = 1 + (code_points >= 0x80) + (code_points >= 0x800) + (code_points >= 0x10000)
+            self._byte_offsets = np.concatenate([[0], np.cumsum(sizes)])
+        self._crlf_ends = np.array([match.end() - 1 for match in re.finditer('\r\n', code)], dtype=np.int64)
+
+    def to_byte_offsets(self, positions: np.ndarray) -> np.ndarray:
+        """
+        :param positions: positions of characters in code
+        :return: the UTF-8 byte offsets of the positions
+        """
+        return positions if self._byte_offsets is None else self._byte_offsets[positions]
+
+    def to_positions(self, byte_offsets: np.ndarray) -> np.ndarray:
+        """
+        :param byte_offsets: UTF-8 byte offsets of characters in code
+        :return: the positions of the characters
+        """
+        return byte_offsets if self._byte_offsets is None else np.searchsorted(self._byte_offsets, byte_offsets)
+
+    def locate(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :param positions: positions of characters in code
+        :return: lines, columns and offsets of the positions
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        # As in clang, a position between '\r' and '\n' is located at the '\r'
+        column_positions = positions
+        if len(self._crlf_ends) > 0:
+            column_positions = positions - np.isin(positions, self._crlf_ends)
+        lines = np.searchsorted(self._line_starts, column_positions, side='right')
+        line_starts = self._line_starts[lines - 1]
+        columns = self.to_byte_offsets(column_positions) - self.to_byte_offsets(line_starts) + 1
+        return lines, columns, self.to_byte_offsets(positions)
+
+
+def get_unsaved_file_path(file_ext: str) -> str:
+    """
+    Get the virtual path under which in-memory code is handed to clang as an unsaved file.
+    It is located in the temporary directory, so that relative includes are resolved
+    the same way as for a temporary file.
+    :param file_ext: extension of the virtual file, which determines the language
+    :return: path of the virtual file
+    """
+    return os.path.join(tempfile.gettempdir(), f'unsaved.{file_ext}')
+
+
 class Lexer:
     @property
     def file_ext(self):
@@ -48,23 +315,53 @@ class Lexer:
     def lex(self, sourcefile_path) -> Generator[Token, None, None]:
         raise NotImplementedError('Implement me')
 
-    def lexing(self, code: str) -> List[Token]:
+    def lexing(self, code: str) -> TokenTable:
         with tempfile.NamedTemporaryFile(mode='w', suffix=f'.{self.file_ext}') as fp:
             fp.write(code)
             fp.flush()
-            tokens = list(self.lex(fp.name))
-            return tokens
+            return TokenTable.from_tokens(self.lex(fp.name))
 
     @staticmethod
-    def create_lexer(language: str) -> "Lexer":
+    def create_lexer(language: str, backend: str = 'clang') -> "Lexer":
+        """
+        Create a lexer for the given language.
+        :param language: the language of the code
+        :param backend: 'clang' for lexing via libclang, 'python' for the pure-Python lexer
+        that emits the same tokens without loading libclang
+        :return: the lexer
+        """
         if 'cpp' == language:
-            return CLangLexer()
+            if 'clang' == backend:
+                return CLangLexer(lexical_only=True)
+            elif 'python' == backend:
+                # Imported here since fast_lexer depends on this module
+                from code_processing.fast_lexer import FastCppLexer
+                return FastCppLexer()
+            raise ValueError(f'Not supported lexer backend: {backend}')
         raise ValueError(f'Not supported language: {language}')
 
+    def lexing_without_comments(self, code: str, analyzer) -> TokenTable:
+        """
+        Lexing the code without comments, i.e. ``lexing(analyzer.delete_comments(code))``.
+        The tokens are derived from the tokens of the original code, the code without comments
+        is only lexed again if they cannot be derived.
+        :param code: the code with comments
+        :param analyzer: the code analyzer that deletes the comments
+        :return: the tokens of the code without comments
+        """
+        tokens = analyzer.delete_comments_from_tokens(code, self.lexing(code))
+        if tokens is None:
+            tokens = self.lexing(analyzer.delete_comments(code))
+        return tokens
+
 
 class LexerDecorator(Lexer):
     """
-    For customizing lex method
+    For customizing the token stream of another lexer.
+
+    A decorator never lexes the code itself: both ``lex`` and ``lexing`` delegate to the wrapped lexer
+    and only pass the resulting tokens through ``transform``. Hence, a ``CachedLexer`` somewhere down the chain
+    is hit by every decorator on top of it and the code is parsed only once.
     """
 
     def __init__(self, lexer: Lexer):
@@ -75,26 +372,122 @@ class LexerDecorator(Lexer):
         return self.lexer.file_ext
 
     def lex(self, sourcefile_path) -> Generator[Token, None, None]:
-        for token in self.lexer.lex(sourcefile_path):
-            yield token
+        yield from self.transform(self.lexer.lex(sourcefile_path))
+
+    def lexing(self, code: str) -> TokenTable:
+        return self.transform_table(self.lexer.lexing(code))
+
+    def lexing_without_comments(self, code: str, analyzer) -> TokenTable:
+        return self.transform_table(self.lexer.lexing_without_comments(code, analyzer))
+
+    def transform(self, tokens: Iterable[Token]) -> Generator[Token, None, None]:
+        """
+        Transform tokens produced by the wrapped lexer.
+        Tokens may be shared with other consumers (e.g. cached), so they must not be modified in place.
+        :param tokens: tokens of the wrapped lexer
+        :return: the transformed tokens
+        """
+        yield from tokens
+
+    def transform_table(self, table: TokenTable) -> TokenTable:
+        """
+        Transform the token table produced by the wrapped lexer, same as ``transform``.
+        Override it to transform the arrays of the table instead of single tokens.
+        :param table: token table of the wrapped lexer
+        :return: the transformed table
+        """
+        return TokenTable.from_tokens(self.transform(table))
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of token tables, keyed by a hash of the code content.
+
+    The calculators of a snippet lex several versions of it (e.g. with and without comments),
+    so the cache holds multiple entries instead of only the last code.
+    """
+
+    DEFAULT_MAX_SIZE = 16
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(code: str, view: str = '') -> bytes:
+        return hashlib.blake2b(
+            code.encode('utf-8', 'surrogatepass'), digest_size=16, person=view.encode('utf-8')).digest()
+
+    def get(self, code: str, view: str = '') -> Optional[TokenTable]:
+        """
+        Get the cached tokens of code and mark them as recently used.
+        :param code: the lexed code
+        :param view: name of the token view of code (e.g. without comments), at most 16 bytes.
+        Empty for the tokens of code itself
+        :return: the tokens or None if code is not cached
+        """
+        key = self.key(code, view)
+        tokens = self._entries.get(key)
+        if tokens is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return tokens
+
+    def put(self, code: str, tokens: TokenTable, view: str = ''):
+        """
+        Cache the tokens of code, the least recently used entry is evicted when the cache is full.
+        """
+        key = self.key(code, view)
+        self._entries[key] = tokens
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+        }
 
 
 class CachedLexer(LexerDecorator):
     """
     Caching tokens list after lexing by the code content.
+    A cache can be shared by multiple cached lexers (e.g. across snippets) as long as they wrap the same kind of lexer.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.tokens = []
-        self._code = None
+    _WITHOUT_COMMENTS_VIEW = 'no-comments'
+
+    def __init__(self, lexer: Lexer, cache: TokenCache = None):
+        super().__init__(lexer)
+        self.cache = cache if cache is not None else TokenCache()
+
+    def lexing(self, code: str) -> TokenTable:
+        tokens = self.cache.get(code)
+        if tokens is None:
+            tokens = super().lexing(code)
+            self.cache.put(code, tokens)
+        return tokens
 
-    def lexing(self, code: str) -> List[Token]:
-        if self._code == code:
-            return self.tokens
-        self.tokens = super().lexing(code)
-        self._code = code
-        return self.tokens
+    def lexing_without_comments(self, code: str, analyzer) -> TokenTable:
+        tokens = self.cache.get(code, self._WITHOUT_COMMENTS_VIEW)
+        if tokens is None:
+            # Derived from the cached tokens of code instead of the tokens of the wrapped lexer
+            tokens = Lexer.lexing_without_comments(self, code, analyzer)
+            self.cache.put(code, tokens, self._WITHOUT_COMMENTS_VIEW)
+        return tokens
 
 
 class CLangLexer(Lexer):
@@ -133,13 +526,66 @@ class CLangLexer(Lexer):
     Config.set_library_path(CLANG_LIB_PATH)
     print('CLANG_LIB_PATH: ', Config.library_path)
 
+    # Flags of CXTranslationUnit_Flags that are not exposed by clang.cindex.TranslationUnit
+    _PARSE_KEEP_GOING = 0x200
+    _PARSE_SINGLE_FILE_PARSE = 0x400
+
+    # Tokens are read from the source buffer, so the lexical-only mode skips everything else that clang would do:
+    # resolving includes, semantic analysis of function bodies and collecting diagnostics.
+    LEXICAL_PARSE_ARGS = ['-nostdinc', '-nostdinc++', '-nobuiltininc', '-w', '-ferror-limit=1']
+    LEXICAL_PARSE_OPTIONS = (
+            clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+            | clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+            | _PARSE_KEEP_GOING
+            | _PARSE_SINGLE_FILE_PARSE
+    )
+
+    def __init__(self, lexical_only: bool = False):
+        """
+        :param lexical_only: use the cheapest parse options of clang that still yield the same tokens.
+        Method snippets are fragments, so a full semantic parse is wasted work for token-based metrics.
+        """
+        self.lexical_only = lexical_only
+
     @property
     def file_ext(self):
         return 'cpp'
 
+    @property
+    def parse_args(self) -> List[str]:
+        return self.LEXICAL_PARSE_ARGS if self.lexical_only else []
+
+    @property
+    def parse_options(self) -> int:
+        return self.LEXICAL_PARSE_OPTIONS if self.lexical_only else 0
+
     def lex(self, sourcefile_path) -> Generator[Token, None, None]:
-        index = clang.cindex.Index.create()
-        tu = index.parse(sourcefile_path)
+        tu = INDEX_POOL.parse(sourcefile_path, self.parse_args, options=self.parse_options)
+        return self._lex_translation_unit(tu)
+
+    def lexing(self, code: str) -> TokenTable:
+        """
+        Lex the code in memory, it is passed to clang as an unsaved file instead of a temporary file.
+        """
+        path = get_unsaved_file_path(self.file_ext)
+        tu = INDEX_POOL.parse(path, self.parse_args, [(path, code)], self.parse_options)
+        columns = [[] for _ in range(8)]
+        values, kinds, start_lines, start_columns, start_offsets, end_lines, end_columns, end_offsets = columns
+        for clang_token in tu.get_tokens(extent=tu.cursor.extent):
+            spelling = clang_token.spelling
+            extent = clang_token.extent
+            start, end = extent.start, extent.end
+            values.append(spelling)
+            kinds.append(self.classify_token(clang_token.kind, spelling).value)
+            start_lines.append(start.line)
+            start_columns.append(start.column)
+            start_offsets.append(start.offset)
+            end_lines.append(end.line)
+            end_columns.append(end.column)
+            end_offsets.append(end.offset)
+        return TokenTable.from_columns(*columns)
+
+    def _lex_translation_unit(self, tu: clang.cindex.TranslationUnit) -> Generator[Token, None, None]:
         for clang_token in tu.get_tokens(extent=tu.cursor.extent):
             yield self.to_token(clang_token)
 
@@ -160,14 +606,24 @@ class CLangLexer(Lexer):
 
     @classmethod
     def get_token_kind(cls, token: clang.cindex.Token) -> TokenKind:
-        if clang.cindex.TokenKind.LITERAL == token.kind:
-            if cls.STRING_LITERAL_PATTERN.match(token.spelling) is not None:
+        return cls.classify_token(token.kind, token.spelling)
+
+    @classmethod
+    def classify_token(cls, clang_kind: clang.cindex.TokenKind, spelling: str) -> TokenKind:
+        """
+        Map the kind of clang token to the kind used by the metrics.
+        :param clang_kind: kind of the token as reported by clang
+        :param spelling: the token text
+        :return: the token kind
+        """
+        if clang.cindex.TokenKind.LITERAL == clang_kind:
+            if cls.STRING_LITERAL_PATTERN.match(spelling) is not None:
                 return TokenKind.STRING
-            elif (cls.INTEGER_LITERAL_PATTERN.match(token.spelling) is not None
-                  or cls.FLOAT_LITERAL_PATTERN.match(token.spelling) is not None):
+            elif (cls.INTEGER_LITERAL_PATTERN.match(spelling) is not None
+                  or cls.FLOAT_LITERAL_PATTERN.match(spelling) is not None):
                 return TokenKind.NUMBER
             return TokenKind.LITERAL
-        elif clang.cindex.TokenKind.PUNCTUATION == token.kind and token.spelling in cls._operators:
+        elif clang.cindex.TokenKind.PUNCTUATION == clang_kind and spelling in cls._operators:
             return TokenKind.OPERATOR
 
-        return cls._token_kinds_mappings.get(token.kind, TokenKind.OTHER)
+        return cls._token_kinds_mappings.get(clang_kind, TokenKind.OTHER)
@@ -1,14 +1,110 @@
 import dataclasses
-import tempfile
-from typing import List
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 
-import clang
+import clang.cindex
+
+from code_processing.clang_index import INDEX_POOL
+from code_processing.lexer import get_unsaved_file_path, CLangLexer, TokenTable
 
 
 @dataclasses.dataclass
 class Method:
     name: str
     content: str
+    # Tokens of the content taken from the parsed translation unit, the locations are relative to the content.
+    # None if they are not known, then the content has to be lexed.
+    tokens: Optional[TokenTable] = None
+    # First and last line of the method in its file, 0 if they are not known
+    start_line: int = 0
+    end_line: int = 0
+    # Path of the file of the method if it is defined in an included file, None if it is in the parsed code
+    file: Optional[str] = None
+
+
+# Kinds of cursors whose declarations may be located in another file, e.g. a header
+DECLARATION_CONTAINERS = {
+    clang.cindex.CursorKind.TRANSLATION_UNIT,
+    clang.cindex.CursorKind.NAMESPACE,
+    clang.cindex.CursorKind.LINKAGE_SPEC,
+    clang.cindex.CursorKind.UNEXPOSED_DECL,
+    clang.cindex.CursorKind.CLASS_DECL,
+    clang.cindex.CursorKind.STRUCT_DECL,
+    clang.cindex.CursorKind.UNION_DECL,
+    clang.cindex.CursorKind.CLASS_TEMPLATE,
+    clang.cindex.CursorKind.CLASS_TEMPLATE_PARTIAL_SPECIALIZATION,
+}
+
+
+class SourceFiles:
+    """
+    Files that the methods of a run are extracted from, shared by the parsers of the run.
+
+    The content of every included file is read once per run. The methods of a header are only extracted
+    by the first translation unit of the run that includes it, instead of once per including translation unit.
+    Translation units are ordered by their index in the run, so the result does not depend on the order in which
+    parallel parsers extract them: a translation unit that extracted a header before an earlier one did loses it.
+    """
+
+    def __init__(self, is_of_interest: Callable[[str], bool] = None):
+        """
+        :param is_of_interest: whether the methods of an included file are extracted, by default all files.
+        The methods of the parsed code itself are always extracted.
+        """
+        self._is_of_interest = is_of_interest
+        self._lock = threading.Lock()
+        self._contents: Dict[str, str] = {}
+        # Index of the translation unit that extracts the methods of a header
+        self._owners: Dict[str, int] = {}
+
+    @classmethod
+    def below(cls, root: Path) -> "SourceFiles":
+        """
+        :param root: a directory, e.g. of a project
+        :return: the files below the directory, system headers are usually not below it
+        """
+        prefix = os.path.join(os.path.abspath(root), '')
+        return cls(lambda path: os.path.abspath(path).startswith(prefix))
+
+    def is_of_interest(self, path: str) -> bool:
+        return self._is_of_interest is None or self._is_of_interest(path)
+
+    def read(self, path: str) -> str:
+        """
+        :param path: path of a file
+        :return: the content of the file, read once per run
+        """
+        content = self._contents.get(path)
+        if content is None:
+            with open(path) as f:
+                content = f.read()
+            self._contents[path] = content
+        return content
+
+    def claim(self, path: str, unit: int) -> bool:
+        """
+        Claim the extraction of the methods of a header for a translation unit.
+        :param path: path of the header
+        :param unit: index of the translation unit in the run
+        :return: False if an earlier translation unit extracts the methods of the header
+        """
+        with self._lock:
+            owner = self._owners.get(path)
+            if owner is not None and owner < unit:
+                return False
+            self._owners[path] = unit
+            return True
+
+    def is_owner(self, path: str, unit: int) -> bool:
+        """
+        :param path: path of a header
+        :param unit: index of a translation unit that claimed the header
+        :return: whether the translation unit still extracts the methods of the header.
+        This is final once all earlier translation units are extracted.
+        """
+        return self._owners.get(path) == unit
 
 
 class Parser:
@@ -31,35 +127,118 @@ class ClangParser(Parser):
         self._source_code = None
         self.clang_args = clang_args
 
-    def parse(self, sourcefile_path: str):
-        index = clang.cindex.Index.create()
-        tu = index.parse(sourcefile_path, self.clang_args)
+    def parse(self, sourcefile_path: str, unsaved_files: List[Tuple[str, str]] = None):
+        tu = INDEX_POOL.parse(sourcefile_path, self.clang_args, unsaved_files=unsaved_files)
         self._root_node = tu.cursor
         return self._root_node
 
     def parsing(self, code: str):
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.cpp') as fp:
-            fp.write(code)
-            fp.flush()
-            self.parse(fp.name)
-            self._source_code = code
+        path = get_unsaved_file_path('cpp')
+        self.parse(path, unsaved_files=[(path, code)])
+        self._source_code = code
 
-    def extract_methods(self) -> List[Method]:
+    def get_included_files(self) -> List[str]:
+        """
+        :return: paths of all files included by the parsed code, directly or indirectly
+        """
+        return [inclusion.include.name for inclusion in self._root_node.translation_unit.get_includes()]
+
+    def extract_methods(self, sources: "SourceFiles" = None, unit: int = 0) -> List[Method]:
         """
         Extract a list of method definitions in source code.
+        Declarations of included files that are not of interest are skipped without walking their subtrees,
+        as well as headers whose methods are extracted by an earlier translation unit of the run.
 
+        :param sources: files of the run that methods are extracted from, by default all files
+        :param unit: index of the parsed translation unit in the run
         :return: a list of method definitions.
         """
+        if sources is None:
+            sources = SourceFiles()
+        main_file = self._root_node.extent.start.file.name
+        # Whether the declarations of a file are walked, decided once per file
+        walked_files: Dict[str, bool] = {main_file: True}
+
+        def is_walked(cursor: clang.cindex.Cursor) -> bool:
+            file = cursor.location.file
+            if file is None:
+                return True
+            if file.name not in walked_files:
+                walked_files[file.name] = sources.is_of_interest(file.name) and sources.claim(file.name, unit)
+            return walked_files[file.name]
+
         methods: List[Method] = []
-        for child in self._root_node.walk_preorder():
-            # print child.kind, child.is_definition() # Added this
+        for child in self._walk(self._root_node, is_walked):
             if child.kind == clang.cindex.CursorKind.CXX_METHOD and child.is_definition():
-                if self._root_node.extent.start.file.name != child.location.file.name:
+                file = None
+                if main_file != child.location.file.name:
                     # This case happens when Clang follows a file that was imported in the current file.
-                    with open(child.location.file.name) as f:
-                        content = f.read()
+                    file = child.location.file.name
+                    content = sources.read(file)
                 else:
                     content = self._source_code
                 method = content[child.extent.start.offset: child.extent.end.offset]
-                methods.append(Method(child.spelling, method))
+                methods.append(Method(
+                    child.spelling,
+                    method,
+                    self._extract_method_tokens(child, content),
+                    start_line=child.extent.start.line,
+                    end_line=child.extent.end.line,
+                    file=file,
+                ))
         return methods
+
+    @classmethod
+    def _walk(
+            cls,
+            cursor: clang.cindex.Cursor,
+            is_walked: Callable[[clang.cindex.Cursor], bool],
+    ) -> Iterator[clang.cindex.Cursor]:
+        """
+        Walk the subtree of a cursor in preorder like ``Cursor.walk_preorder``, but skip the declarations that are
+        not walked. Only the declarations of containers like namespaces and classes are checked, since they
+        are the only ones that can be located in another file than their container.
+        """
+        yield cursor
+        check_children = cursor.kind in DECLARATION_CONTAINERS
+        for child in cursor.get_children():
+            if check_children and not is_walked(child):
+                continue
+            yield from cls._walk(child, is_walked)
+
+    @staticmethod
+    def _extract_method_tokens(cursor: clang.cindex.Cursor, content: str) -> Optional[TokenTable]:
+        """
+        Take the tokens of a method from the parsed translation unit and rebase their locations to the method,
+        so that the method does not need to be lexed again.
+        :param cursor: the method definition
+        :param content: the content of the file of the method
+        :return: the tokens of the method, None if the locations cannot be rebased
+        """
+        start, end = cursor.extent.start, cursor.extent.end
+        # Offsets of clang are byte offsets, the method content is only sliced correctly from ASCII content
+        if not content[:end.offset].isascii():
+            return None
+
+        def rebase(location: clang.cindex.SourceLocation) -> Tuple[int, int, int]:
+            # Only the first line of the method does not start at the first column
+            column = location.column - start.column + 1 if location.line == start.line else location.column
+            return location.line - start.line + 1, column, location.offset - start.offset
+
+        columns = [[] for _ in range(8)]
+        for clang_token in cursor.get_tokens():
+            token_start, token_end = clang_token.extent.start, clang_token.extent.end
+            if token_start.offset < start.offset or token_end.offset > end.offset:
+                continue
+            spelling = clang_token.spelling
+            kind = CLangLexer.classify_token(clang_token.kind, spelling).value
+            for column, value in zip(columns, (spelling, kind, *rebase(token_start), *rebase(token_end))):
+                column.append(value)
+
+        # Files read from disk may differ from the buffer of clang, e.g. in their line breaks,
+        # and clang does not tokenize every file of the translation unit (e.g. some system headers)
+        method = content[start.offset:end.offset]
+        values, start_offsets = columns[0], columns[4]
+        if not values or not all(method.startswith(values[i], start_offsets[i]) for i in [0, -1]):
+            return None
+        return TokenTable.from_columns(*columns)
@@ -0,0 +1,114 @@
+import re
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import clang
+
+from code_processing.clang_index import INDEX_POOL
+
+# Include of a project header, system headers included with angle brackets are not considered
+INCLUDE_DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*include[ \t]*"([^"\n]+)"', re.MULTILINE)
+
+
+def find_included_headers(cpp_file: Path, include_paths: List[Path]) -> List[Path]:
+    """
+    Find the project headers that a cpp file includes directly, without preprocessing it.
+    :param cpp_file: path of the file
+    :param include_paths: directories that includes are resolved with, after the directory of the file
+    :return: the resolved paths of the included headers that exist, in the order of their includes
+    """
+    with open(cpp_file, 'r') as f:
+        names = INCLUDE_DIRECTIVE.findall(f.read())
+
+    headers = []
+    for name in names:
+        for directory in [cpp_file.parent, *include_paths]:
+            header = (directory / name).resolve()
+            if header.is_file():
+                if header not in headers:
+                    headers.append(header)
+                break
+    return headers
+
+
+class PrecompiledHeader:
+    """
+    Precompiled header of the project headers that most cpp files include, so that the translation unit of
+    every such file loads the parsed headers instead of parsing them again.
+
+    The precompiled header is only used for the files that include all of its headers. It is included before
+    the first line of a file, so headers that depend on macros defined in the file before their include
+    should not be precompiled.
+    """
+
+    # Share of the cpp files a header has to be included by to be precompiled
+    MIN_SHARE = 0.5
+
+    def __init__(self, headers: List[Path], cpp_files: Set[Path]):
+        """
+        :param headers: the precompiled headers in the order they are included
+        :param cpp_files: the files that use the precompiled header
+        """
+        self.headers = headers
+        self.cpp_files = cpp_files
+        # Files included by the precompiled header, directly or indirectly
+        self.included_files: List[str] = []
+        self._directory = tempfile.TemporaryDirectory(prefix='readability_pch_')
+        self.path = Path(self._directory.name) / 'common.pch'
+
+    @classmethod
+    def create(cls, cpp_files: List[Path], include_paths: List[Path]) -> Optional["PrecompiledHeader"]:
+        """
+        Select the headers that are included by at least ``MIN_SHARE`` of the cpp files (and at least two files).
+        :param cpp_files: paths of the cpp files
+        :param include_paths: directories that includes are resolved with
+        :return: the precompiled header, None if there are no common headers
+        """
+        headers_by_file: Dict[Path, List[Path]] = {
+            cpp_file: find_included_headers(cpp_file, include_paths) for cpp_file in cpp_files
+        }
+        counts = Counter(header for headers in headers_by_file.values() for header in headers)
+        min_count = max(2, int(len(cpp_files) * cls.MIN_SHARE))
+        # Counter keeps the order of the first include of every header
+        headers = [header for header, count in counts.items() if count >= min_count]
+        if not headers:
+            return None
+        cpp_files = {
+            cpp_file for cpp_file, file_headers in headers_by_file.items() if set(headers) <= set(file_headers)
+        }
+        return cls(headers, cpp_files)
+
+    def build(self, clang_args: List[str]) -> bool:
+        """
+        Parse the headers and save them as precompiled header.
+        :param clang_args: arguments of clang, the same as for the cpp files
+        :return: whether the precompiled header was saved
+        """
+        prefix_path = Path(self._directory.name) / 'common.hpp'
+        prefix_path.write_text(''.join(f'#include "{header}"\n' for header in self.headers))
+        tu = INDEX_POOL.parse(
+            str(prefix_path),
+            clang_args + ['-x', 'c++-header'],
+            options=clang.cindex.TranslationUnit.PARSE_INCOMPLETE,
+        )
+        try:
+            tu.save(str(self.path))
+        except clang.cindex.TranslationUnitSaveError as e:
+            print(f'Failed to save the precompiled header: {e}')
+            return False
+        self.included_files = [inclusion.include.name for inclusion in tu.get_includes()]
+        return True
+
+    def get_clang_args(self, cpp_file: Path) -> List[str]:
+        """
+        :param cpp_file: path of a cpp file
+        :return: the arguments of clang that use the precompiled header, empty if the file does not use it
+        """
+        if cpp_file not in self.cpp_files:
+            return []
+        return ['-include-pch', str(self.path)]
+
+    def dispose(self):
+        self._directory.cleanup()
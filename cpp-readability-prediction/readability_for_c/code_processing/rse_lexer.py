@@ -1,7 +1,9 @@
-import copy
-from typing import Generator
+import dataclasses
+from typing import Generator, Iterable
 
-from code_processing.lexer import TokenKind, LexerDecorator, Token
+import numpy as np
+
+from code_processing.lexer import TokenKind, LexerDecorator, Token, TokenTable
 
 
 class RSELexer(LexerDecorator):
@@ -29,12 +31,18 @@ class RSELexer(LexerDecorator):
         ';', '{', '}',
     ]
 
-    def lex(self, sourcefile_path: str) -> Generator[Token, None, None]:
-        for token in super().lex(sourcefile_path):
-            # Use a copy to prevent messing up with the original one
-            token = copy.deepcopy(token)
+    def transform(self, tokens: Iterable[Token]) -> Generator[Token, None, None]:
+        for token in tokens:
+            # Replace instead of modifying, the original token may be shared with other consumers
             if token.kind == TokenKind.PUNCTUATION and token.value in self._PUNCTUATORS_AS_OPERATORS:
-                token.kind = TokenKind.OPERATOR
+                token = dataclasses.replace(token, kind=TokenKind.OPERATOR)
             elif token.kind.value > TokenKind.NUMBER.value:
-                token.kind = TokenKind.OTHER
+                token = dataclasses.replace(token, kind=TokenKind.OTHER)
             yield token
+
+    def transform_table(self, table: TokenTable) -> TokenTable:
+        kinds = np.where(table.kinds > TokenKind.NUMBER.value, TokenKind.OTHER.value, table.kinds)
+        punctuators = np.flatnonzero(table.kinds == TokenKind.PUNCTUATION.value)
+        operators = [i for i in punctuators.tolist() if table.values[i] in self._PUNCTUATORS_AS_OPERATORS]
+        kinds[operators] = TokenKind.OPERATOR.value
+        return table.with_kinds(kinds)
@@ -1,10 +1,16 @@
 import argparse
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Tuple, Iterator, Optional
 
 from cli_cmd import Command
-from code_processing.parser import ClangParser
+from code_processing.clang_index import INDEX_POOL
+from code_processing.compilation_database import CompilationDatabase
+from code_processing.parser import ClangParser, Method, SourceFiles
+from code_processing.precompiled_header import PrecompiledHeader
+from manifest import Manifest, add_incremental_argument
 
 
 def register_command(subparsers):
@@ -21,6 +27,66 @@ def register_command(subparsers):
     parser.add_argument("-gm", "--genMethodKeyword", type=str, default='SampleKeyword2',
                         help='If the method does NOT contain this keyword AND '
                              'is part of a (partly) auto-generated cpp-file, the method is auto-generated --> skip it')
+    add_parse_threads_argument(parser)
+    add_pch_argument(parser)
+    add_compilation_database_arguments(parser)
+    add_incremental_argument(parser)
+
+
+def add_parse_threads_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--parse-threads", type=int, default=1,
+                        help='Number of threads that parse the cpp files concurrently. Default is 1.')
+
+
+def add_pch_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--pch", action='store_true',
+                        help='Precompile the project headers that at least half of the cpp files include, '
+                             'the files that include all of them load the precompiled header instead of '
+                             'parsing the headers again.')
+
+
+def add_compilation_database_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--compile-commands", type=Path, default=None,
+                        help='Path to a compilation database (compile_commands.json) or the directory containing it. '
+                             'Only the C++ translation units it lists below the input directory are parsed, '
+                             'each with its own compiler flags.')
+    parser.add_argument("--drop-system-includes", action='store_true',
+                        help='With --compile-commands, do not resolve includes of system headers and the standard '
+                             'library, which makes parsing much faster.')
+
+
+def load_compilation_database(args: argparse.Namespace) -> Optional[CompilationDatabase]:
+    """
+    :param args: arguments of a command with ``add_compilation_database_arguments``
+    :return: the compilation database, None if none is given
+    """
+    if args.compile_commands is None:
+        return None
+    assert not args.pch, '--pch is not supported with --compile-commands, the flags of the files differ'
+    return CompilationDatabase.load(args.compile_commands.resolve().absolute(), args.drop_system_includes)
+
+
+def create_precompiled_header(
+        cpp_files: List[Path],
+        input_path: Path,
+        clang_args: List[str],
+) -> Optional[PrecompiledHeader]:
+    """
+    Build the precompiled header of the common project headers of cpp files.
+    :param cpp_files: paths of the files
+    :param input_path: the input directory, which is an include path
+    :param clang_args: arguments of clang
+    :return: the precompiled header, None if there are no common headers or it cannot be built
+    """
+    pch = PrecompiledHeader.create(cpp_files, [input_path])
+    if pch is None:
+        print('No common headers to precompile')
+        return None
+    if not pch.build(clang_args):
+        pch.dispose()
+        return None
+    print(f'Precompiled {len(pch.headers)} headers for {len(pch.cpp_files)} of {len(cpp_files)} files')
+    return pch
 
 
 def find_cpp_files(folder_path: Path) -> List[Path]:
@@ -38,6 +104,168 @@ def sanitize_file(source_code: str) -> str:
             .replace('\n#include "stdafx.h"', '\n//#include "stdafx.h"'))
 
 
+def read_file(cpp_file: Path) -> str:
+    """
+    :param cpp_file: path of a cpp file
+    :return: the sanitized source code of the file
+    """
+    with open(cpp_file, 'r') as f:
+        source_code = f.read()
+
+    return sanitize_file(source_code)
+
+
+def parse_file(
+        cpp_file: Path,
+        clang_args: List[str],
+        pch: PrecompiledHeader = None,
+        sources: SourceFiles = None,
+        unit: int = 0,
+) -> Tuple[str, List[Method], List[str]]:
+    """
+    Read and parse a cpp file and extract its methods.
+    :param cpp_file: path of the file
+    :param clang_args: arguments of clang
+    :param pch: precompiled header that is used if the file includes all of its headers
+    :param sources: files of the run that methods are extracted from, see ``ClangParser.extract_methods``
+    :param unit: index of the file in the run
+    :return: the sanitized source code, the methods and the included files of the file
+    """
+    source_code = read_file(cpp_file)
+    # The parsed code is an unsaved file in another directory, quoted includes are still resolved next to the file
+    # like a compiler does, and like the headers of the precompiled header are found
+    quote_args = [f'-iquote{cpp_file.parent}']
+    pch_args = pch.get_clang_args(cpp_file) if pch is not None else []
+    parser = ClangParser(clang_args + quote_args + pch_args)
+    parser.parsing(source_code)
+    included_files = parser.get_included_files()
+    if pch_args:
+        # Clang does not report the includes of the precompiled header
+        included_files = pch.included_files + included_files
+    return source_code, parser.extract_methods(sources, unit), included_files
+
+
+def parse_files(
+        cpp_files: List[Path],
+        clang_args: List[str],
+        parse_threads: int = 1,
+        manifest: Manifest = None,
+        pch: PrecompiledHeader = None,
+        compilation_database: CompilationDatabase = None,
+        sources: SourceFiles = None,
+) -> Iterator[Tuple[Path, str, List[Method]]]:
+    """
+    Parse cpp files and extract their methods, see ``parse_file``.
+    With several threads the files are parsed concurrently, each thread with its own clang index.
+    libclang is called via ctypes, which releases the GIL, so the threads parse in parallel.
+    The files are still yielded in the given order, so deduplication of methods and output stay deterministic.
+    :param cpp_files: paths of the files
+    :param clang_args: arguments of clang
+    :param parse_threads: number of parsing threads
+    :param manifest: manifest of the last run, the methods of unchanged files are taken from it
+    instead of parsing the files again, the methods of the other files are recorded in it. An unchanged file is
+    parsed again if it takes over the methods of a header from a changed file.
+    :param pch: precompiled header of the common headers of the files
+    :param compilation_database: the files are parsed with their arguments of the database instead of clang_args
+    :param sources: files that methods are extracted from, by default all files. The methods of a header are only
+    yielded with the first file that includes it.
+    :return: iterator of the paths, sanitized source codes and methods of the files
+    """
+    if sources is None:
+        sources = SourceFiles()
+
+    # The manifest is only used by the consumer thread
+    def recorded_methods(cpp_file: Path, unit: int) -> Optional[List[Method]]:
+        if manifest is None:
+            return None
+        results, unchanged = manifest.lookup(cpp_file)
+        if not unchanged or 'methods' not in results:
+            return None
+        # The file claims its headers like a parsed file, so that later files do not extract them
+        for header in manifest.get_dependencies(cpp_file):
+            if sources.is_of_interest(header):
+                sources.claim(header, unit)
+        return [Method(**method) for method in results['methods']]
+
+    def parse(
+            cpp_file: Path,
+            unit: int,
+            methods: Optional[List[Method]],
+    ) -> Tuple[str, List[Method], Optional[List[str]]]:
+        if methods is not None:
+            return read_file(cpp_file), methods, None
+        if compilation_database is not None:
+            return parse_file(cpp_file, compilation_database.get_clang_args(cpp_file), pch, sources, unit)
+        return parse_file(cpp_file, clang_args, pch, sources, unit)
+
+    def is_owner(method: Method, unit: int) -> bool:
+        return method.file is None or sources.is_owner(method.file, unit)
+
+    def record(
+            cpp_file: Path,
+            unit: int,
+            methods: List[Method],
+            included_files: Optional[List[str]],
+    ) -> List[Method]:
+        if included_files is None:
+            # The recorded methods only contain the headers the file owned in the last run. If the file took
+            # over a header from a changed file, e.g. one that does not include it anymore, it is parsed again.
+            results, _ = manifest.lookup(cpp_file)
+            headers = [
+                header for header in manifest.get_dependencies(cpp_file)
+                if sources.is_of_interest(header) and sources.is_owner(header, unit)
+            ]
+            if set(headers) <= set(results.get('headers', [])):
+                return [method for method in methods if is_owner(method, unit)]
+            _, methods, included_files = parse(cpp_file, unit, None)
+        # Drop the methods of headers that an earlier file claimed after this file extracted them
+        methods = [method for method in methods if is_owner(method, unit)]
+        if manifest is not None:
+            results, _ = manifest.lookup(cpp_file)
+            results['methods'] = [
+                {
+                    'name': method.name, 'content': method.content,
+                    'start_line': method.start_line, 'end_line': method.end_line, 'file': method.file,
+                }
+                for method in methods
+            ]
+            # Headers whose methods are recorded
+            results['headers'] = [
+                header for header in included_files
+                if sources.is_of_interest(header) and sources.is_owner(header, unit)
+            ]
+            manifest.set_dependencies(cpp_file, included_files)
+        return methods
+
+    if parse_threads <= 1:
+        for unit, cpp_file in enumerate(cpp_files):
+            source_code, methods, included_files = parse(cpp_file, unit, recorded_methods(cpp_file, unit))
+            yield cpp_file, source_code, record(cpp_file, unit, methods, included_files)
+        return
+
+    # Load libclang once before the threads use it
+    INDEX_POOL.get_index()
+    with ThreadPoolExecutor(max_workers=parse_threads) as executor:
+        # Only parse a few files ahead of the consumer, so that the parsed files do not pile up in memory
+        pending = deque()
+
+        def submit(cpp_file: Path, unit: int):
+            pending.append((cpp_file, unit, executor.submit(parse, cpp_file, unit, recorded_methods(cpp_file, unit))))
+
+        files = enumerate(cpp_files)
+        for unit, cpp_file in files:
+            submit(cpp_file, unit)
+            if len(pending) >= 2 * parse_threads:
+                break
+        while pending:
+            cpp_file, unit, future = pending.popleft()
+            next_unit, next_file = next(files, (None, None))
+            if next_file is not None:
+                submit(next_file, next_unit)
+            source_code, methods, included_files = future.result()
+            yield cpp_file, source_code, record(cpp_file, unit, methods, included_files)
+
+
 def save_extracted_snippet(method: str, path: Path):
     with path.open('w') as f:
         f.write(method)
@@ -55,7 +283,6 @@ def run(args: argparse.Namespace):
     project_name = args.output.stem
 
     clang_args = ['-x', 'c++', f'-I{str(input_path)}']
-    parser = ClangParser(clang_args)
 
     extracted_signatures = set()
     total_extracted = 0
@@ -63,21 +290,25 @@ def run(args: argparse.Namespace):
     total_skipped_gen = 0
     total_duplicates = 0
 
-    cpp_files = find_cpp_files(input_path)
-    for cpp_file in cpp_files:
+    manifest = Manifest.load(Manifest.get_path(output_path)) if args.incremental else None
+    compilation_database = load_compilation_database(args)
+    if compilation_database is not None:
+        cpp_files = compilation_database.get_translation_units(input_path)
+    else:
+        cpp_files = find_cpp_files(input_path)
+    pch = create_precompiled_header(cpp_files, input_path, clang_args) if args.pch else None
+    # Methods of system headers are not extracted
+    sources = SourceFiles.below(input_path)
+    parsed_files = parse_files(
+        cpp_files, clang_args, args.parse_threads, manifest, pch, compilation_database, sources,
+    )
+    for cpp_file, source_code, methods in parsed_files:
         skipped_len = 0
         skipped_gen = 0
         skipped_duplicates = 0
         print(cpp_file)
-        with open(cpp_file, 'r') as f:
-            source_code = f.read()
-
-        source_code = sanitize_file(source_code)
         generated_file = gen_file_keyword in source_code
 
-        parser.parsing(source_code)
-        methods = parser.extract_methods()
-
         count = 1
         for method in methods:
             method_lines = method.content.splitlines(keepends=False)
@@ -117,6 +348,11 @@ def run(args: argparse.Namespace):
         total_skipped_gen += skipped_gen
         total_duplicates += skipped_duplicates
 
+    if manifest is not None:
+        manifest.save()
+    if pch is not None:
+        pch.dispose()
+
     print(f'SUMMARY: Extracted {total_extracted} methods from '
           f'{len(cpp_files)} files. '
           f'Skipped {total_duplicates} duplicates + '
@@ -1,13 +1,20 @@
 import argparse
 from pathlib import Path
-from typing import Generator, Dict, Any
+from typing import Generator, Dict, Any, List, Tuple
 
 import crawl_cmd
+import git_diff
 import utils
 from cli_cmd import Command
-from code_processing.parser import ClangParser
+from code_processing.compilation_database import CompilationDatabase
+from code_processing.parser import ClangParser, Method, SourceFiles
+from manifest import Manifest, add_incremental_argument
+from method_index import MethodIndex
 from readability.readability_calculator import ReadabilityCalculator, PickleReadabilityCalculator
-from readability_cmd import create_export_row, CSV_COLUMNS
+from readability_cmd import create_export_row, get_method_name, CSV_COLUMNS
+
+# Score of a method in the base revision of a git diff, empty for new methods
+BASE_SCORE_COLUMN = 'Base Score'
 
 
 def register_command(subparsers):
@@ -28,6 +35,30 @@ def register_command(subparsers):
     parser.add_argument("-gm", "--genMethodKeyword", type=str, default='SampleKeyword2',
                         help='If the method does NOT contain this keyword AND '
                              'is part of a (partly) auto-generated cpp-file, the method is auto-generated --> skip it')
+    crawl_cmd.add_parse_threads_argument(parser)
+    crawl_cmd.add_pch_argument(parser)
+    crawl_cmd.add_compilation_database_arguments(parser)
+    add_incremental_argument(parser)
+    parser.add_argument("--git-base", type=str, default=None,
+                        help='Only score the methods of cpp files that changed since this git revision. '
+                             'The input directory has to be part of a git repository. The changed files are read '
+                             'from the revisions, but their includes from the working tree, so it should be '
+                             'checked out at --git-head.')
+    parser.add_argument("--git-head", type=str, default='HEAD',
+                        help='The git revision whose changed methods are scored with --git-base. Default is "HEAD".')
+    parser.add_argument("--before-after", action='store_true',
+                        help='With --git-base, also report the score of the changed methods in the base revision '
+                             f'in the column "{BASE_SCORE_COLUMN}".')
+
+
+def is_skipped_method(method: Method, is_generated_file: bool, gen_method_keyword: str) -> bool:
+    """
+    :return: whether a method is auto-generated or outside the LOC range of the models
+    """
+    if is_generated_file and (gen_method_keyword not in method.content):
+        return True
+    method_lines = method.content.splitlines()
+    return len(method_lines) < 10 or len(method_lines) > 50
 
 
 def create_export_rows(
@@ -35,38 +66,127 @@ def create_export_rows(
         rc: ReadabilityCalculator,
         gen_file_keyword: str,
         gen_method_keyword: str,
+        parse_threads: int = 1,
+        manifest: Manifest = None,
+        use_pch: bool = False,
+        compilation_database: CompilationDatabase = None,
 ) -> Generator[Dict[str, Any], None, None]:
-    cpp_files = crawl_cmd.find_cpp_files(input_path)
+    """
+    Crawl the cpp files of a directory and compute the readability of their methods.
+    :param manifest: manifest of the last run, the methods of unchanged files and the scores of unchanged methods
+    are taken from it
+    :param use_pch: precompile the common headers of the files, see ``crawl_cmd.create_precompiled_header``
+    :param compilation_database: only the translation units of the database are crawled, with their own flags
+    """
+    if compilation_database is not None:
+        cpp_files = compilation_database.get_translation_units(input_path)
+    else:
+        cpp_files = crawl_cmd.find_cpp_files(input_path)
     clang_args = ['-x', 'c++', f'-I{str(input_path)}']
-    parser = ClangParser(clang_args)
+    pch = crawl_cmd.create_precompiled_header(cpp_files, input_path, clang_args) if use_pch else None
 
-    extracted_signatures = set()
+    # Scores of the methods by model, a method of a header is scored once for all files that include it
+    index = MethodIndex()
+    if manifest is not None:
+        index = MethodIndex(manifest.project.get('scores', {}).get(rc.name))
 
-    for cpp_file in cpp_files:
+    # Methods of system headers are not extracted
+    sources = SourceFiles.below(input_path)
+    parsed_files = crawl_cmd.parse_files(
+        cpp_files, clang_args, parse_threads, manifest, pch, compilation_database, sources,
+    )
+    for cpp_file, source_code, methods in parsed_files:
         print(cpp_file)
-        with cpp_file.open() as f:
-            source_code = f.read()
-
-        source_code = crawl_cmd.sanitize_file(source_code)
         is_generated_file = gen_file_keyword in source_code
 
-        parser.parsing(source_code)
-        methods = parser.extract_methods()
-
         for method in methods:
-            method_lines = method.content.splitlines()
-            signature = method_lines[0]
-
-            if signature in extracted_signatures:
+            if is_skipped_method(method, is_generated_file, gen_method_keyword):
                 continue
-            if is_generated_file and (gen_method_keyword not in method.content):
+            key = index.key(method, cpp_file)
+            if not index.add(key):
                 continue
-            elif len(method_lines) < 10 or len(method_lines) > 50:
+
+            filepath = str(cpp_file.relative_to(input_path))
+            score = index.get_score(key)
+            if score is not None:
+                yield {CSV_COLUMNS[0]: filepath, CSV_COLUMNS[1]: method.name, CSV_COLUMNS[2]: score}
                 continue
 
-            extracted_signatures.add(signature)
+            # The tokens of the parsed file are reused, so the method is not lexed again
+            row = create_export_row(method.content, method.name, filepath, rc, tokens=method.tokens)
+            index.set_score(key, row[CSV_COLUMNS[2]])
+            yield row
+
+    if manifest is not None:
+        manifest.project.setdefault('scores', {})[rc.name] = index.get_scores()
+    if pch is not None:
+        pch.dispose()
+
+
+def parse_revision(input_path: Path, revision: str, path: str) -> Tuple[str, List[Method]]:
+    """
+    Parse a cpp file in a git revision and extract its methods.
+    Only the file itself is read from the revision, its includes are resolved in the working tree.
+    :param input_path: a directory of the git repository
+    :param revision: the revision
+    :param path: path of the file relative to the directory
+    :return: the sanitized source code of the file and the methods defined in the file itself
+    """
+    source_code = crawl_cmd.sanitize_file(git_diff.show_file(input_path, revision, path))
+    # The code is parsed from memory, so quoted includes are resolved with the directory of the file like in
+    # ``crawl_cmd.parse_file``
+    parser = ClangParser(['-x', 'c++', f'-I{str(input_path)}', f'-iquote{str((input_path / path).parent)}'])
+    parser.parsing(source_code)
+    # Only the methods of the file itself are extracted
+    return source_code, parser.extract_methods(SourceFiles(lambda included_file: False))
+
+
+def create_changed_export_rows(
+        input_path: Path,
+        rc: ReadabilityCalculator,
+        gen_file_keyword: str,
+        gen_method_keyword: str,
+        base: str,
+        head: str,
+        before_after: bool = False,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Compute the readability of the methods that changed between two git revisions.
+    Only the changed cpp files are parsed, and only the methods of the head revision that overlap
+    the changed lines are scored.
+    :param input_path: a directory of the git repository, only the files below it are diffed
+    :param base: the old revision
+    :param head: the new revision
+    :param before_after: also compute the score of the methods in the base revision, a method is matched
+    by its signature (its first line)
+    """
+    for change in git_diff.get_changes(input_path, base, head, ['*.cpp']):
+        if change.new_path is None:
+            # Deleted
+            continue
+        print(change.new_path)
+        source_code, methods = parse_revision(input_path, head, change.new_path)
+        is_generated_file = gen_file_keyword in source_code
+        methods = [
+            method for method in methods
+            if git_diff.is_touched(method.start_line, method.end_line, change.new_hunks)
+            and not is_skipped_method(method, is_generated_file, gen_method_keyword)
+        ]
+        if not methods:
+            continue
+
+        base_methods: Dict[str, Method] = {}
+        if before_after and change.old_path is not None:
+            for method in parse_revision(input_path, base, change.old_path)[1]:
+                base_methods.setdefault(get_method_name(method.content), method)
 
-            yield create_export_row(method.content, method.name, str(cpp_file.relative_to(input_path)), rc)
+        for method in methods:
+            row = create_export_row(method.content, method.name, change.new_path, rc, tokens=method.tokens)
+            if before_after:
+                base_method = base_methods.get(get_method_name(method.content))
+                row[BASE_SCORE_COLUMN] = '' if base_method is None else \
+                    rc.compute_readability(base_method.content, tokens=base_method.tokens)[1]
+            yield row
 
 
 def run(args: argparse.Namespace):
@@ -88,8 +208,27 @@ def run(args: argparse.Namespace):
         language='cpp',
     )
 
+    if args.git_base is not None:
+        assert not args.incremental, '--incremental is not supported with --git-base'
+        # The changed files are parsed one by one from their revisions, not from the input directory
+        assert args.parse_threads <= 1, '--parse-threads is not supported with --git-base'
+        assert not args.pch, '--pch is not supported with --git-base'
+        assert args.compile_commands is None, '--compile-commands is not supported with --git-base'
+        headers = CSV_COLUMNS + [BASE_SCORE_COLUMN] if args.before_after else CSV_COLUMNS
+        rows = create_changed_export_rows(
+            input_path, rc, gen_file_keyword, gen_method_keyword, args.git_base, args.git_head, args.before_after,
+        )
+        utils.export_csv(output_path, rows, headers=headers)
+        return
+
+    manifest = Manifest.load(Manifest.get_path(output_path)) if args.incremental else None
     utils.export_csv(
         output_path,
-        create_export_rows(input_path, rc, gen_file_keyword, gen_method_keyword),
+        create_export_rows(
+            input_path, rc, gen_file_keyword, gen_method_keyword, args.parse_threads, manifest, args.pch,
+            crawl_cmd.load_compilation_database(args),
+        ),
         headers=CSV_COLUMNS,
     )
+    if manifest is not None:
+        manifest.save()
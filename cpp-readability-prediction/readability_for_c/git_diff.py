@@ -0,0 +1,105 @@
+import dataclasses
+import re
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Header of a hunk of a unified diff, e.g. "@@ -12,3 +12,0 @@ int main()"
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+@dataclasses.dataclass
+class FileChange:
+    """
+    Changed lines of a file between two revisions.
+    Hunks are (start line, line count) like in a unified diff, a count of 0 means that lines were only
+    added to (or removed from) the other side after the start line.
+    """
+    # Path relative to the diffed directory in the old revision, None if the file was added
+    old_path: Optional[str]
+    # Path relative to the diffed directory in the new revision, None if the file was deleted
+    new_path: Optional[str]
+    old_hunks: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+    new_hunks: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+
+
+def run_git(repo_path: Path, *args: str) -> str:
+    """
+    :param repo_path: a directory of a git repository, the command runs in it
+    :param args: arguments of git
+    :return: the standard output of git
+    """
+    return subprocess.run(
+        ['git', '-C', str(repo_path), *args], check=True, capture_output=True, text=True,
+    ).stdout
+
+
+def get_changes(repo_path: Path, base: str, head: str, pathspecs: List[str] = None) -> List[FileChange]:
+    """
+    Diff two revisions with git.
+    :param repo_path: a directory of a git repository, only the files below it are diffed
+    :param base: the old revision
+    :param head: the new revision
+    :param pathspecs: git pathspecs of the diffed files, e.g. ['*.cpp'], by default all files
+    :return: the changes of the files that differ
+    """
+    diff = run_git(
+        repo_path, '-c', 'core.quotePath=false', 'diff', '--no-color', '--no-ext-diff', '--unified=0',
+        '--find-renames', '--relative', base, head, '--', *(pathspecs or []),
+    )
+    return parse_diff(diff)
+
+
+def parse_diff(diff: str) -> List[FileChange]:
+    """
+    :param diff: a unified diff without context lines as printed by ``git diff --unified=0``
+    :return: the changes of the files of the diff
+    """
+    changes: List[FileChange] = []
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            changes.append(FileChange(None, None))
+        elif line.startswith('--- '):
+            changes[-1].old_path = _get_diff_path(line[4:], 'a/')
+        elif line.startswith('+++ '):
+            changes[-1].new_path = _get_diff_path(line[4:], 'b/')
+        elif line.startswith('@@'):
+            match = HUNK_HEADER.match(line)
+            old_start, old_count, new_start, new_count = match.groups()
+            changes[-1].old_hunks.append((int(old_start), int(old_count or 1)))
+            changes[-1].new_hunks.append((int(new_start), int(new_count or 1)))
+    # Renamed files without content changes have no hunks
+    return [change for change in changes if change.old_hunks]
+
+
+def _get_diff_path(path: str, prefix: str) -> Optional[str]:
+    if path == '/dev/null':
+        return None
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def is_touched(start_line: int, end_line: int, hunks: List[Tuple[int, int]]) -> bool:
+    """
+    :param start_line: first line of a code range, e.g. a method
+    :param end_line: last line of the range
+    :param hunks: hunks of one side of a diff, see ``FileChange``
+    :return: whether the diff changes lines of the range
+    """
+    for hunk_start, count in hunks:
+        if count == 0:
+            # Lines of the other side are in between hunk_start and the next line
+            if start_line <= hunk_start < end_line:
+                return True
+        elif hunk_start <= end_line and start_line < hunk_start + count:
+            return True
+    return False
+
+
+def show_file(repo_path: Path, revision: str, path: str) -> str:
+    """
+    :param repo_path: a directory of a git repository
+    :param revision: a revision
+    :param path: path of a file relative to the directory
+    :return: the content of the file in the revision
+    """
+    return run_git(repo_path, 'show', f'{revision}:./{path}')
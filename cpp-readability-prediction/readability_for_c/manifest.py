@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+
+def add_incremental_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--incremental", action='store_true',
+                        help='Only process the files that changed since the last run with this output, '
+                             'the results of the other files are taken from the manifest of the last run. '
+                             'The manifest is saved next to the output as "<output>.manifest.json".')
+
+
+class Manifest:
+    """
+    Manifest of the source files processed by a command, stored as JSON next to the output of the command.
+
+    For every file it records the size, modification time and content hash of the file, the size and modification
+    time of the files it depends on (e.g. included headers) and the results derived from it (e.g. methods, scores).
+    A later run only processes the files that changed and takes the results of the other files from the manifest.
+    Files whose size and modification time did not change are not read, files that were only touched are detected
+    by their hash.
+
+    Results that do not belong to a single file (e.g. scores of methods of headers) are recorded in ``project``.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Results of the whole project, saved as they are
+        self.project: Dict[str, Any] = {}
+        # Files looked up in this run, only their entries are saved
+        self._seen: Set[str] = set()
+        # Size and modification time of files by their path, files are only checked once per run
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    @staticmethod
+    def get_path(output_path: Path) -> Path:
+        """
+        :param output_path: the output of a command, a file or a directory
+        :return: path of the manifest of the output
+        """
+        return output_path.with_name(f'{output_path.name}.manifest.json')
+
+    @classmethod
+    def load(cls, path: Path) -> "Manifest":
+        """
+        :param path: path of the manifest
+        :return: the manifest, empty if it does not exist or has another version
+        """
+        manifest = cls(path)
+        if path.exists():
+            with path.open() as f:
+                data = json.load(f)
+            if data.get('version') == cls.VERSION:
+                manifest._entries = data['files']
+                manifest.project = data['project']
+        return manifest
+
+    def save(self):
+        """
+        Save the entries of the files looked up in this run, the entries of deleted files are dropped.
+        """
+        data = {
+            'version': self.VERSION,
+            'files': {path: entry for path, entry in self._entries.items() if path in self._seen},
+            'project': self.project,
+        }
+        # Replace the manifest at once, so an interrupted run does not leave a broken manifest
+        temp_path = self.path.with_name(f'{self.path.name}.tmp')
+        with temp_path.open('w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    def lookup(self, source: Path) -> Tuple[Dict[str, Any], bool]:
+        """
+        Look up the results of a file. The results of a changed file are discarded and an empty dictionary is
+        recorded instead, which is filled by the caller.
+        :param source: path of the file
+        :return: the results of the file and whether the file and its dependencies are unchanged
+        """
+        key = str(source)
+        self._seen.add(key)
+        entry = self._entries.get(key)
+        stat = self._stat(key)
+        if entry is not None and self._is_unchanged(entry, source, stat):
+            return entry['results'], True
+
+        entry = {
+            'size': stat[0],
+            'mtime_ns': stat[1],
+            'hash': self.hash_file(source),
+            'dependencies': {},
+            'results': {},
+        }
+        self._entries[key] = entry
+        return entry['results'], False
+
+    def set_dependencies(self, source: Path, dependencies: Iterable[str]):
+        """
+        Record the files a file depends on, the file is considered as changed if one of them changes.
+        :param source: path of the looked up file
+        :param dependencies: paths of the files it depends on
+        """
+        stats = {dependency: self._stat(dependency) for dependency in dependencies}
+        self._entries[str(source)]['dependencies'] = {
+            dependency: list(stat) for dependency, stat in stats.items() if stat is not None
+        }
+
+    def get_dependencies(self, source: Path) -> List[str]:
+        """
+        :param source: path of a looked up file
+        :return: paths of the files it depends on, as recorded by ``set_dependencies``
+        """
+        return list(self._entries[str(source)]['dependencies'])
+
+    def _is_unchanged(self, entry: Dict[str, Any], source: Path, stat: Tuple[int, int]) -> bool:
+        for dependency, dependency_stat in entry['dependencies'].items():
+            current_stat = self._stat(dependency)
+            if current_stat is None or list(current_stat) != dependency_stat:
+                return False
+        if [entry['size'], entry['mtime_ns']] == list(stat):
+            return True
+        if entry['size'] == stat[0] and entry['hash'] == self.hash_file(source):
+            # Only touched
+            entry['mtime_ns'] = stat[1]
+            return True
+        return False
+
+    def _stat(self, path: str) -> Optional[Tuple[int, int]]:
+        if path not in self._stats:
+            try:
+                result = os.stat(path)
+                self._stats[path] = (result.st_size, result.st_mtime_ns)
+            except OSError:
+                self._stats[path] = None
+        return self._stats[path]
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
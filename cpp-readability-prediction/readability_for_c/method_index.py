@@ -0,0 +1,66 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from code_processing.parser import Method
+
+
+class MethodIndex:
+    """
+    Index of the methods of a project and their scores, keyed by a hash of the file, the lines and the body
+    of a method.
+
+    A method defined in a header can be extracted with several translation units, e.g. when the translation unit
+    that extracted it before is taken from the manifest. Its key is the same for all of them, so it is only
+    scored once. Unlike the first line of a method, the key does not collide for different methods with the same
+    signature, e.g. methods of different files or template methods whose first line is the template declaration.
+    """
+
+    def __init__(self, scores: Dict[str, float] = None):
+        """
+        :param scores: scores of methods by their key, e.g. of the last run
+        """
+        self._scores = dict(scores) if scores is not None else {}
+        # Keys of the methods added in this run
+        self._added: Set[str] = set()
+
+    @staticmethod
+    def key(method: Method, parsed_file: Path) -> str:
+        """
+        :param method: an extracted method
+        :param parsed_file: the file the method was extracted with, the file of the method if it is not
+        defined in an included file
+        :return: the key of the method
+        """
+        file = method.file if method.file is not None else str(parsed_file)
+        # Only the line endings are normalized, since the layout of the body changes its readability
+        body = '\n'.join(method.content.splitlines())
+        data = f'{file}\0{method.start_line}\0{method.end_line}\0{body}'
+        return hashlib.blake2b(data.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+    def add(self, key: str) -> bool:
+        """
+        Add a method to this run.
+        :param key: the key of the method
+        :return: False if the method was already added, e.g. with another translation unit
+        """
+        if key in self._added:
+            return False
+        self._added.add(key)
+        return True
+
+    def get_score(self, key: str) -> Optional[float]:
+        """
+        :param key: the key of a method
+        :return: the score of the method, None if it was not scored yet
+        """
+        return self._scores.get(key)
+
+    def set_score(self, key: str, score: float):
+        self._scores[key] = score
+
+    def get_scores(self) -> Dict[str, float]:
+        """
+        :return: the scores of the methods added in this run by their key, the scores of other methods are dropped
+        """
+        return {key: score for key, score in self._scores.items() if key in self._added}
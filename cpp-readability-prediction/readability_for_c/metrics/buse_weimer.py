@@ -1,85 +1,18 @@
 from enum import Enum
 from typing import Callable, List, Dict
 
+import numpy as np
+
 from code_processing.analyzer import CodeAnalyzer
-from code_processing.lexer import Token, TokenKind, Lexer
+from code_processing.lexer import Token, TokenKind, Lexer, TokenTable
+from metrics.catalogue import Cost, Feature, FeatureFactory, Input, feature
 from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
 
 
-def create_bw_feature_calculator(metric_type: str, code: str, lexer: Lexer, **kwargs):
-    if metric_type == 'BW_AvgBlankLine':
-        return AvgBlankLineBWFC(code, lexer)
-    elif metric_type == 'BW_AvgComment':
-        return AvgCommentBWFC(code, lexer)
-    elif metric_type == 'BW_MaxCharOccurrence':
-        return MaxCharOccurrenceBWFC(code, lexer)
-    elif metric_type == 'BW_MaxWordOccurrence':
-        return MaxWordOccurrenceBWFC(code, lexer)
-
-    assert isinstance(kwargs.get('aggregation', None), Aggregation)
-    assert isinstance(kwargs.get('analyzer', None), CodeAnalyzer)
-    if metric_type == 'BW_IdentifiersLength':
-        return IdentifiersLengthBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Assignment':
-        return AssignmentBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Commas':
-        return CommasBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Comparison':
-        return ComparisonBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Condition':
-        return ConditionBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Keyword':
-        return KeywordBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Indentation':
-        return IndentationBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_LineLength':
-        return LineLengthBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Space':
-        return SpaceBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Loop':
-        return LoopBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_NumberOfIdentifiers':
-        return NumberOfIdentifiersBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Number':
-        return NumberBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Operator':
-        return OperatorBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Parenthesis':
-        return ParenthesisBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    elif metric_type == 'BW_Period':
-        return PeriodBWFC(kwargs['analyzer'], kwargs['aggregation'], code, lexer)
-    else:
-        raise ValueError(f'Unknown metric type: {metric_type}')
-
-
-def get_all_feature_calculators(code: str, lexer: Lexer, analyzer=None) -> Dict[str, FeatureCalculator]:
-    results = {}
-    for metric in [
-        'BW_AvgBlankLine', 'BW_AvgComment', 'BW_MaxCharOccurrence', 'BW_MaxWordOccurrence'
-    ]:
-        fc = create_bw_feature_calculator(metric, code, lexer)
-        results[fc.name] = fc
-
-    assert isinstance(analyzer, CodeAnalyzer)
-
-    for metric in [
-        'BW_Assignment', 'BW_Commas', 'BW_Comparison', 'BW_Condition', 'BW_Space',
-        'BW_Loop', 'BW_Operator', 'BW_Parenthesis', 'BW_Period',
-    ]:
-        # Only AVG aggregation
-        fc = create_bw_feature_calculator(metric, code, lexer, aggregation=Aggregation.AVG, analyzer=analyzer)
-        results[fc.name] = fc
-
-    for metric in [
-        'BW_IdentifiersLength', 'BW_Keyword', 'BW_LineLength',
-        'BW_NumberOfIdentifiers', 'BW_Number', 'BW_Indentation',
-    ]:
-        # Both AVG and MAX aggregation
-        for agg in Aggregation:
-            fc = create_bw_feature_calculator(metric, code, lexer, aggregation=agg, analyzer=analyzer)
-            results[fc.name] = fc
-
-    return results
+def get_all_feature_calculators(
+        code: str, lexer: Lexer, analyzer=None, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, lexer, analyzer, context) for f in FEATURES}
 
 
 class Aggregation(Enum):
@@ -162,10 +95,25 @@ class MaxWordOccurrenceBWFC(BuseWeimerFC):
         return float(max(word_counts.values()))
 
 
-class IdentifiersLengthBWFC(BuseWeimerFC):
+class WithoutCommentsBWFC(BuseWeimerFC):
+    """
+    Feature of the code without comments.
+    The tokens are derived from the tokens of the original code instead of lexing the code again.
+    """
+
     def __init__(self, analyzer: CodeAnalyzer, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.code = analyzer.delete_comments(self.code)
+        self.analyzer = analyzer
+        self.code_with_comments = self.code
+        self.code = self.context.delete_comments(self.code, analyzer)
+
+    @property
+    def tokens(self):
+        assert self.lexer is not None, "Cannot tokenize without a lexer"
+        return self.context.lexing_without_comments(self.code_with_comments, self.lexer, self.analyzer)
+
+
+class IdentifiersLengthBWFC(WithoutCommentsBWFC):
 
     @property
     def name(self):
@@ -180,26 +128,108 @@ class IdentifiersLengthBWFC(BuseWeimerFC):
         raise ValueError(f'{self.name} Not supported aggregation: {self.aggregation.name}')
 
 
-class LineBasedBWFC(BuseWeimerFC):
-    def __init__(self, analyzer: CodeAnalyzer, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.code = analyzer.delete_comments(self.code)
-
-    def calculate_line_metric(self, line_tokens: List[Token], line_index: int) -> float:
+class LineMatrix:
+    """
+    Per line features of the code without comments, computed in one pass over its tokens and lines and
+    shared by the line based features of a snippet: the number of tokens of every category by line as a
+    ``(lines x categories)`` matrix, and the length, the indentation and the number of spaces of every line.
+    """
+    # Categories of tokens by their values, the sets of values are disjoint
+    _VALUE_CATEGORIES = {
+        'assignment': ['=', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^='],
+        'comparison': ['==', '!=', '>', '>=', '<', '<='],
+        'conditional': ['if'],
+        'loop': ['for', 'while'],
+        'operator': ['+', '-', '*', '/', '%'],
+        'comma': [','],
+        'parenthesis': ['(', '{'],
+        'period': ['.'],
+    }
+    # Code of the value category of every value, 0 for other values
+    _VALUE_CODES = {
+        value: code for code, values in enumerate(_VALUE_CATEGORIES.values(), start=1) for value in values
+    }
+    # Kind a token of a value category must have, any kind if None
+    _VALUE_CATEGORY_KINDS = {
+        'assignment': TokenKind.OPERATOR,
+        'comparison': TokenKind.OPERATOR,
+        'conditional': TokenKind.KEYWORD,
+        'loop': TokenKind.KEYWORD,
+        'operator': TokenKind.OPERATOR,
+        'comma': None,
+        'parenthesis': None,
+        'period': None,
+    }
+    # Categories of tokens by their kinds
+    _KIND_CATEGORIES = {
+        'keyword': TokenKind.KEYWORD,
+        'identifier': TokenKind.IDENTIFIER,
+        'number': TokenKind.NUMBER,
+    }
+    CATEGORIES = list(_VALUE_CATEGORIES) + list(_KIND_CATEGORIES)
+
+    def __init__(self, lines: List[str], tokens: TokenTable, tab_size: int):
+        """
+        :param lines: the lines of the code with their line breaks
+        :param tokens: the tokens of the code
+        :param tab_size: number of spaces a tab is expanded to
+        """
+        line_count = len(lines)
+        tokens = TokenTable.from_tokens(tokens)
+        value_codes = np.fromiter(
+            (self._VALUE_CODES.get(value, 0) for value in tokens.values), dtype=np.uint8, count=len(tokens))
+        self.counts = np.zeros((line_count, len(self.CATEGORIES)), dtype=np.int64)
+        for code, category in enumerate(self._VALUE_CATEGORIES, start=1):
+            mask = value_codes == code
+            kind = self._VALUE_CATEGORY_KINDS[category]
+            if kind is not None:
+                mask &= tokens.kinds == kind.value
+            self.counts[:, self.CATEGORIES.index(category)] = tokens.count_by_line(mask, line_count)
+        for category, kind in self._KIND_CATEGORIES.items():
+            self.counts[:, self.CATEGORIES.index(category)] = tokens.count_by_line(
+                tokens.kinds == kind.value, line_count)
+
+        tab = ' ' * tab_size
+        self.lengths = np.array([len(line.strip('\n')) for line in lines], dtype=np.int64)
+        self.indentations = np.array(
+            [len(line) - len(line.lstrip(' ')) for line in (line.replace('\t', tab) for line in lines)],
+            dtype=np.int64,
+        )
+        # Blank lines have no spaces
+        self.spaces = np.array(
+            [0 if line.strip() == '' else line.count(' ') for line in lines], dtype=np.int64)
+
+    def column(self, category: str) -> np.ndarray:
+        """
+        :param category: a category of tokens
+        :return: the number of tokens of the category by line
+        """
+        return self.counts[:, self.CATEGORIES.index(category)]
+
+
+class LineBasedBWFC(WithoutCommentsBWFC):
+    """
+    Feature that aggregates a value of every line of the code without comments.
+    """
+
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        """
+        :param matrix: the per line features of the code
+        :return: the value of every line
+        """
         raise NotImplementedError()
 
     def calculate_metric(self) -> float:
-        lines_tokens = [[] for _ in self.lines]
-        for token in self.tokens:
-            lines_tokens[token.start_location.line - 1].append(token)
-        scores = [
-            self.calculate_line_metric(line_tokens, line_index)
-            for line_index, line_tokens in enumerate(lines_tokens)
-        ]
+        matrix = self.context.memoize(
+            ('BW line matrix', self.code_with_comments, self.lexer, self.analyzer, self.tab_size),
+            lambda: LineMatrix(self.lines, self.tokens, self.tab_size),
+        )
+        values = self.get_line_values(matrix)
+        # The values are integers, so their sum is exact like the sum of the values of the lines one by one
         if Aggregation.MAX == self.aggregation:
-            return max(scores)
+            return float(values.max())
         elif Aggregation.AVG == self.aggregation:
-            return sum(scores) / len(lines_tokens)
+            return float(values.sum()) / len(self.lines)
         raise ValueError(f'{self.__class__.name} Not supported aggregation: {self.aggregation.name}')
 
 
@@ -208,13 +238,8 @@ class AssignmentBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} assignment'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.OPERATOR and token.value in [
-                '=', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^='
-            ]
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('assignment')
 
 
 class CommasBWFC(LineBasedBWFC):
@@ -222,11 +247,8 @@ class CommasBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} commas'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.value == ','
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('comma')
 
 
 class ComparisonBWFC(LineBasedBWFC):
@@ -234,11 +256,8 @@ class ComparisonBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} comparisons'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.OPERATOR and token.value in ['==', '!=', '>', '>=', '<', '<=']
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('comparison')
 
 
 class ConditionBWFC(LineBasedBWFC):
@@ -246,11 +265,8 @@ class ConditionBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} conditionals'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.KEYWORD and token.value in ['if']
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('conditional')
 
 
 class KeywordBWFC(LineBasedBWFC):
@@ -258,11 +274,8 @@ class KeywordBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} keywords'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.KEYWORD
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('keyword')
 
 
 class IndentationBWFC(LineBasedBWFC):
@@ -270,9 +283,8 @@ class IndentationBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} indentation'
 
-    def calculate_line_metric(self, _: List[Token], line_index: int) -> float:
-        line = self.lines[line_index].replace('\t', ''.join([' ' for _ in range(self.tab_size)]))
-        return float(len(line) - len(line.lstrip(' ')))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.indentations
 
 
 class LineLengthBWFC(LineBasedBWFC):
@@ -280,8 +292,8 @@ class LineLengthBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} line length'
 
-    def calculate_line_metric(self, _: List[Token], line_index: int) -> float:
-        return float(len(self.lines[line_index].strip('\n')))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.lengths
 
 
 class SpaceBWFC(LineBasedBWFC):
@@ -289,10 +301,8 @@ class SpaceBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} spaces'
 
-    def calculate_line_metric(self, _: List[Token], line_index: int) -> float:
-        if self.lines[line_index].strip() == '':
-            return 0.
-        return float(len(self.lines[line_index].split(' ')) - 1)
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.spaces
 
 
 class LoopBWFC(LineBasedBWFC):
@@ -300,11 +310,8 @@ class LoopBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} loops'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.KEYWORD and token.value in ['for', 'while']
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('loop')
 
 
 class NumberOfIdentifiersBWFC(LineBasedBWFC):
@@ -312,11 +319,8 @@ class NumberOfIdentifiersBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} number of identifiers'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.IDENTIFIER
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('identifier')
 
 
 class NumberBWFC(LineBasedBWFC):
@@ -324,11 +328,8 @@ class NumberBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} numbers'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.NUMBER
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('number')
 
 
 class OperatorBWFC(LineBasedBWFC):
@@ -336,11 +337,8 @@ class OperatorBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} operators'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.kind == TokenKind.OPERATOR and token.value in ['+', '-', '*', '/', '%']
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('operator')
 
 
 class ParenthesisBWFC(LineBasedBWFC):
@@ -348,11 +346,8 @@ class ParenthesisBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} parenthesis'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.value in ['(', '{']
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('parenthesis')
 
 
 class PeriodBWFC(LineBasedBWFC):
@@ -360,8 +355,53 @@ class PeriodBWFC(LineBasedBWFC):
     def name(self):
         return f'BW {self.aggregation.name} periods'
 
-    def calculate_line_metric(self, line_tokens: List[Token], _: int) -> float:
-        return float(len(self.filter_tokens_by_predicate(
-            line_tokens,
-            lambda token: token.value == '.'
-        )))
+    def get_line_values(self, matrix: LineMatrix) -> np.ndarray:
+        return matrix.column('period')
+
+
+FAMILY = 'Buse-Weimer'
+
+
+def _create(cls: type, aggregation: Aggregation) -> FeatureFactory:
+    return lambda code, lexer, analyzer, context: cls(analyzer, aggregation, code, lexer, context=context)
+
+
+_LINE_INPUTS = [Input.COMMENT_FREE_LINES, Input.COMMENT_FREE_TOKENS]
+
+FEATURES: List[Feature] = [
+    feature('BW AVG blank lines', FAMILY, [Input.LINES], Cost.LOW,
+            lambda code, lexer, analyzer, context: AvgBlankLineBWFC(code, lexer, context=context)),
+    feature('BW AVG comments', FAMILY, [Input.LINES, Input.TOKENS], Cost.LOW,
+            lambda code, lexer, analyzer, context: AvgCommentBWFC(code, lexer, context=context)),
+    feature('BW MAX char', FAMILY, [Input.LINES], Cost.LOW,
+            lambda code, lexer, analyzer, context: MaxCharOccurrenceBWFC(code, lexer, context=context)),
+    feature('BW MAX words', FAMILY, [Input.TOKENS], Cost.LOW,
+            lambda code, lexer, analyzer, context: MaxWordOccurrenceBWFC(code, lexer, context=context)),
+    # Only AVG aggregation
+    feature('BW AVG assignment', FAMILY, _LINE_INPUTS, Cost.LOW, _create(AssignmentBWFC, Aggregation.AVG)),
+    feature('BW AVG commas', FAMILY, _LINE_INPUTS, Cost.LOW, _create(CommasBWFC, Aggregation.AVG)),
+    feature('BW AVG comparisons', FAMILY, _LINE_INPUTS, Cost.LOW, _create(ComparisonBWFC, Aggregation.AVG)),
+    feature('BW AVG conditionals', FAMILY, _LINE_INPUTS, Cost.LOW, _create(ConditionBWFC, Aggregation.AVG)),
+    feature('BW AVG spaces', FAMILY, _LINE_INPUTS, Cost.LOW, _create(SpaceBWFC, Aggregation.AVG)),
+    feature('BW AVG loops', FAMILY, _LINE_INPUTS, Cost.LOW, _create(LoopBWFC, Aggregation.AVG)),
+    feature('BW AVG operators', FAMILY, _LINE_INPUTS, Cost.LOW, _create(OperatorBWFC, Aggregation.AVG)),
+    feature('BW AVG parenthesis', FAMILY, _LINE_INPUTS, Cost.LOW, _create(ParenthesisBWFC, Aggregation.AVG)),
+    feature('BW AVG periods', FAMILY, _LINE_INPUTS, Cost.LOW, _create(PeriodBWFC, Aggregation.AVG)),
+    # Both AVG and MAX aggregation
+    feature('BW AVG identifiers length', FAMILY, [Input.COMMENT_FREE_TOKENS], Cost.LOW,
+            _create(IdentifiersLengthBWFC, Aggregation.AVG)),
+    feature('BW MAX identifiers length', FAMILY, [Input.COMMENT_FREE_TOKENS], Cost.LOW,
+            _create(IdentifiersLengthBWFC, Aggregation.MAX)),
+    feature('BW AVG keywords', FAMILY, _LINE_INPUTS, Cost.LOW, _create(KeywordBWFC, Aggregation.AVG)),
+    feature('BW MAX keywords', FAMILY, _LINE_INPUTS, Cost.LOW, _create(KeywordBWFC, Aggregation.MAX)),
+    feature('BW AVG line length', FAMILY, _LINE_INPUTS, Cost.LOW, _create(LineLengthBWFC, Aggregation.AVG)),
+    feature('BW MAX line length', FAMILY, _LINE_INPUTS, Cost.LOW, _create(LineLengthBWFC, Aggregation.MAX)),
+    feature('BW AVG number of identifiers', FAMILY, _LINE_INPUTS, Cost.LOW,
+            _create(NumberOfIdentifiersBWFC, Aggregation.AVG)),
+    feature('BW MAX number of identifiers', FAMILY, _LINE_INPUTS, Cost.LOW,
+            _create(NumberOfIdentifiersBWFC, Aggregation.MAX)),
+    feature('BW AVG numbers', FAMILY, _LINE_INPUTS, Cost.LOW, _create(NumberBWFC, Aggregation.AVG)),
+    feature('BW MAX numbers', FAMILY, _LINE_INPUTS, Cost.LOW, _create(NumberBWFC, Aggregation.MAX)),
+    feature('BW AVG indentation', FAMILY, _LINE_INPUTS, Cost.LOW, _create(IndentationBWFC, Aggregation.AVG)),
+    feature('BW MAX indentation', FAMILY, _LINE_INPUTS, Cost.LOW, _create(IndentationBWFC, Aggregation.MAX)),
+]
@@ -0,0 +1,92 @@
+import dataclasses
+from enum import Enum, IntEnum
+from typing import Callable, Dict, FrozenSet, Iterable, List
+
+from code_processing.analyzer import CodeAnalyzer
+from code_processing.lexer import Lexer
+from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
+
+
+class Input(Enum):
+    """
+    Intermediate products of a snippet that features are calculated from.
+    """
+    LINES = 'lines'
+    COMMENT_FREE_LINES = 'comment-free lines'
+    TOKENS = 'tokens'
+    COMMENT_FREE_TOKENS = 'comment-free tokens'
+    COMMENTS = 'comments'
+    # Terms of the identifiers or the comments, split, filtered and stemmed
+    TERMS = 'terms'
+    WORDNET = 'WordNet'
+    # Kind of the token at every character of the snippet
+    COLOR_RASTER = 'color raster'
+
+
+class Cost(IntEnum):
+    """
+    Relative cost of a feature once its inputs are known.
+    """
+    # Counting over lines or tokens
+    LOW = 1
+    # Work per character or per term, e.g. the areas of the color raster or a DFT
+    MEDIUM = 2
+    # Lookups of WordNet, clustering or similarities between blocks
+    HIGH = 3
+
+
+# Creates the calculator of a feature from the code, the lexer, the analyzer and the context of a snippet
+FeatureFactory = Callable[[str, Lexer, CodeAnalyzer, SnippetContext], FeatureCalculator]
+
+
+@dataclasses.dataclass(frozen=True)
+class Feature:
+    name: str
+    family: str
+    inputs: FrozenSet[Input]
+    cost: Cost
+    create: FeatureFactory = dataclasses.field(repr=False, compare=False)
+
+
+@dataclasses.dataclass
+class FeatureGroup:
+    # Inputs shared by the features of the group
+    inputs: FrozenSet[Input]
+    features: List[Feature]
+
+    @property
+    def cost(self) -> Cost:
+        return max(feature.cost for feature in self.features)
+
+
+def feature(name: str, family: str, inputs: Iterable[Input], cost: Cost, create: FeatureFactory) -> Feature:
+    return Feature(name, family, frozenset(inputs), cost, create)
+
+
+def index(features: Iterable[Feature]) -> Dict[str, Feature]:
+    """
+    :param features: features with unique names
+    :return: the features by name, in the order of the features
+    """
+    indexed = {}
+    for f in features:
+        if f.name in indexed:
+            raise ValueError(f'Duplicate feature: {f.name}')
+        indexed[f.name] = f
+    return indexed
+
+
+def plan(features: Iterable[Feature]) -> List[FeatureGroup]:
+    """
+    Group features by the inputs they share, so that every group is calculated in one pass while its
+    intermediate products are at hand. The cheapest groups come first, then features that do not need the
+    expensive inputs (e.g. WordNet) are known even if a later group fails.
+    :param features: the features to calculate
+    :return: the groups, the features of a group keep their order
+    """
+    groups: Dict[FrozenSet[Input], FeatureGroup] = {}
+    for f in features:
+        groups.setdefault(f.inputs, FeatureGroup(f.inputs, [])).features.append(f)
+    # The sort is stable, so groups of the same cost keep the order of their first feature
+    return sorted(groups.values(), key=lambda group: group.cost)
@@ -1,18 +1,15 @@
-from typing import Dict
+from typing import Dict, List
 
 import wordnet
-from code_processing import filter_manager
 from code_processing.analyzer import CodeAnalyzer
+from metrics.catalogue import Cost, Feature, Input, feature
 from metrics.feature_calculator import FeatureCalculator, TextualFC
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, analyzer: CodeAnalyzer) -> Dict[str, FeatureCalculator]:
-    fc_list = [CommentsIdentifierConsistencyFC(
-        analyzer=analyzer,
-        use_synonyms=use_synonyms,
-        code=code,
-    ) for use_synonyms in [False, True]]
-    return {fc.name(): fc for fc in fc_list}
+def get_all_feature_calculators(
+        code: str, analyzer: CodeAnalyzer, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, None, analyzer, context) for f in FEATURES}
 
 
 class CommentsIdentifierConsistencyFC(TextualFC):
@@ -38,7 +35,7 @@ class CommentsIdentifierConsistencyFC(TextualFC):
         return 'Comments and Identifiers Consistency'
 
     def calculate_metric(self) -> float:
-        source_code = filter_manager.delete_blank_lines(self.code)
+        source_code = self.context.delete_blank_lines(self.code)
 
         comment_words = self.extract_comment_terms(source_code)
         original_identifiers = self.extract_identifier_terms(source_code)
@@ -55,3 +52,16 @@ class CommentsIdentifierConsistencyFC(TextualFC):
             identifiers = identifiers.union(self.convert_to_stems(syn_identifiers))
 
         return len(identifiers.intersection(comment_words)) / len(identifiers.union(comment_words))
+
+
+FAMILY = 'CIC'
+
+FEATURES: List[Feature] = [
+    feature('Comments and Identifiers Consistency', FAMILY, [Input.COMMENTS, Input.TERMS], Cost.MEDIUM,
+            lambda code, lexer, analyzer, context: CommentsIdentifierConsistencyFC(
+                analyzer=analyzer, use_synonyms=False, code=code, context=context)),
+    feature('Synonym Comments and Identifiers Consistency', FAMILY, [Input.COMMENTS, Input.TERMS, Input.WORDNET],
+            Cost.HIGH,
+            lambda code, lexer, analyzer, context: CommentsIdentifierConsistencyFC(
+                analyzer=analyzer, use_synonyms=True, code=code, context=context)),
+]
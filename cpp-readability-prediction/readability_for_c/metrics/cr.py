@@ -1,14 +1,15 @@
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 import text_processing
-from code_processing import filter_manager
 from code_processing.analyzer import CodeAnalyzer
+from metrics.catalogue import Cost, Feature, Input, feature
 from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, analyzer: CodeAnalyzer) -> Dict[str, FeatureCalculator]:
-    fc = CommentsReadabilityFC(code=code, analyzer=analyzer)
-    return {fc.name(): fc}
+def get_all_feature_calculators(
+        code: str, analyzer: CodeAnalyzer, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, None, analyzer, context) for f in FEATURES}
 
 
 class CommentsReadabilityFC(FeatureCalculator):
@@ -20,8 +21,8 @@ class CommentsReadabilityFC(FeatureCalculator):
         return "Comments Readability"
 
     def calculate_metric(self) -> float:
-        source_code = filter_manager.delete_blank_lines(self.code)
-        comment = self._analyzer.get_comments(source_code)
+        source_code = self.context.delete_blank_lines(self.code)
+        comment = self.context.get_comments(source_code, self._analyzer)
         syllables, words, sentences = self._extract_nl_features(comment)
         if words != 0 and sentences != 0:
             result = (206.835 -
@@ -38,3 +39,12 @@ class CommentsReadabilityFC(FeatureCalculator):
             count = text_processing.count_syllables(word)
             syllables += count
         return syllables, len(words), len(sentences)
+
+
+FAMILY = 'CR'
+
+FEATURES: List[Feature] = [
+    feature('Comments Readability', FAMILY, [Input.COMMENTS], Cost.LOW,
+            lambda code, lexer, analyzer, context: CommentsReadabilityFC(
+                code=code, analyzer=analyzer, context=context)),
+]
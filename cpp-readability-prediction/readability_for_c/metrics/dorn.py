@@ -1,4 +1,3 @@
-import math
 import re
 from typing import List, Callable, Dict
 
@@ -6,81 +5,16 @@ import numpy as np
 from numpy import fft, std
 
 from code_processing.analyzer import CodeAnalyzer
-from code_processing.lexer import Lexer, Token, TokenKind
+from code_processing.lexer import Lexer, TokenKind
 from code_processing.rse_lexer import RSELexer
+from metrics.catalogue import Cost, Feature, FeatureFactory, Input, feature
 from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
 
 
-def create_dorn_feature_calculator(metric_type: str, code: str, lexer: Lexer, **kwargs):
-    lexer = RSELexer(lexer)
-    if metric_type == 'Dorn_CharactersAlignmentBlocks':
-        return CharactersAlignmentBlocks(code, lexer)
-    elif metric_type == 'Dorn_CharactersAlignmentExtent':
-        return CharactersAlignmentExtent(code, lexer)
-
-    elif metric_type == 'Dorn_ColorsAreas':
-        assert isinstance(kwargs.get('kind', None), TokenKind)
-        return ColorsAreas(kwargs.get('kind'), code=code, lexer=lexer)
-    elif metric_type == 'Dorn_ColorsMutualAreas':
-        assert isinstance(kwargs.get('kind1', None), TokenKind)
-        assert isinstance(kwargs.get('kind2', None), TokenKind)
-        return ColorsMutualAreas(
-            kwargs.get('kind1'), kwargs.get('kind2'),
-            code=code, lexer=lexer,
-        )
-
-    elif metric_type == 'Dorn_DFTBandwidth':
-        assert isinstance(kwargs.get('analyzer', None), CodeAnalyzer)
-        analyzer = kwargs.get('analyzer')
-        assert isinstance(kwargs.get('kind', None), str)
-
-        return DFTBandwidth(
-            kwargs.get('kind'), analyzer,
-            code=code, lexer=lexer,
-        )
-    elif metric_type == 'Dorn_VisualBandwidth2D':
-        assert isinstance(kwargs.get('kind', None), TokenKind)
-        assert kwargs.get('coordinate', None) in ['X', 'Y']
-        return VisualBandwidth2D(
-            kwargs.get('coordinate'), kwargs.get('kind'),
-            code=code, lexer=lexer,
-        )
-    else:
-        raise ValueError(f'Unknown metric type: {metric_type}')
-
-
-def get_all_feature_calculators(code: str, lexer: Lexer, analyzer=None) -> Dict[str, FeatureCalculator]:
-    results = {}
-
-    for metric in ['Dorn_CharactersAlignmentBlocks', 'Dorn_CharactersAlignmentExtent']:
-        fc = create_dorn_feature_calculator(metric, code, lexer)
-        results[fc.name] = fc
-
-    for kind in ColorsAreas.ALL_KINDS:
-        fc = create_dorn_feature_calculator('Dorn_ColorsAreas', code, lexer, kind=kind)
-        results[fc.name] = fc
-
-    for i in range(len(ColorsMutualAreas.ALL_KINDS) - 1):
-        for j in range(i + 1, len(ColorsMutualAreas.ALL_KINDS)):
-            kind1 = ColorsMutualAreas.ALL_KINDS[j]
-            kind2 = ColorsMutualAreas.ALL_KINDS[i]
-            fc = create_dorn_feature_calculator(
-                'Dorn_ColorsMutualAreas', code, lexer, kind1=kind1, kind2=kind2)
-            results[fc.name] = fc
-
-    for kind in DFTBandwidth.ALL_KINDS:
-        assert isinstance(analyzer, CodeAnalyzer)
-        fc = create_dorn_feature_calculator(
-            'Dorn_DFTBandwidth', code, lexer, kind=kind, analyzer=analyzer)
-        results[fc.name] = fc
-
-    for kind in VisualBandwidth2D.ALL_KINDS:
-        for coordinate in ['X', 'Y']:
-            fc = create_dorn_feature_calculator(
-                'Dorn_VisualBandwidth2D', code, lexer, coordinate=coordinate, kind=kind)
-            results[fc.name] = fc
-
-    return results
+def get_all_feature_calculators(
+        code: str, lexer: Lexer, analyzer=None, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, lexer, analyzer, context) for f in FEATURES}
 
 
 class CharactersAlignmentBlocks(FeatureCalculator):
@@ -149,27 +83,76 @@ class VisualFeatureCalculator(FeatureCalculator):
         lines = self.lines
         self.rows = len(lines)
         self.cols = max([len(line) for line in lines]) if len(lines) > 0 else 0
-        self._color_matrix = None
 
     @property
-    def color_matrix(self):
-        if self._color_matrix is not None:
-            return self._color_matrix
-        self._color_matrix = [[0 for _ in range(self.cols)] for _ in range(self.rows)]
-        for token in self.tokens:
-            if token.kind == TokenKind.COMMENT and token.start_location.line != token.end_location.line:
-                block_comment_lines = token.value.splitlines(keepends=True)
-                start_j = token.start_location.column - 1
+    def color_raster(self) -> np.ndarray:
+        """
+        :return: the kind (``TokenKind`` value) of the token at every character of the code, 0 for no token,
+        as a ``rows x cols`` uint8 array. Shared by the visual features of the snippet.
+        """
+        return self.context.memoize(('color raster', self.code, self.lexer), self._create_color_raster)
+
+    @property
+    def color_matrix(self) -> List[List[int]]:
+        """
+        :return: the color raster as a list of rows
+        """
+        return self.color_raster.tolist()
+
+    @property
+    def area_counts(self) -> np.ndarray:
+        """
+        The area of a line spans from its start to its last token, the characters after the last token
+        (e.g. trailing spaces) and lines without tokens are not part of the area.
+        Shared by the visual features of the snippet.
+        :return: the number of characters of the area by kind (``TokenKind`` value), 0 for no token
+        """
+        return self.context.memoize(('color areas', self.code, self.lexer), self._count_areas)
+
+    def _create_color_raster(self) -> np.ndarray:
+        color_raster = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        lines = self.lines
+        # Character index of every byte of the non-ASCII lines and of their end, by line index
+        char_indexes: Dict[int, np.ndarray] = {}
+
+        def to_char_column(row: int, column: int) -> int:
+            # The columns of the tokens count bytes, the raster has a column per character
+            if row not in char_indexes:
+                line = lines[row]
+                if line.isascii():
+                    return column
+                byte_counts = [len(c.encode('utf-8')) for c in line]
+                char_indexes[row] = np.append(np.repeat(np.arange(len(line)), byte_counts), len(line))
+            return int(char_indexes[row][column - 1]) + 1
+
+        def fill(row: int, start: int, end: int, kind: int):
+            if end > self.cols:
+                raise IndexError(f'Token beyond the end of line {row + 1}: columns {start} to {end}')
+            color_raster[row, start:end] = kind
+
+        tokens = self.tokens
+        # Read the token table column-wise instead of creating a token object for every token
+        for value, kind, start_line, start_column, end_line, end_column in zip(
+                tokens.values, tokens.kinds.tolist(), tokens.start_lines.tolist(), tokens.start_columns.tolist(),
+                tokens.end_lines.tolist(), tokens.end_columns.tolist()):
+            if kind == TokenKind.COMMENT.value and start_line != end_line:
+                block_comment_lines = value.splitlines(keepends=True)
+                start_j = to_char_column(start_line - 1, start_column) - 1
                 for i, line in enumerate(block_comment_lines):
-                    for j in range(start_j, start_j + len(line)):
-                        self._color_matrix[i + token.start_location.line - 1][j] = token.kind.value
+                    fill(i + start_line - 1, start_j, start_j + len(line), kind)
                     start_j = 0
-            elif token.start_location.line == token.end_location.line:
-                for j in range(token.start_location.column - 1, token.end_location.column - 1):
-                    self._color_matrix[token.start_location.line - 1][j] = token.kind.value
+            elif start_line == end_line:
+                row = start_line - 1
+                fill(row, to_char_column(row, start_column) - 1, to_char_column(row, end_column) - 1, kind)
             else:
-                raise RuntimeError(f'Unknown multi-lines token: {token.value} - {token.kind.name}')
-        return self._color_matrix
+                raise RuntimeError(f'Unknown multi-lines token: {value} - {TokenKind(kind).name}')
+        return color_raster
+
+    def _count_areas(self) -> np.ndarray:
+        color_raster = self.color_raster
+        # The characters followed by a token in their line, including the token itself
+        area = np.flip(np.logical_or.accumulate(np.flip(color_raster != 0, axis=1), axis=1), axis=1)
+        return np.bincount(color_raster[area], minlength=np.iinfo(np.uint8).max + 1)
 
 
 class ColorsAreas(VisualFeatureCalculator):
@@ -189,22 +172,16 @@ class ColorsAreas(VisualFeatureCalculator):
 
     @property
     def name(self):
-        return f'Dorn Areas {self.kind.name}s'
+        return self.feature_name(self.kind)
 
-    def calculate_metric(self) -> float:
-        color_matrix = self.color_matrix
-        total = 0
-        total_color = 0
-        for i in range(self.rows):
-            first_char = False
-            for j in range(self.cols - 1, -1, -1):
-                if color_matrix[i][j] != 0 or first_char:
-                    first_char = True
-                    total += 1
-                    if color_matrix[i][j] == self.kind.value:
-                        total_color += 1
+    @staticmethod
+    def feature_name(kind: TokenKind) -> str:
+        return f'Dorn Areas {kind.name}s'
 
-        return float(total_color) / total if total > 0 else 0.
+    def calculate_metric(self) -> float:
+        area_counts = self.area_counts
+        total = int(area_counts.sum())
+        return float(area_counts[self.kind.value]) / total if total > 0 else 0.
 
 
 class ColorsMutualAreas(VisualFeatureCalculator):
@@ -225,7 +202,11 @@ class ColorsMutualAreas(VisualFeatureCalculator):
 
     @property
     def name(self):
-        return f'Dorn Areas {self.kind1.name}s / {self.kind2.name}s'
+        return self.feature_name(self.kind1, self.kind2)
+
+    @staticmethod
+    def feature_name(kind1: TokenKind, kind2: TokenKind) -> str:
+        return f'Dorn Areas {kind1.name}s / {kind2.name}s'
 
     @classmethod
     def get_all_features(cls, lexer: RSELexer) -> List["ColorsMutualAreas"]:
@@ -236,20 +217,9 @@ class ColorsMutualAreas(VisualFeatureCalculator):
         ]
 
     def calculate_metric(self) -> float:
-        color_matrix = self.color_matrix
-        total_color1 = 0
-        total_color2 = 0
-        for i in range(self.rows):
-            first_char = False
-            for j in range(self.cols - 1, -1, -1):
-                if color_matrix[i][j] != 0 or first_char:
-                    first_char = True
-                    if color_matrix[i][j] == self.kind1.value:
-                        total_color1 += 1
-                    if color_matrix[i][j] == self.kind2.value:
-                        total_color2 += 1
-
-        return float(total_color1) / total_color2 if total_color2 > 0 else 0.
+        area_counts = self.area_counts
+        total_color2 = int(area_counts[self.kind2.value])
+        return float(area_counts[self.kind1.value]) / total_color2 if total_color2 > 0 else 0.
 
 
 class DFTBandwidth(VisualFeatureCalculator):
@@ -295,7 +265,21 @@ class DFTBandwidth(VisualFeatureCalculator):
 
     @property
     def name(self):
-        return f'Dorn DFT {self.kind}'
+        return self.feature_name(self.kind)
+
+    @staticmethod
+    def feature_name(kind: str) -> str:
+        return f'Dorn DFT {kind}'
+
+    @property
+    def comment_free_lines(self) -> List[str]:
+        """
+        :return: the lines of the code without comments, without their line breaks
+        """
+        return self.context.memoize(
+            ('comment free lines', self.code, self.analyzer),
+            lambda: self.context.delete_comments(self.code, self.analyzer).splitlines(),
+        )
 
     def calculate_metric(self) -> float:
         amplitudes = self.get_dft_amplitudes(self.get_features())
@@ -303,24 +287,25 @@ class DFTBandwidth(VisualFeatureCalculator):
 
     @staticmethod
     def calculate_bandwidth(vector: List[float]) -> float:
-        std_value = std(vector)
-        for i in range(len(vector) - 1, -1, -1):
-            if vector[i] > std_value:
-                return float(i)
-        return 0.0
+        vector = np.asarray(vector)
+        above = np.flatnonzero(vector > std(vector))
+        return float(above[-1]) if len(above) > 0 else 0.0
 
     @staticmethod
     def get_dft_amplitudes(signals: List[float]) -> List[float]:
         if len(signals) == 0:
             return []
-        coefficients = fft.fft(signals + [0.0 for _ in range(len(signals))], n=len(signals)).view(np.float64)
-        amplitudes = [
-            math.sqrt(
-                (coefficients[2 * i] * coefficients[2 * i]) + (coefficients[2 * i + 1] * coefficients[2 * i + 1])
-            )
-            for i in range(len(signals))
-        ]
-        return amplitudes
+        coefficients = fft.fft(signals + [0.0 for _ in range(len(signals))], n=len(signals))
+        return DFTBandwidth.get_amplitudes(coefficients).tolist()
+
+    @staticmethod
+    def get_amplitudes(coefficients: np.ndarray) -> np.ndarray:
+        """
+        :param coefficients: complex coefficients of a DFT
+        :return: the amplitudes of the coefficients, computed like ``math.sqrt(re * re + im * im)``
+        and unlike ``np.abs``, which rounds differently
+        """
+        return np.sqrt(coefficients.real * coefficients.real + coefficients.imag * coefficients.imag)
 
     def get_features(self) -> List[float]:
         func = None
@@ -338,18 +323,14 @@ class DFTBandwidth(VisualFeatureCalculator):
         return self._get_len_split_by_delimiter(',')
 
     def get_comments(self) -> List[float]:
-        color_matrix = self.color_matrix
-        return [
-            0.0 if any([
-                color_matrix[i][j] not in [0, TokenKind.COMMENT.value] for j in range(len(color_matrix[i]))
-            ]) or TokenKind.COMMENT.value not in color_matrix[i]
-            else 1.0
-            for i in range(len(color_matrix))
-        ]
+        color_raster = self.color_raster
+        comments = color_raster == TokenKind.COMMENT.value
+        # Lines with comments and no other tokens
+        comment_lines = comments.any(axis=1) & ~((color_raster != 0) & ~comments).any(axis=1)
+        return comment_lines.astype(float).tolist()
 
     def get_indentations(self) -> List[float]:
-        code = self.analyzer.delete_comments(self.code)
-        lines = code.splitlines()
+        lines = self.comment_free_lines
         indentations = [0.0 for _ in range(len(lines))]
         for i, line in enumerate(lines):
             indentation_length = 0
@@ -364,19 +345,19 @@ class DFTBandwidth(VisualFeatureCalculator):
         return self._get_len_split_by_pattern(r'(==|<=|>=|!=|<|>)')
 
     def get_ifs(self) -> List[float]:
-        return self._count_tokens(lambda token: token.kind == TokenKind.KEYWORD and token.value == 'if')
+        return self._count_tokens(lambda kind, value: kind == TokenKind.KEYWORD.value and value == 'if')
 
     def get_keywords(self) -> List[float]:
-        return self._count_tokens(lambda token: token.kind == TokenKind.KEYWORD)
+        return self._count_tokens(lambda kind, _: kind == TokenKind.KEYWORD.value)
 
     def get_line_lengths(self) -> List[float]:
         return [len(line) for line in self.lines]
 
     def get_loops(self) -> List[float]:
-        return self._count_tokens(lambda token: token.kind == TokenKind.KEYWORD and token.value in ['while', 'for'])
+        return self._count_tokens(lambda kind, value: kind == TokenKind.KEYWORD.value and value in ['while', 'for'])
 
     def get_identifiers(self) -> List[float]:
-        return self._count_tokens(lambda token: token.kind == TokenKind.IDENTIFIER)
+        return self._count_tokens(lambda kind, _: kind == TokenKind.IDENTIFIER.value)
 
     def get_numbers(self) -> List[float]:
         return self._get_len_split_by_pattern(r'[^A-Za-z]\d+\.?\d*')
@@ -391,37 +372,37 @@ class DFTBandwidth(VisualFeatureCalculator):
         return self._get_len_split_by_delimiter('.')
 
     def get_spaces(self) -> List[float]:
-        code = self.analyzer.delete_comments(self.code)
-        lines = code.splitlines()
+        lines = self.comment_free_lines
         return [
             0. if line.strip() == '' else float(len(line.split(' ')) - 1)
             for line in lines
         ]
 
     def _get_len_split_by_pattern(self, pattern: str) -> List[float]:
-        code = self.analyzer.delete_comments(self.code)
-        lines = code.splitlines()
+        lines = self.comment_free_lines
         return [
             float(len(re.split(pattern, line)) - 1)
             for line in lines
         ]
 
     def _get_len_split_by_delimiter(self, delimiter: str) -> List[float]:
-        code = self.analyzer.delete_comments(self.code)
-        lines = code.splitlines()
+        lines = self.comment_free_lines
         return [
             float(len(line.split(delimiter)) - 1)
             for line in lines
         ]
 
-    def _count_tokens(self, predicate: Callable[[Token], bool]) -> List[float]:
-        code = self.analyzer.delete_comments(self.code)
-        tokens = self.lexer.lexing(code)
-        results = [0.0 for _ in range(len(code.splitlines()))]
-        for token in tokens:
-            if predicate(token):
-                results[token.start_location.line - 1] += 1.0
-        return results
+    def _count_tokens(self, predicate: Callable[[int, str], bool]) -> List[float]:
+        """
+        :param predicate: selects tokens by their kind (the ``TokenKind`` value) and value
+        :return: the number of selected tokens of each line of the code without comments
+        """
+        tokens = self.context.lexing_without_comments(self.code, self.lexer, self.analyzer)
+        mask = np.fromiter(
+            (predicate(kind, value) for kind, value in zip(tokens.kinds.tolist(), tokens.values)),
+            dtype=bool, count=len(tokens),
+        )
+        return tokens.count_by_line(mask, len(self.comment_free_lines)).astype(float).tolist()
 
 
 class VisualBandwidth2D(VisualFeatureCalculator):
@@ -442,46 +423,91 @@ class VisualBandwidth2D(VisualFeatureCalculator):
 
     @property
     def name(self):
-        return f'Dorn Visual {self.coordinate} {self.kind.name}'
+        return self.feature_name(self.coordinate, self.kind)
+
+    @staticmethod
+    def feature_name(coordinate: str, kind: TokenKind) -> str:
+        return f'Dorn Visual {coordinate} {kind.name}'
 
     def calculate_metric(self) -> float:
         color_matrix = self.get_matrix()
         amplitudes = self.get_dft_amplitudes(color_matrix)
         if len(color_matrix) == 0 or len(color_matrix[0]) == 0:
             return 0.
-        rows, cols = len(color_matrix), len(color_matrix[0])
-        ndarray = np.asarray(amplitudes)
-        size = rows if self.coordinate == 'X' else cols
-        total = sum([
-            DFTBandwidth.calculate_bandwidth(
-                (ndarray[i, :] if self.coordinate == 'X' else ndarray[:, i]).tolist()
-            ) for i in range(size)
-        ])
-        return total / size
+        # The bandwidth of every row (X) or column (Y) as in ``DFTBandwidth.calculate_bandwidth``,
+        # the vectors are the rows of a contiguous array, so that their deviations are the same
+        vectors = amplitudes if self.coordinate == 'X' else np.ascontiguousarray(amplitudes.T)
+        above = vectors > std(vectors, axis=1)[:, np.newaxis]
+        last_above = vectors.shape[1] - 1 - np.argmax(above[:, ::-1], axis=1)
+        bandwidths = np.where(above.any(axis=1), last_above, 0)
+        return float(bandwidths.sum()) / len(vectors)
 
     @staticmethod
-    def get_dft_amplitudes(signals: List[List[float]]) -> List[List[float]]:
+    def get_dft_amplitudes(signals: np.ndarray) -> np.ndarray:
         if len(signals) == 0 or len(signals[0]) == 0:
-            return []
-
-        coefficients = (fft.fft2(np.asarray(signals)).reshape((1, len(signals) * len(signals[0])))
-                        .view(np.float64).reshape((len(signals), 2 * len(signals[0]))))
-        amplitudes = [
-            [
-                math.sqrt(
-                    (coefficients[i][2 * j] * coefficients[i][2 * j])
-                    + (coefficients[i][2 * j + 1] * coefficients[i][2 * j + 1])
-                )
-                for j in range(len(signals[i]))
-            ] for i in range(len(signals))
-        ]
-        return amplitudes
-
-    def get_matrix(self) -> List[List[float]]:
-        color_matrix = self.color_matrix
-        matrix = []
-        for i in range(self.rows):
-            matrix.append([])
-            for j in range(self.cols):
-                matrix[i].append(1.0 if color_matrix[i][j] == self.kind.value else 0.0)
-        return matrix
+            return np.empty((0, 0))
+        return DFTBandwidth.get_amplitudes(fft.fft2(np.asarray(signals)))
+
+    def get_matrix(self) -> np.ndarray:
+        """
+        :return: 1.0 at every character of a token of the kind, 0.0 elsewhere
+        """
+        return (self.color_raster == self.kind.value).astype(np.float64)
+
+
+FAMILY = 'Dorn'
+
+
+def _rse_lexer(lexer: Lexer, context: SnippetContext) -> RSELexer:
+    if context is None:
+        return RSELexer(lexer)
+    # The calculators of a snippet share the lexer, so that they share its tokens
+    return context.memoize(('RSELexer', lexer), lambda: RSELexer(lexer))
+
+
+def _create(cls: type, *args) -> FeatureFactory:
+    return lambda code, lexer, analyzer, context: cls(
+        *args, code=code, lexer=_rse_lexer(lexer, context), context=context)
+
+
+def _create_dft(kind: str) -> FeatureFactory:
+    return lambda code, lexer, analyzer, context: DFTBandwidth(
+        kind, analyzer, code=code, lexer=_rse_lexer(lexer, context), context=context)
+
+
+# Inputs of the DFTs, by the kind of the DFT
+_DFT_INPUTS = {
+    'Comments': [Input.COLOR_RASTER],
+    'Conditionals': [Input.COMMENT_FREE_LINES, Input.COMMENT_FREE_TOKENS],
+    'Keywords': [Input.COMMENT_FREE_LINES, Input.COMMENT_FREE_TOKENS],
+    'LineLengths': [Input.LINES],
+    'Loops': [Input.COMMENT_FREE_LINES, Input.COMMENT_FREE_TOKENS],
+    'Identifiers': [Input.COMMENT_FREE_LINES, Input.COMMENT_FREE_TOKENS],
+}
+
+FEATURES: List[Feature] = [
+    feature('Dorn align blocks', FAMILY, [Input.LINES], Cost.MEDIUM, _create(CharactersAlignmentBlocks)),
+    feature('Dorn align extent', FAMILY, [Input.LINES], Cost.MEDIUM, _create(CharactersAlignmentExtent)),
+    *[
+        feature(ColorsAreas.feature_name(kind), FAMILY, [Input.COLOR_RASTER], Cost.MEDIUM,
+                _create(ColorsAreas, kind))
+        for kind in ColorsAreas.ALL_KINDS
+    ],
+    *[
+        feature(ColorsMutualAreas.feature_name(kind1, kind2), FAMILY, [Input.COLOR_RASTER], Cost.MEDIUM,
+                _create(ColorsMutualAreas, kind1, kind2))
+        for i, kind2 in enumerate(ColorsMutualAreas.ALL_KINDS)
+        for kind1 in ColorsMutualAreas.ALL_KINDS[i + 1:]
+    ],
+    *[
+        feature(DFTBandwidth.feature_name(kind), FAMILY, _DFT_INPUTS.get(kind, [Input.COMMENT_FREE_LINES]),
+                Cost.MEDIUM, _create_dft(kind))
+        for kind in DFTBandwidth.ALL_KINDS
+    ],
+    *[
+        feature(VisualBandwidth2D.feature_name(coordinate, kind), FAMILY, [Input.COLOR_RASTER], Cost.MEDIUM,
+                _create(VisualBandwidth2D, coordinate, kind))
+        for kind in VisualBandwidth2D.ALL_KINDS
+        for coordinate in ['X', 'Y']
+    ],
+]
@@ -1,27 +1,100 @@
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Mapping
 
 from code_processing.analyzer import CodeAnalyzer
-from code_processing.lexer import Lexer, CachedLexer
-from metrics import dorn, buse_weimer, itid_nm_nmi, cic, cr, noc, tc, posnett
+from code_processing.lexer import Lexer, CachedLexer, TokenCache, TokenTable
+from metrics import catalogue, dorn, buse_weimer, itid_nm_nmi, cic, cr, noc, tc, posnett
+from metrics.catalogue import Feature, FeatureGroup
 from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
 
+# All features by name, in the order of the columns of the features
+FEATURES: Dict[str, Feature] = catalogue.index(
+    buse_weimer.FEATURES + dorn.FEATURES + posnett.FEATURES + itid_nm_nmi.FEATURES
+    + cic.FEATURES + cr.FEATURES + noc.FEATURES + tc.FEATURES
+)
 
-def get_all_feature_calculators(code: str, language: str) -> Dict[str, FeatureCalculator]:
-    analyzer = CodeAnalyzer.create_analyzer(language)
-    lexer = CachedLexer(Lexer.create_lexer(language))
 
-    results = {}
-    results.update(buse_weimer.get_all_feature_calculators(code, lexer, analyzer=analyzer))
-    results.update(dorn.get_all_feature_calculators(code, lexer, analyzer=analyzer))
-    results.update(posnett.get_all_feature_calculators(code, lexer))
-    results.update(itid_nm_nmi.get_all_feature_calculators(code, analyzer=analyzer))
-    results.update(cic.get_all_feature_calculators(code, analyzer=analyzer))
-    results.update(cr.get_all_feature_calculators(code, analyzer=analyzer))
-    results.update(noc.get_all_feature_calculators(code, analyzer=analyzer))
-    results.update(tc.get_all_feature_calculators(code, lexer, analyzer=analyzer))
+class FeatureCalculators(Mapping[str, FeatureCalculator]):
+    """
+    The calculators of all features of a snippet by feature name.
 
-    return results
+    A calculator is only created when its feature is looked up, so that a model that only uses a few features
+    (e.g. Posnett) does not pay for the construction of the others, which may already lex the snippet or
+    extract its terms. Iterating creates all calculators.
+    """
+
+    def __init__(self, code: str, language: str, lexer: Lexer):
+        """
+        :param code: the snippet
+        :param language: language of the snippet
+        :param lexer: lexer of the snippet
+        """
+        self.code = code
+        self.lexer = lexer
+        self.analyzer = CodeAnalyzer.create_analyzer(language)
+        # The calculators derive the same views of the snippet (e.g. its lines, the code without comments) only once
+        self.context = SnippetContext()
+        self._calculators: Dict[str, FeatureCalculator] = {}
+
+    def __getitem__(self, name: str) -> FeatureCalculator:
+        fc = self._calculators.get(name)
+        if fc is None:
+            fc = FEATURES[name].create(self.code, self.lexer, self.analyzer, self.context)
+            self._calculators[name] = fc
+        return fc
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FEATURES)
+
+    def __len__(self) -> int:
+        return len(FEATURES)
+
+    def calculate(self, names: Iterable[str] = None) -> Dict[str, float]:
+        """
+        Calculate features group by group of their plan, see ``plan``.
+        :param names: names of the features, by default all features
+        :return: the values of the features by name, in the order of the names
+        """
+        names = list(names) if names is not None else list(FEATURES)
+        values = {}
+        for group in plan(names):
+            for f in group.features:
+                values[f.name] = self[f.name].calculate_metric()
+        return {name: values[name] for name in names}
+
+
+def get_all_feature_calculators(
+        code: str,
+        language: str,
+        token_cache: TokenCache = None,
+        tokens: TokenTable = None,
+) -> FeatureCalculators:
+    """
+    Create the calculators of all features for a snippet, see ``FeatureCalculators``.
+    :param code: the snippet
+    :param language: language of the snippet
+    :param token_cache: cache of tokens shared across snippets, by default each snippet gets its own cache
+    :param tokens: tokens of the snippet if they are already known (e.g. from the parsed file of a method),
+    then the snippet is not lexed again
+    :return: calculators by feature name
+    """
+    lexer = CachedLexer(Lexer.create_lexer(language), cache=token_cache)
+    if tokens is not None:
+        # The calculators lex the snippet with expanded tabs
+        lexer.cache.put(
+            FeatureCalculator.expand_tabs(code),
+            tokens.expand_tabs(code, FeatureCalculator.DEFAULT_TAB_SIZE),
+        )
+    return FeatureCalculators(code, language, lexer)
+
+
+def plan(names: Iterable[str]) -> List[FeatureGroup]:
+    """
+    :param names: names of features
+    :return: the groups of the features that share their inputs, cheapest first, see ``catalogue.plan``
+    """
+    return catalogue.plan(FEATURES[name] for name in names)
 
 
 def get_all_metrics() -> List[str]:
-    return list(get_all_feature_calculators('', 'cpp').keys())
+    return list(FEATURES)
@@ -1,3 +1,4 @@
+import functools
 from typing import List, Dict, Any, Set
 
 from nltk.stem import PorterStemmer
@@ -5,6 +6,7 @@ from nltk.stem import PorterStemmer
 from code_processing import filter_manager
 from code_processing.analyzer import CodeAnalyzer
 from code_processing.lexer import Lexer
+from metrics.snippet_context import SnippetContext
 
 
 class FeatureCalculator:
@@ -13,11 +15,24 @@ class FeatureCalculator:
     parameters: Dict[str, Any]
     feature_calculators: List["FeatureCalculator"]
 
-    def __init__(self, code: str, lexer: Lexer = None, tab_size=4):
-        self.code = code.replace('\t', ''.join([' ' for _ in range(tab_size)]))
+    DEFAULT_TAB_SIZE = 4
+
+    def __init__(self, code: str, lexer: Lexer = None, tab_size=DEFAULT_TAB_SIZE, context: SnippetContext = None):
+        """
+        :param code: the snippet
+        :param lexer: lexer of the snippet, required for the features of tokens
+        :param tab_size: number of spaces a tab is expanded to
+        :param context: views of the snippet shared with the other calculators of the snippet,
+        by default the calculator has its own
+        """
+        self.context = context if context is not None else SnippetContext()
+        self.code = self.context.expand_tabs(code, tab_size)
         self.lexer = lexer
         self.tab_size = tab_size
-        self._tokens = []
+
+    @staticmethod
+    def expand_tabs(code: str, tab_size=DEFAULT_TAB_SIZE) -> str:
+        return code.replace('\t', ''.join([' ' for _ in range(tab_size)]))
 
     @property
     def name(self):
@@ -27,14 +42,12 @@ class FeatureCalculator:
     def lines(self):
         if self.code is None:
             return []
-        return self.code.splitlines(keepends=True)
+        return self.context.lines(self.code)
 
     @property
     def tokens(self):
         assert self.lexer is not None, "Cannot tokenize without a lexer"
-        if len(self._tokens) == 0:
-            self._tokens = self.lexer.lexing(self.code)
-        return self._tokens
+        return self.context.lexing(self.code, self.lexer)
 
     def calculate_metric(self) -> float:
         raise NotImplemented()
@@ -60,13 +73,16 @@ class TextualFC(FeatureCalculator):
         :param code: source code without blank line
         :return: a set of terms
         """
-        comments = self._analyzer.get_comments(code)
+        def extract() -> Set[str]:
+            comments = self.context.get_comments(code, self._analyzer)
 
-        # Apply the first 3 steps
-        terms = self._extract_terms(comments.replace('\n', ' '))
+            # Apply the first 3 steps
+            terms = self._extract_terms(comments.replace('\n', ' '))
 
-        # Apply the last step
-        return self.convert_to_stems(terms)
+            # Apply the last step
+            return self.convert_to_stems(terms)
+
+        return self.context.memoize(('comment terms', code, self._analyzer), extract)
 
     def extract_identifier_terms(self, code: str) -> Set[str]:
         """
@@ -74,10 +90,13 @@ class TextualFC(FeatureCalculator):
         :param code: source code without blank line
         :return: a set of terms
         """
-        source_code = self._analyzer.delete_comments(code)
+        def extract() -> Set[str]:
+            source_code = self.context.delete_comments(code, self._analyzer)
+
+            # Apply the first 3 steps
+            return self._extract_terms(source_code)
 
-        # Apply the first 3 steps
-        return self._extract_terms(source_code)
+        return self.context.memoize(('identifier terms', code, self._analyzer), extract)
 
     def extract_lines_identifier_terms(self, code: str) -> List[Set[str]]:
         """
@@ -85,12 +104,15 @@ class TextualFC(FeatureCalculator):
         :param code: source code
         :return: a list of sets of terms that contains terms of every line
         """
-        source_code = filter_manager.delete_blank_lines(code)
-        source_code = self._analyzer.delete_comments(source_code)
-        lines = [line for line in source_code.splitlines() if line.strip() != '']
+        def extract() -> List[Set[str]]:
+            source_code = self.context.delete_blank_lines(code)
+            source_code = self.context.delete_comments(source_code, self._analyzer)
+            lines = [line for line in source_code.splitlines() if line.strip() != '']
+
+            # Apply the first 3 steps
+            return [self._extract_terms(line) for line in lines]
 
-        # Apply the first 3 steps
-        return [self._extract_terms(line) for line in lines]
+        return self.context.memoize(('lines identifier terms', code, self._analyzer), extract)
 
     def _extract_terms(self, text: str) -> Set[str]:
         """
@@ -123,4 +145,8 @@ class TextualFC(FeatureCalculator):
         """
 
         # Extract stems from terms by using the Porter algorithm
-        return {PorterStemmer().stem(t) for t in terms}
+        return {_stem(t) for t in terms}
+
+
+# The stemmer has no state, so the stems of terms are shared by all snippets
+_stem = functools.lru_cache(maxsize=1 << 16)(PorterStemmer().stem)
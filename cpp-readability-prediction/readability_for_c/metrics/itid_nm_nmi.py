@@ -2,26 +2,16 @@ from typing import Dict, List, Set
 
 import wordnet
 from code_processing.analyzer import CodeAnalyzer
+from metrics.catalogue import Cost, Feature, FeatureFactory, Input, feature
 from metrics.feature_calculator import FeatureCalculator, TextualFC
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, analyzer: CodeAnalyzer) -> Dict[str, FeatureCalculator]:
-    fc = ItidNmNmiFc(
-        metric=list(ItidNmNmiFc.METRICS.keys())[0],
-        aggregation=list(ItidNmNmiFc.METRICS.values())[0][0],
-        analyzer=analyzer,
-        code=code,
-    )
-    fc_list = [ProxyItidNmNmiFc(
-        metric=metric,
-        aggregation=agg,
-        ignore_one_letter_word=ignore_one_letter_word,
-        fc=fc,
-        code=code,
-    ) for ignore_one_letter_word in [False, True]
-        for metric, aggregations in ItidNmNmiFc.METRICS.items()
-        for agg in aggregations]
-    return {fc.name: fc for fc in fc_list}
+def get_all_feature_calculators(
+        code: str, analyzer: CodeAnalyzer, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    # The calculators share the terms of the lines through the context
+    context = context if context is not None else SnippetContext()
+    return {f.name: f.create(code, None, analyzer, context) for f in FEATURES}
 
 
 class ItidNmNmiFc(TextualFC):
@@ -87,7 +77,11 @@ class ItidNmNmiFc(TextualFC):
 
     @property
     def name(self):
-        return f'{self.metric} {self.aggregation}{" (Ignore 1-letter word)" if self.ignore_one_letter_word else ""}'
+        return self.feature_name(self.metric, self.aggregation, self.ignore_one_letter_word)
+
+    @staticmethod
+    def feature_name(metric: str, aggregation: str, ignore_one_letter_word: bool) -> str:
+        return f'{metric} {aggregation}{" (Ignore 1-letter word)" if ignore_one_letter_word else ""}'
 
     def extract_lines_identifier_terms(self, code: str) -> List[Set[str]]:
         lines_identifiers = super().extract_lines_identifier_terms(code)
@@ -96,6 +90,17 @@ class ItidNmNmiFc(TextualFC):
         return lines_identifiers
 
     def calculate_metric(self) -> float:
+        # The aggregations of a metric aggregate the same values
+        values = self.context.memoize(
+            ('ITID values', self.source_code, self._analyzer, self.metric, self.ignore_one_letter_word),
+            self._get_line_values,
+        )
+        return self.AGG_FUNCS[self.aggregation](values)
+
+    def _get_line_values(self) -> List[float]:
+        """
+        :return: the value of the metric for every line that has terms
+        """
         if len(self._lines_identifiers) == 0:
             self._lines_identifiers = self.extract_lines_identifier_terms(self.source_code)
         values = []
@@ -125,7 +130,7 @@ class ItidNmNmiFc(TextualFC):
                 value /= len(terms)
 
             values.append(float(value))
-        return self.AGG_FUNCS[self.aggregation](values)
+        return values
 
 
 class ProxyItidNmNmiFc(FeatureCalculator):
@@ -138,10 +143,42 @@ class ProxyItidNmNmiFc(FeatureCalculator):
 
     @property
     def name(self):
-        return f'{self.metric} {self.aggregation}{" (Ignore 1-letter word)" if self.ignore_one_letter_word else ""}'
+        return ItidNmNmiFc.feature_name(self.metric, self.aggregation, self.ignore_one_letter_word)
 
     def calculate_metric(self) -> float:
         self.fc.metric = self.metric
         self.fc.aggregation = self.aggregation
         self.fc.ignore_one_letter_word = self.ignore_one_letter_word
         return self.fc.calculate_metric()
+
+
+FAMILY = 'ITID/NM/NMI'
+
+
+def _create(metric: str, aggregation: str, ignore_one_letter_word: bool) -> FeatureFactory:
+    def create(code: str, lexer, analyzer: CodeAnalyzer, context: SnippetContext) -> FeatureCalculator:
+        fc = context.memoize(('ITID calculator', code, analyzer), lambda: ItidNmNmiFc(
+            metric=list(ItidNmNmiFc.METRICS.keys())[0],
+            aggregation=list(ItidNmNmiFc.METRICS.values())[0][0],
+            analyzer=analyzer,
+            code=code,
+            context=context,
+        ))
+        return ProxyItidNmNmiFc(
+            metric=metric,
+            aggregation=aggregation,
+            ignore_one_letter_word=ignore_one_letter_word,
+            fc=fc,
+            code=code,
+            context=context,
+        )
+    return create
+
+
+FEATURES: List[Feature] = [
+    feature(ItidNmNmiFc.feature_name(metric, agg, ignore_one_letter_word), FAMILY, [Input.TERMS, Input.WORDNET],
+            Cost.HIGH, _create(metric, agg, ignore_one_letter_word))
+    for ignore_one_letter_word in [False, True]
+    for metric, aggregations in ItidNmNmiFc.METRICS.items()
+    for agg in aggregations
+]
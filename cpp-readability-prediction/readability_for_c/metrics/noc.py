@@ -3,17 +3,15 @@ from typing import Dict, Set, List
 import numpy as np
 from sklearn.cluster import DBSCAN
 
-from code_processing import filter_manager
 from code_processing.analyzer import CodeAnalyzer
+from metrics.catalogue import Cost, Feature, Input, feature
 from metrics.feature_calculator import FeatureCalculator, TextualFC
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, analyzer: CodeAnalyzer) -> Dict[str, FeatureCalculator]:
-    fc_list = [
-        NumberOfConceptsFC(analyzer=analyzer, code=code),
-        NumberOfConceptsFC(analyzer=analyzer, code=code, eps=0.3, normalized=True),
-    ]
-    return {fc.name(): fc for fc in fc_list}
+def get_all_feature_calculators(
+        code: str, analyzer: CodeAnalyzer, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, None, analyzer, context) for f in FEATURES}
 
 
 class NumberOfConceptsFC(TextualFC):
@@ -49,9 +47,11 @@ class NumberOfConceptsFC(TextualFC):
         :param source_code: the content of snippet
         :return: a list of sets of terms that represent terms each line of code
         """
-        source_code = filter_manager.delete_blank_lines(source_code)
-        lines_identifier = self.extract_lines_identifier_terms(source_code)
-        return [self.convert_to_stems(identifiers) for identifiers in lines_identifier if len(identifiers) > 0]
+        def extract() -> List[Set[str]]:
+            lines_identifier = self.extract_lines_identifier_terms(self.context.delete_blank_lines(source_code))
+            return [self.convert_to_stems(identifiers) for identifiers in lines_identifier if len(identifiers) > 0]
+
+        return self.context.memoize(('NOC documents', source_code, self._analyzer), extract)
 
     @classmethod
     def _get_distance(cls, doc: Set[str], other_doc: Set[str]) -> float:
@@ -75,3 +75,15 @@ class NumberOfConceptsFC(TextualFC):
                 distance_matrix[i, j] = cls._get_distance(documents[i], documents[j])
 
         return distance_matrix
+
+
+FAMILY = 'NOC'
+
+FEATURES: List[Feature] = [
+    feature('Standard Number of Concepts', FAMILY, [Input.TERMS], Cost.HIGH,
+            lambda code, lexer, analyzer, context: NumberOfConceptsFC(
+                analyzer=analyzer, code=code, context=context)),
+    feature('Normalized Number of Concepts', FAMILY, [Input.TERMS], Cost.HIGH,
+            lambda code, lexer, analyzer, context: NumberOfConceptsFC(
+                analyzer=analyzer, code=code, eps=0.3, normalized=True, context=context)),
+]
@@ -1,31 +1,18 @@
 import math
-from typing import Generator, Union, Dict
+from typing import Generator, Iterable, Union, Dict, List
 
-from code_processing.lexer import Token, LexerDecorator, TokenKind, Lexer
+import numpy as np
+
+from code_processing.lexer import Token, LexerDecorator, TokenKind, Lexer, TokenTable
 from code_processing.rse_lexer import RSELexer
+from metrics.catalogue import Cost, Feature, Input, feature
 from metrics.feature_calculator import FeatureCalculator
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, lexer: Lexer) -> Dict[str, FeatureCalculator]:
-    results = {}
-    for metric in [
-        'Posnett_Lines', 'Posnett_Entropy', 'Posnett_Volume',
-    ]:
-        fc = create_posnett_feature_calculator(metric, code, lexer)
-        results[fc.name] = fc
-    return results
-
-
-def create_posnett_feature_calculator(metric_type: str, code: str, lexer: Lexer):
-    lexer = RSELexer(lexer)
-    if metric_type == 'Posnett_Lines':
-        return PosnettLinesFC(code, lexer)
-    elif metric_type == 'Posnett_Entropy':
-        return PosnettEntropyFC(code, lexer)
-    elif metric_type == 'Posnett_Volume':
-        return PosnettVolumeFC(code, PosnettLexer(lexer))
-    else:
-        raise ValueError(f'Unknown metric type: {metric_type}')
+def get_all_feature_calculators(
+        code: str, lexer: Lexer, context: SnippetContext = None) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, lexer, None, context) for f in FEATURES}
 
 
 class PosnettLexer(LexerDecorator):
@@ -50,11 +37,11 @@ class PosnettLexer(LexerDecorator):
     def program_length(self):
         return self._program_length
 
-    def lex(self, sourcefile_path: str) -> Generator[Token, None, None]:
+    def transform(self, tokens: Iterable[Token]) -> Generator[Token, None, None]:
         self._dictionary.clear()
         self._program_length = 0
 
-        for token in super().lex(sourcefile_path):
+        for token in tokens:
             if token.kind in self._TOKEN_KINDS:
                 self._update_with_token(token.value)
             elif token.kind == TokenKind.STRING and len(token.value) > 2:
@@ -63,6 +50,22 @@ class PosnettLexer(LexerDecorator):
 
             yield token
 
+    def transform_table(self, table: TokenTable) -> TokenTable:
+        self._dictionary.clear()
+        self._program_length = 0
+
+        counted = np.isin(table.kinds, [kind.value for kind in self._TOKEN_KINDS])
+        strings = table.kinds == TokenKind.STRING.value
+        for i in np.flatnonzero(counted | strings).tolist():
+            token_value = table.values[i]
+            if counted[i]:
+                self._update_with_token(token_value)
+            elif len(token_value) > 2:
+                # Remove opening/closing quotes
+                self._update_with_token(token_value[1:-1])
+
+        return table
+
     def _update_with_token(self, token_value: str):
         if token_value not in self._dictionary:
             self._dictionary.add(token_value)
@@ -137,3 +140,17 @@ class PosnettVolumeFC(FeatureCalculator):
             return cls._retrieve_posnett_lexer(lexer.lexer)
         else:
             raise ValueError('lexer must be an instance of LexerDecorator or PosnettLexer')
+
+
+FAMILY = 'Posnett'
+
+FEATURES: List[Feature] = [
+    feature('Posnett lines', FAMILY, [Input.LINES], Cost.LOW,
+            lambda code, lexer, analyzer, context: PosnettLinesFC(code, RSELexer(lexer), context=context)),
+    # The entropy of the bytes of the code
+    feature('Posnett entropy', FAMILY, [], Cost.LOW,
+            lambda code, lexer, analyzer, context: PosnettEntropyFC(code, RSELexer(lexer), context=context)),
+    feature('Posnett volume', FAMILY, [Input.TOKENS], Cost.LOW,
+            lambda code, lexer, analyzer, context: PosnettVolumeFC(
+                code, PosnettLexer(RSELexer(lexer)), context=context)),
+]
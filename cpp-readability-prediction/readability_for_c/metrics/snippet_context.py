@@ -0,0 +1,63 @@
+from typing import Any, Callable, Dict, Hashable, List, TypeVar
+
+from code_processing import filter_manager
+from code_processing.analyzer import CodeAnalyzer
+from code_processing.lexer import Lexer, TokenTable
+
+T = TypeVar('T')
+
+
+class SnippetContext:
+    """
+    Views derived from the code of a snippet (e.g. its lines, the code without comments or blank lines, its tokens),
+    shared by all feature calculators of the snippet. Every view is computed once, when it is used first.
+
+    Views are keyed by the text they are derived from (and the analyzer or lexer that derives them), not by the
+    snippet. A calculator whose code differs from the code of the snippet, e.g. the code without comments,
+    gets its own views, and views of the same text are shared across calculators.
+    The views must not be modified by the calculators.
+    """
+
+    def __init__(self):
+        self._views: Dict[Hashable, Any] = {}
+
+    def memoize(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Get a view, the view is computed if it was not used before.
+        :param key: identifies the view, e.g. its name and the text it is derived from
+        :param compute: computes the view
+        :return: the view
+        """
+        try:
+            return self._views[key]
+        except KeyError:
+            view = compute()
+            self._views[key] = view
+            return view
+
+    def expand_tabs(self, code: str, tab_size: int) -> str:
+        return self.memoize(('expand_tabs', code, tab_size), lambda: code.replace('\t', ' ' * tab_size))
+
+    def lines(self, code: str) -> List[str]:
+        """
+        :return: the lines of code with their line breaks
+        """
+        return self.memoize(('lines', code), lambda: code.splitlines(keepends=True))
+
+    def delete_blank_lines(self, code: str) -> str:
+        return self.memoize(('delete_blank_lines', code), lambda: filter_manager.delete_blank_lines(code))
+
+    def delete_comments(self, code: str, analyzer: CodeAnalyzer) -> str:
+        return self.memoize(('delete_comments', code, analyzer), lambda: analyzer.delete_comments(code))
+
+    def get_comments(self, code: str, analyzer: CodeAnalyzer) -> str:
+        return self.memoize(('get_comments', code, analyzer), lambda: analyzer.get_comments(code))
+
+    def lexing(self, code: str, lexer: Lexer) -> TokenTable:
+        return self.memoize(('lexing', code, lexer), lambda: lexer.lexing(code))
+
+    def lexing_without_comments(self, code: str, lexer: Lexer, analyzer: CodeAnalyzer) -> TokenTable:
+        return self.memoize(
+            ('lexing_without_comments', code, lexer, analyzer),
+            lambda: lexer.lexing_without_comments(code, analyzer),
+        )
@@ -2,18 +2,17 @@ from typing import Dict, Set, List
 
 import numpy as np
 
-from code_processing import filter_manager
 from code_processing.analyzer import CodeAnalyzer
 from code_processing.lexer import Lexer
+from metrics.catalogue import Cost, Feature, FeatureFactory, Input, feature
 from metrics.feature_calculator import FeatureCalculator, TextualFC
+from metrics.snippet_context import SnippetContext
 
 
-def get_all_feature_calculators(code: str, lexer: Lexer, analyzer: CodeAnalyzer) -> Dict[str, FeatureCalculator]:
-    all_fc = {}
-    for agg in TextualCoherenceFC.AGG_FUNCS.keys():
-        fc = TextualCoherenceFC(agg, lexer=lexer, code=code, analyzer=analyzer, threshold=1)
-        all_fc[fc.name] = fc
-    return all_fc
+def get_all_feature_calculators(
+        code: str, lexer: Lexer, analyzer: CodeAnalyzer, context: SnippetContext = None,
+) -> Dict[str, FeatureCalculator]:
+    return {f.name: f.create(code, lexer, analyzer, context) for f in FEATURES}
 
 
 class TextualCoherenceFC(TextualFC):
@@ -39,7 +38,7 @@ class TextualCoherenceFC(TextualFC):
         self._agg = agg
         self._agg_func = self.AGG_FUNCS[agg]
         self._threshold = threshold
-        self._documents = self._get_documents()
+        self._documents = self.context.memoize(('TC documents', self.code, self.lexer, threshold), self._get_documents)
         self._dictionary = self._build_dictionary(self.code)
 
     @property
@@ -55,6 +54,15 @@ class TextualCoherenceFC(TextualFC):
         return self._dictionary
 
     def calculate_metric(self) -> float:
+        # The aggregations of the snippet aggregate the same cosines
+        cosines = self.context.memoize(
+            ('TC cosines', self.code, self.lexer, self._threshold), self._get_cosines)
+        if len(cosines) == 0:
+            return 0.
+
+        return self._agg_func(cosines)
+
+    def _get_cosines(self) -> List[float]:
         cosines = []
         for i in range(len(self._documents) - 1):
             vi = self._get_vector(self._dictionary, self._documents[i])
@@ -70,11 +78,7 @@ class TextualCoherenceFC(TextualFC):
                     continue
                 cosine = np.dot(vi, vj) / (np.linalg.norm(vi) * np.linalg.norm(vj))
                 cosines.append(cosine)
-
-        if len(cosines) == 0:
-            return 0.
-
-        return self._agg_func(cosines)
+        return cosines
 
     def _get_documents(self):
         documents = self._get_code_blocks()
@@ -175,11 +179,28 @@ class TextualCoherenceFC(TextualFC):
         return blocks
 
     def _build_dictionary(self, source_code: str) -> Set[str]:
-        source_code = filter_manager.delete_blank_lines(source_code)
-        dict_words = self.extract_identifier_terms(source_code)
-        return self.convert_to_stems(dict_words)
+        def build() -> Set[str]:
+            dict_words = self.extract_identifier_terms(self.context.delete_blank_lines(source_code))
+            return self.convert_to_stems(dict_words)
+
+        return self.context.memoize(('TC dictionary', source_code, self._analyzer), build)
 
     def _get_vector(self, full_dict: Set[str], source_code: str) -> np.array:
         doc_dict = self._build_dictionary(source_code)
         overlap = full_dict.intersection(doc_dict)
         return np.asarray([1 if word in overlap else 0 for word in sorted(list(full_dict))])
+
+
+FAMILY = 'TC'
+
+
+def _create(agg: str) -> FeatureFactory:
+    return lambda code, lexer, analyzer, context: TextualCoherenceFC(
+        agg, lexer=lexer, code=code, analyzer=analyzer, threshold=1, context=context)
+
+
+FEATURES: List[Feature] = [
+    feature('Text Coherence MIN', FAMILY, [Input.TOKENS, Input.TERMS], Cost.HIGH, _create('MIN')),
+    feature('Text Coherence AVG', FAMILY, [Input.TOKENS, Input.TERMS], Cost.HIGH, _create('AVG')),
+    feature('Text Coherence MAX', FAMILY, [Input.TOKENS, Input.TERMS], Cost.HIGH, _create('MAX')),
+]
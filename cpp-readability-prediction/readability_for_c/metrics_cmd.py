@@ -1,12 +1,18 @@
 import argparse
 import csv
+import dataclasses
+import functools
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Generator, Dict
+from typing import Generator, Dict, List, Optional
 
+from budget import Budget, BudgetedPool, SKIPPED_BUDGET, add_budget_arguments
 from cli_cmd import Command
+from code_processing.lexer import TokenCache
 from metrics import factory
-from metrics.feature_calculator import FeatureCalculator
+from warmup import warm_up
 
 
 def register_command(subparsers):
@@ -18,45 +24,198 @@ def register_command(subparsers):
                             help='Path to a snippet or a directory contains snippets')
     parser.add_argument("-o", "--output", type=Path, default=Path('output.csv'),
                             help='Path to output csv file. Default is "output.csv".')
+    parser.add_argument("--token-cache-size", type=int, default=0,
+                            help='Number of token lists cached across snippets, useful if snippets are duplicated. '
+                                 'Default is 0, i.e. tokens are only cached per snippet. '
+                                 'With several workers, each worker has its own cache.')
+    parser.add_argument("--workers", type=int, default=1,
+                            help='Number of processes that extract the features. Default is 1.')
+    parser.add_argument("--chunk-size", type=int, default=1,
+                            help='Number of snippets sent to a worker at once. Default is 1.')
+    parser.add_argument("--unordered", action='store_true',
+                            help='Write the rows in the order the snippets are finished instead of the input order.')
+    parser.add_argument("--preload", action='store_true',
+                            help='Load libclang, NLTK and WordNet before starting the workers, '
+                                 'so that the workers share them instead of loading them each.')
+    add_budget_arguments(parser)
+
+
+@dataclasses.dataclass
+class SnippetResult:
+    filepath: Path
+    # Features by name, None if the extraction failed
+    features: Optional[Dict[str, float]] = None
+    error: Optional[str] = None
+    # Skipped since the extraction exceeded its budget
+    over_budget: bool = False
 
 
 def run(args: argparse.Namespace):
     print('Start extracting features')
+    token_cache = TokenCache(args.token_cache_size) if args.token_cache_size > 0 else None
     if args.input.is_file():
-        rows = [extract_snippet_features(args.input)]
+        results = [try_extract_snippet_features(args.input, token_cache=token_cache)]
         total = 1
     else:
-        rows = extract_snippets_features(args.input)
+        results = extract_snippets_features(
+            args.input,
+            token_cache=token_cache,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            ordered=not args.unordered,
+            preload=args.preload,
+            budget=Budget.from_args(args),
+        )
         total = len(os.listdir(args.input))
     headers = ['File'] + factory.get_all_metrics()
+    failed: List[SnippetResult] = []
     with open(args.output, 'w', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=headers)
         writer.writeheader()
         i = 0
-        for row in rows:
+        for result in results:
             i += 1
             print(f'Progress: {i} / {total}')
-            writer.writerow(row)
+            if result.over_budget:
+                print(f'Skipped filepath: {result.filepath}. It exceeded its budget.')
+                writer.writerow({'File': result.filepath, **{header: SKIPPED_BUDGET for header in headers[1:]}})
+                continue
+            if result.error is not None:
+                print(f'Could not extract features from filepath: {result.filepath}. '
+                      f'This filepath will be skipped.', result.error)
+                failed.append(result)
+                continue
+            writer.writerow(result.features)
+    if failed:
+        errors_path = args.output.with_name(f'{args.output.stem}_errors.csv')
+        with open(errors_path, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=['File', 'Error'])
+            writer.writeheader()
+            for result in failed:
+                writer.writerow({'File': result.filepath, 'Error': result.error})
+        print(f'Could not extract features from {len(failed)} snippets, see {errors_path}')
+    if token_cache is not None and args.workers <= 1:
+        print(f'Token cache: {token_cache.hits} hits, {token_cache.misses} misses')
+
+
+def extract_snippets_features(
+        dir_path: Path,
+        language='cpp',
+        token_cache: TokenCache = None,
+        workers: int = 1,
+        chunk_size: int = 1,
+        ordered: bool = True,
+        preload: bool = False,
+        budget: Budget = None,
+) -> Generator[SnippetResult, None, None]:
+    """
+    Extract the features of all snippets of a directory.
+    With several workers, chunks of snippets are distributed to a pool of processes.
+    :param dir_path: the directory of the snippets
+    :param language: language of the snippets
+    :param token_cache: cache of tokens shared across snippets, each worker creates a cache of the same size
+    :param workers: number of processes
+    :param chunk_size: number of snippets sent to a worker at once
+    :param ordered: yield the results in the order of the snippets in the directory,
+    otherwise in the order they are finished
+    :param preload: warm up this process before forking the workers, see ``warmup.warm_up``
+    :param budget: limits of a single snippet, if limited every snippet is extracted by a worker that is killed
+    when it exceeds the limits, the chunk size is ignored then
+    :return: generator of the results of all snippets, including the failed ones
+    """
+    filepaths = [dir_path.joinpath(filename) for filename in os.listdir(dir_path)]
+    budgeted = budget is not None and budget.is_limited
+    if workers <= 1 and not budgeted:
+        for filepath in filepaths:
+            yield try_extract_snippet_features(filepath, language, token_cache)
+        return
+
+    token_cache_size = token_cache.max_size if token_cache is not None else 0
+    mp_context = None
+    if preload:
+        print(f'Preloaded in {warm_up():.2f} s')
+        # Only forked workers share the memory of this process
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+    if budgeted:
+        pool = BudgetedPool(
+            functools.partial(_extract_worker_snippet_features, language=language),
+            budget,
+            workers=workers,
+            initializer=_init_worker,
+            initargs=(token_cache_size,),
+            mp_context=mp_context,
+        )
+        for result in pool.imap(filepaths, ordered=ordered):
+            if result.over_budget:
+                yield SnippetResult(filepaths[result.index], over_budget=True)
+            elif result.error is not None:
+                yield SnippetResult(filepaths[result.index], error=result.error)
+            else:
+                yield result.value
+        return
+
+    chunks = [filepaths[i:i + chunk_size] for i in range(0, len(filepaths), chunk_size)]
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(token_cache_size,),
+    ) as executor:
+        futures = {executor.submit(_extract_chunk_features, chunk, language): i for i, chunk in enumerate(chunks)}
+        # Results of chunks that are finished before the chunks in front of them
+        finished: Dict[int, List[SnippetResult]] = {}
+        next_chunk = 0
+        for future in as_completed(futures):
+            if not ordered:
+                yield from future.result()
+                continue
+            finished[futures[future]] = future.result()
+            while next_chunk in finished:
+                yield from finished.pop(next_chunk)
+                next_chunk += 1
+
+
+# Cache of tokens of a worker process
+_worker_token_cache: Optional[TokenCache] = None
+
+
+def _init_worker(token_cache_size: int):
+    global _worker_token_cache
+    _worker_token_cache = TokenCache(token_cache_size) if token_cache_size > 0 else None
+    print(f'Worker {os.getpid()} warmed up in {warm_up():.2f} s')
+
+
+def _extract_worker_snippet_features(filepath: Path, language: str) -> SnippetResult:
+    return try_extract_snippet_features(filepath, language, _worker_token_cache)
+
+
+def _extract_chunk_features(filepaths: List[Path], language: str) -> List[SnippetResult]:
+    return [_extract_worker_snippet_features(filepath, language) for filepath in filepaths]
 
 
-def extract_snippets_features(dir_path: Path, language='cpp') -> Generator:
-    for filename in os.listdir(dir_path):
-        filepath = dir_path.joinpath(filename)
-        try:
-            yield extract_snippet_features(filepath, language)
-        except Exception as e:
-            print(f'Could not extract features from filepath: {filepath}. This filepath will be skipped.', e)
+def try_extract_snippet_features(filepath: Path, language='cpp', token_cache: TokenCache = None) -> SnippetResult:
+    """
+    Extract the features of a snippet, see ``extract_snippet_features``.
+    :return: the features of the snippet or the error if the extraction failed
+    """
+    try:
+        return SnippetResult(filepath, features=extract_snippet_features(filepath, language, token_cache))
+    except Exception as e:
+        # The exception itself might not be picklable, so only its description is sent back from a worker
+        return SnippetResult(filepath, error=f'{type(e).__name__}: {e}')
 
 
-def extract_snippet_features(filepath: Path, language='cpp') -> Dict[str, float]:
+def extract_snippet_features(filepath: Path, language='cpp', token_cache: TokenCache = None) -> Dict[str, float]:
     print(f'Extracting from file: {filepath}')
     result = {'File': filepath}
     with open(filepath) as f:
         code = f.read()
-        calculators: Dict[str, FeatureCalculator] = factory.get_all_feature_calculators(code, language)
-        for name, fc in calculators.items():
-            try:
-                result[name] = fc.calculate_metric()
-            except Exception as e:
-                raise RuntimeError(f'{fc.name}', e)
+        calculators = factory.get_all_feature_calculators(code, language, token_cache)
+        for group in factory.plan(calculators):
+            for feature in group.features:
+                try:
+                    result[feature.name] = calculators[feature.name].calculate_metric()
+                except Exception as e:
+                    raise RuntimeError(feature.name, e)
     return result
@@ -1,44 +1,66 @@
 import pickle
 import random
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 
 import numpy as np
 
+from code_processing.lexer import TokenTable
 from metrics import factory
 from readability.model import Model
 
 
 class ReadabilityCalculator:
-    def compute_readability(self, source_code: str) -> Tuple[int, float]:
+    @property
+    def name(self) -> str:
+        """
+        Name of the model of the calculator, e.g. to record which model computed a score.
+        """
+        return type(self).__name__
+
+    def compute_readability(self, source_code: str, tokens: TokenTable = None) -> Tuple[int, float]:
+        """
+        :param source_code: the snippet
+        :param tokens: tokens of the snippet if they are already known, then the snippet is not lexed again
+        :return: the predicted class and the readability
+        """
         raise NotImplemented()
 
 
 class DummyReadabilityCalculator(ReadabilityCalculator):
-    def compute_readability(self, source_code: str) -> Tuple[int, float]:
+    def compute_readability(self, source_code: str, tokens: TokenTable = None) -> Tuple[int, float]:
         prob = random.random()
         return round(prob), prob
 
 
 class PickleReadabilityCalculator(ReadabilityCalculator):
+    # Models loaded by this process by their path, a model is only loaded once
+    _models: Dict[Path, Model] = {}
+
     def __init__(self, path: Path, language: str = 'cpp'):
         self.path = path
         self.language = language
         self.loaded: Model = self.load_model(path)
 
-    @staticmethod
-    def load_model(path: Path) -> Model:
-        with path.open('rb') as infile:
-            return pickle.load(infile)
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @classmethod
+    def load_model(cls, path: Path) -> Model:
+        model = cls._models.get(path)
+        if model is None:
+            with path.open('rb') as infile:
+                model = pickle.load(infile)
+            cls._models[path] = model
+        return model
 
     def predict(self, metrics_values: List[float]) -> Tuple[int, float]:
         result = self.loaded.pipeline.predict_proba(np.array([metrics_values]))
         return int(result[0][0]), float(result[0][1])
 
-    def compute_readability(self, source_code: str) -> Tuple[int, float]:
-        metric_values = []
-        feature_calculators = factory.get_all_feature_calculators(source_code, self.language)
+    def compute_readability(self, source_code: str, tokens: TokenTable = None) -> Tuple[int, float]:
+        feature_calculators = factory.get_all_feature_calculators(source_code, self.language, tokens=tokens)
         feature_names = self.loaded.pipeline.feature_names_in_.tolist()
-        for name in feature_names:
-            metric_values.append(feature_calculators[name].calculate_metric())
-        return self.predict(metric_values)
+        metric_values = feature_calculators.calculate(feature_names)
+        return self.predict(list(metric_values.values()))
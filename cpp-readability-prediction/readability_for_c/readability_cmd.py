@@ -1,11 +1,15 @@
 import argparse
 import os
 from pathlib import Path
-from typing import List, Dict, Any, Generator
+from typing import List, Dict, Any, Generator, Optional, Callable, Iterator
 
 import utils
+from budget import Budget, BudgetedPool, SKIPPED_BUDGET, SKIPPED_ERROR, add_budget_arguments
 from cli_cmd import Command
+from manifest import Manifest, add_incremental_argument
+from code_processing.lexer import TokenTable
 from readability.readability_calculator import ReadabilityCalculator, PickleReadabilityCalculator
+from warmup import warm_up
 
 CSV_COLUMNS = [
     'File',
@@ -27,6 +31,8 @@ def register_command(subparsers):
                         help='Name of the model (dataset name that model trained on).')
     parser.add_argument("-fs", "--feature-set", type=str,
                         help='Name of the feature set used for prediction.')
+    add_budget_arguments(parser)
+    add_incremental_argument(parser)
 
 
 def find_snippets_files(path: Path) -> List[Path]:
@@ -41,9 +47,10 @@ def create_export_row(
         method: str,
         method_name: str,
         filepath: str,
-        rc: ReadabilityCalculator
+        rc: ReadabilityCalculator,
+        tokens: TokenTable = None,
 ) -> Dict[str, Any]:
-    _, readability = rc.compute_readability(method)
+    _, readability = rc.compute_readability(method, tokens=tokens)
     return {
         CSV_COLUMNS[0]: filepath,
         CSV_COLUMNS[1]: method_name,
@@ -63,9 +70,98 @@ def create_export_rows(
         with path.open() as f:
             source_code = f.read()
 
-        # Use a naive way to get method name. Doesn't work in case that method name spans 2 rows.
-        method_name = next(iter(source_code.splitlines()), '')
-        yield create_export_row(source_code, method_name, str(path.relative_to(input_path)), rc)
+        yield create_export_row(source_code, get_method_name(source_code), str(path.relative_to(input_path)), rc)
+
+
+def get_method_name(source_code: str) -> str:
+    # Use a naive way to get method name. Doesn't work in case that method name spans 2 rows.
+    return next(iter(source_code.splitlines()), '')
+
+
+def create_budgeted_export_rows(
+        paths: List[Path],
+        input_path: Path,
+        model_path: Path,
+        budget: Budget,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Same as ``create_export_rows``, but the readability of every snippet is computed by a worker process
+    within the budget. The score of a snippet that exceeds the budget or fails is marked as skipped.
+    """
+    source_codes = []
+    for path in paths:
+        with path.open() as f:
+            source_codes.append(f.read())
+
+    pool = BudgetedPool(_compute_readability, budget, initializer=_init_worker, initargs=(model_path,))
+    for i, result in enumerate(pool.imap(source_codes)):
+        path = paths[result.index]
+        print(f'Progress: {i + 1} / {len(paths)}')
+        print(str(path))
+        if result.over_budget:
+            score = SKIPPED_BUDGET
+        elif result.error is not None:
+            print(f'Could not compute the readability of {path}. It will be skipped.', result.error)
+            score = SKIPPED_ERROR
+        else:
+            score = result.value
+        yield {
+            CSV_COLUMNS[0]: str(path.relative_to(input_path)),
+            CSV_COLUMNS[1]: get_method_name(source_codes[result.index]),
+            CSV_COLUMNS[2]: score,
+        }
+
+
+def create_incremental_export_rows(
+        paths: List[Path],
+        input_path: Path,
+        manifest: Manifest,
+        model_name: str,
+        create_rows: Callable[[List[Path]], Iterator[Dict[str, Any]]],
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Take the rows of unchanged snippets from the manifest and only compute the rows of the other snippets.
+    :param paths: paths of the snippets
+    :param input_path: the input directory of the snippets
+    :param manifest: manifest of the last run, the computed scores are recorded in it
+    :param model_name: name of the model of the scores
+    :param create_rows: computes the rows of the given snippets in their order
+    :return: the rows of all snippets in their order
+    """
+    # Scores of the snippets by model, the manifest discards them if a snippet changed
+    scores = [manifest.lookup(path)[0].setdefault('scores', {}) for path in paths]
+    computed_paths = [path for path, path_scores in zip(paths, scores) if model_name not in path_scores]
+    computed_rows = create_rows(computed_paths)
+    for path, path_scores in zip(paths, scores):
+        if model_name in path_scores:
+            with path.open() as f:
+                method_name = get_method_name(f.read())
+            yield {
+                CSV_COLUMNS[0]: str(path.relative_to(input_path)),
+                CSV_COLUMNS[1]: method_name,
+                CSV_COLUMNS[2]: path_scores[model_name],
+            }
+            continue
+        row = next(computed_rows)
+        # Skipped snippets are computed again in the next run
+        if row[CSV_COLUMNS[2]] not in (SKIPPED_BUDGET, SKIPPED_ERROR):
+            path_scores[model_name] = row[CSV_COLUMNS[2]]
+        yield row
+
+
+# Readability calculator of a worker process
+_worker_calculator: Optional[ReadabilityCalculator] = None
+
+
+def _init_worker(model_path: Path):
+    global _worker_calculator
+    print(f'Worker {os.getpid()} warmed up in {warm_up(model_path):.2f} s')
+    _worker_calculator = PickleReadabilityCalculator(model_path, language='cpp')
+
+
+def _compute_readability(source_code: str) -> float:
+    _, readability = _worker_calculator.compute_readability(source_code)
+    return readability
 
 
 def run(args: argparse.Namespace):
@@ -79,15 +175,26 @@ def run(args: argparse.Namespace):
     assert feature_set in utils.MODELS[model_name], f'Model {model_name} does not support feature set {feature_set}'
 
     model_path = utils.MODELS[model_name][feature_set]
-
-    rc = PickleReadabilityCalculator(
-        model_path,
-        language='cpp',
-    )
+    budget = Budget.from_args(args)
 
     if input_path.is_file():
         paths = [input_path]
     else:
         paths = find_snippets_files(input_path)
 
-    utils.export_csv(output_path, create_export_rows(paths, input_path, rc), headers=CSV_COLUMNS)
+    def create_rows(snippet_paths: List[Path]) -> Iterator[Dict[str, Any]]:
+        if budget.is_limited:
+            return create_budgeted_export_rows(snippet_paths, input_path, model_path, budget)
+        rc = PickleReadabilityCalculator(
+            model_path,
+            language='cpp',
+        )
+        return create_export_rows(snippet_paths, input_path, rc)
+
+    if args.incremental:
+        manifest = Manifest.load(Manifest.get_path(output_path))
+        rows = create_incremental_export_rows(paths, input_path, manifest, model_path.name, create_rows)
+        utils.export_csv(output_path, rows, headers=CSV_COLUMNS)
+        manifest.save()
+    else:
+        utils.export_csv(output_path, create_rows(paths), headers=CSV_COLUMNS)
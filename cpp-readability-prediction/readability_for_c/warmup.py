@@ -0,0 +1,43 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+import nltk
+from nltk.corpus import wordnet as wn
+
+# Imported for their side effects: bodycomment downloads the NLTK data, filter_manager loads the stop words,
+# wordnet makes forked children open their own data files of WordNet
+import wordnet  # noqa: F401
+from code_processing import bodycomment, filter_manager  # noqa: F401
+from code_processing.lexer import CLangLexer
+from readability.readability_calculator import PickleReadabilityCalculator
+
+
+def warm_up(model_path: Optional[Path] = None) -> float:
+    """
+    Load everything that is otherwise loaded lazily while computing the first snippet of a process:
+    libclang, the NLTK corpora, WordNet and optionally the pickled model.
+
+    A worker calls it once when it starts. A parent process can call it before forking its workers,
+    then the workers share the loaded data copy-on-write and their own warm-up is almost free.
+    The open data files of WordNet are not shared, the workers reopen them, see ``wordnet.reset_after_fork``.
+    :param model_path: path of a pickled model to load
+    :return: the warm-up time in seconds
+    """
+    start = time.perf_counter()
+
+    # Loads libclang and creates the clang index of the current thread
+    CLangLexer(lexical_only=True).lexing('int a;')
+
+    # Corpora of NLTK are loaded on their first access
+    wn.ensure_loaded()
+    try:
+        nltk.corpus.words.words()
+    except LookupError:
+        # Not downloaded, the snippets that need it fail when they use it
+        pass
+
+    if model_path is not None:
+        PickleReadabilityCalculator.load_model(model_path)
+
+    return time.perf_counter() - start
@@ -1,3 +1,4 @@
+import os
 from typing import Optional, List, Tuple
 
 from nltk.corpus import wordnet as wn
@@ -101,3 +102,22 @@ def get_distance_to_root_hypernym(word: str, pos: str) -> float:
 
 def get_number_of_meanings(word: str, pos: str) -> int:
     return len(wn.synsets(word.strip().lower(), pos))
+
+
+def reset_after_fork():
+    """
+    Forget the data files of WordNet opened by the parent process in a forked child, the child opens its own files.
+    A forked child shares the offsets of the open files with its parent and its siblings, so concurrent reads
+    of synsets would seek and read each other's records.
+    """
+    # Only a loaded reader has data files, the lazy reader must not be loaded here
+    data_files = wn.__dict__.get('_data_file_map')
+    if not data_files:
+        return
+    for data_file in data_files.values():
+        if data_file is not None:
+            data_file.close()
+    data_files.clear()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
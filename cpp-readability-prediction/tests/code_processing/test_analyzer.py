@@ -1,6 +1,7 @@
 import unittest
 
 from code_processing.analyzer import CppCodeAnalyzer, CodeAnalyzer
+from code_processing.lexer import CLangLexer
 
 code = """int main(int someVar) {
     /*
@@ -65,3 +66,35 @@ class TestCppCodeAnalyzer(unittest.TestCase):
         self.assertEqual([
             [28, 98], [103, 145], [150, 196], [202, 290]
         ], ranges)
+
+    def test_delete_comments(self):
+        self.assertEqual('int a;     int b;    int c;', self.analyzer.delete_comments(
+            'int a; // a\n    int b; /* b */   int c;// c\n'))
+        self.assertEqual('a  d', self.analyzer.delete_comments('a /* b // c\n */ d'))
+        self.assertEqual('a /* b  e', self.analyzer.delete_comments('a /* b // c */ d\n e'))
+
+    def test_delete_comments_from_tokens(self):
+        lexer = CLangLexer()
+        snippets = [
+            code,
+            comment_range_example,
+            'int a; // a\n    int b; /* b */   int c;// c\nint d; // no newline',
+            'int café = 1; // ü\n/* é */ int y = café;',
+        ]
+        for snippet in snippets:
+            tokens = self.analyzer.delete_comments_from_tokens(snippet, lexer.lexing(snippet))
+            self.assertEqual(lexer.lexing(self.analyzer.delete_comments(snippet)), tokens)
+
+    def test_delete_comments_from_tokens_requires_lexing(self):
+        lexer = CLangLexer()
+        snippets = [
+            # Cuts string literals
+            'url = "http://localhost";\nint a;',
+            'x = "/* not a comment */"; // comment\n  y = x;',
+            # Joins identifiers
+            'a/* b */c',
+            # Reveals code of an unterminated comment
+            '/* a */ b */ /* c',
+        ]
+        for snippet in snippets:
+            self.assertIsNone(self.analyzer.delete_comments_from_tokens(snippet, lexer.lexing(snippet)))
@@ -0,0 +1,41 @@
+import threading
+import unittest
+
+from code_processing.clang_index import ClangIndexPool
+from code_processing.lexer import get_unsaved_file_path
+
+
+class TestClangIndexPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ClangIndexPool()
+        self.path = get_unsaved_file_path('cpp')
+
+    def test_reuse_index_in_thread(self):
+        self.pool.parse(self.path, unsaved_files=[(self.path, 'int a;')])
+        self.pool.parse(self.path, unsaved_files=[(self.path, 'int b;')])
+        self.assertIs(self.pool.get_index(), self.pool.get_index())
+        self.assertEqual(1, self.pool.indexes_created)
+        self.assertEqual(2, self.pool.translation_units_created)
+
+    def test_one_index_per_thread(self):
+        indexes = []
+        threads = [threading.Thread(target=lambda: indexes.append(self.pool.get_index())) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(3, len({id(index) for index in indexes}))
+        self.assertEqual(3, self.pool.indexes_created)
+
+    def test_dispose(self):
+        index = self.pool.get_index()
+        self.pool.dispose()
+        self.assertEqual(0, self.pool.stats()['indexes_alive'])
+        self.assertIsNot(index, self.pool.get_index())
+        self.assertEqual(2, self.pool.indexes_created)
+
+    def test_reset_after_fork(self):
+        index = self.pool.get_index()
+        self.pool.reset_after_fork()
+        self.assertEqual({'indexes_created': 0, 'translation_units_created': 0, 'indexes_alive': 0}, self.pool.stats())
+        self.assertIsNot(index, self.pool.get_index())
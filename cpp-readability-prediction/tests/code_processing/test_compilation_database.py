@@ -0,0 +1,70 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from code_processing.compilation_database import CompilationDatabase
+
+
+class TestCompilationDatabase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name).resolve()
+        self.src = self.dir / 'src'
+        self.build = self.dir / 'build'
+        self.src.mkdir()
+        self.build.mkdir()
+        (self.src / 'small.cpp').write_text('int a;\n')
+        (self.src / 'large.cpp').write_text('int a;\nint b;\n')
+        (self.src / 'c_file.c').write_text('int a;\n')
+        (self.dir / 'outside.cpp').write_text('int a;\n')
+
+        entries = [
+            {
+                'directory': str(self.build),
+                'command': f'/usr/bin/c++ -DNDEBUG -I../include -isystem /opt/include -std=c++17 '
+                           f'-o small.o -c {self.src / "small.cpp"}',
+                'file': str(self.src / 'small.cpp'),
+            },
+            {
+                'directory': str(self.build),
+                'arguments': ['c++', '-I../include', '-MD', '-MF', 'large.d', '-c', '../src/large.cpp', '-o', 'large.o'],
+                'file': '../src/large.cpp',
+            },
+            {'directory': str(self.build), 'command': 'cc -c ../src/c_file.c', 'file': '../src/c_file.c'},
+            {'directory': str(self.build), 'command': 'c++ -c ../outside.cpp', 'file': '../outside.cpp'},
+            {'directory': str(self.build), 'command': 'c++ -c ../src/missing.cpp', 'file': '../src/missing.cpp'},
+        ]
+        with (self.build / 'compile_commands.json').open('w') as f:
+            json.dump(entries, f)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_translation_units(self):
+        database = CompilationDatabase.load(self.build)
+        self.assertEqual([self.src / 'large.cpp', self.src / 'small.cpp'], database.get_translation_units(self.src))
+
+    def test_get_clang_args(self):
+        database = CompilationDatabase.load(self.build / 'compile_commands.json')
+        self.assertEqual(
+            ['-x', 'c++', f'-iquote{self.src}', '-DNDEBUG', f'-I{self.dir / "include"}',
+             '-isystem', '/opt/include', '-std=c++17'],
+            database.get_clang_args(self.src / 'small.cpp'),
+        )
+        self.assertEqual(
+            ['-x', 'c++', f'-iquote{self.src}', f'-I{self.dir / "include"}'],
+            database.get_clang_args(self.src / 'large.cpp'),
+        )
+
+    def test_drop_system_includes(self):
+        database = CompilationDatabase.load(self.build, drop_system_includes=True)
+        self.assertEqual(
+            ['-x', 'c++', f'-iquote{self.src}', '-DNDEBUG', f'-I{self.dir / "include"}', '-std=c++17',
+             '-nostdinc', '-nostdinc++'],
+            database.get_clang_args(self.src / 'small.cpp'),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from code_processing.fast_lexer import FastCppLexer
+from code_processing.lexer import Lexer, CLangLexer
+from tests.code_processing.test_lexer import TestLexicalOnlyCLangLexer
+
+
+class TestFastCppLexer(unittest.TestCase):
+    """
+    Differential tests, the tokens of the fast lexer must equal the tokens of libclang.
+    """
+
+    SNIPPETS = [
+        r'''auto s = u8"x" u"y" U"z" L"w" R"(raw)" LR"d(a)" b)d" u8R"(x)"; auto t = "abc"_udl "def"s "g"PRId64;''',
+        r'''char a = 'a', b = u8'b', c = L'\'', d = '\\'; int e = 'ab'; auto f = 'x'_c;''',
+        "int x = 1'000'000 + 0x1p-3 + 1e+5 + .5e-2f + 0xe+1 + 1p+2 + 07 + 0b1010 + 12_km + 1..2;",
+        "a<::b>c; a<:::b; a<::>b; x <% %> %: %:%: y <=> z ... .* ->* <<= >>= ## #",
+        "/* unterminated",
+        "int a; /* multi\nline\ncomment */ int b; // trailing \\\n continued\nint c;",
+        "char* s = \"unterminated\nint x = '';\nint y = 'abc\n@ ` \\ $dollar $ x$y",
+        "#include <vector>\n#include \"local.h\"\n#define X(a) #a ## b\n#if 0\nwon't compile ' here\n#endif\n",
+        "int café = 1; char* s = \"éè€\"; // ü\nint x;\t\tint y;",
+        "\r\nint a;\r\n  int b; // c\r\n",
+        "template<typename T> concept C = requires(T t) { co_await t; }; char8_t x; consteval int f();",
+        "__attribute__((unused)) static __inline__ int __builtin_expect(long, long); _Bool b; __int128 i;",
+        "x = a+++++b; y = a---b; z = a->b->*c; w = a...b; v = a..b; u = !~-+x;",
+        "",
+        "   \n\n  ",
+        "str = \"a\\\"b\\\\\" 'c'; line = \"splice\\\ncontinued\";",
+        "x = 5.;y = .5;z = 5.f;w=0X1.8P+1;n=1e5L;m=10ull;",
+        "in\\\nt x = 1\\\n2; // comment \\ \n continued\r\nchar* s = \"a\\\r\nb\"; y = x \\\n+ 1;\\\n",
+        "auto a = R\"abc(x)ab\" y)abc\"; auto b = R\"a b(x)a b\"; auto c = R\"(unterminated",
+    ]
+
+    # Pieces that are randomly concatenated to code with many corner cases
+    PIECES = [
+        'a', 'b1', '_x', 'if', 'int', '0', '1.5', 'e', '+', '-', '.', '..', 'x', 'p', '0x', 'R"(', ')"', '"', "'",
+        '\\', '\n', ' ', '\t', '/', '*', '//', '/*', '*/', '<', ':', '>', '%', '#', 'u8', 'L', '=', '!', '&', '|',
+        '^', '~', '?', ';', '{', '}', '(', ')', '[', ']', '$', '@', '`', 'é', "12'3", '1e', '0x1p', '_s', 's', 'sv',
+        '\r\n', '\\\n',
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.lexer = FastCppLexer()
+        cls.clang_lexer = CLangLexer(lexical_only=True)
+
+    def assert_same_tokens(self, code: str):
+        self.assertEqual(self.clang_lexer.lexing(code), self.lexer.lexing(code), repr(code))
+
+    def test_fixtures(self):
+        for code in TestLexicalOnlyCLangLexer.FIXTURES:
+            self.assert_same_tokens(code)
+
+    def test_snippets(self):
+        for code in self.SNIPPETS:
+            self.assert_same_tokens(code)
+
+    def test_random_code(self):
+        generator = random.Random(0)
+        for _ in range(500):
+            code = ''.join(generator.choice(self.PIECES) for _ in range(generator.randint(1, 30)))
+            self.assert_same_tokens(code)
+
+    def test_create_lexer(self):
+        self.assertIsInstance(Lexer.create_lexer('cpp', backend='python'), FastCppLexer)
+        self.assertIsInstance(Lexer.create_lexer('cpp'), CLangLexer)
+        with self.assertRaises(ValueError):
+            Lexer.create_lexer('cpp', backend='unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
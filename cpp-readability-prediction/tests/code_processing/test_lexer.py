@@ -1,6 +1,11 @@
 import unittest
 
-from code_processing.lexer import Token, TokenKind, Location, CLangLexer
+from code_processing.lexer import Token, TokenKind, Location, Lexer, CLangLexer, CachedLexer, TokenCache, \
+    TokenTable
+from code_processing.rse_lexer import RSELexer
+from metrics.posnett import PosnettLexer
+from tests.code_processing import test_analyzer
+from tests.metrics import test_buse_weimer, test_posnett
 
 
 class TestCLangLexer(unittest.TestCase):
@@ -90,3 +95,145 @@ class TestCLangLexer(unittest.TestCase):
         tokens = self.lexer.lexing(code)
         self.assertEqual(Token("'\\n'", Location(1, 10, 9), Location(1, 14, 13), TokenKind.LITERAL), tokens[3])
         self.assertEqual(Token("'b'", Location(1, 25, 24), Location(1, 28, 27), TokenKind.LITERAL), tokens[8])
+
+    def test_lexing_in_memory_equals_temporary_file(self):
+        code = """int main() {
+    /* Block
+       comment */
+    char* s = "caf\u00e9"; // Non-ASCII: éè
+	if (a <= b) { return a->*c; }
+}"""
+        tokens_in_memory = self.lexer.lexing(code)
+        tokens_in_file = Lexer.lexing(self.lexer, code)
+        self.assertEqual(tokens_in_file, tokens_in_memory)
+        self.assertEqual(Location(6, 1, 117), tokens_in_memory[-1].start_location)
+
+
+class CountingLexer(CLangLexer):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def lexing(self, code: str):
+        self.calls += 1
+        return super().lexing(code)
+
+
+class TestCachedLexer(unittest.TestCase):
+    def test_decorators_share_cached_tokens(self):
+        counting_lexer = CountingLexer()
+        cached_lexer = CachedLexer(counting_lexer)
+        rse_lexer = RSELexer(cached_lexer)
+        posnett_lexer = PosnettLexer(RSELexer(cached_lexer))
+        code = 'int main() { return a + b; }'
+
+        tokens = cached_lexer.lexing(code)
+        rse_tokens = rse_lexer.lexing(code)
+        posnett_tokens = posnett_lexer.lexing(code)
+
+        self.assertEqual(1, counting_lexer.calls)
+        self.assertEqual(len(tokens), len(rse_tokens))
+        self.assertEqual(rse_tokens, posnett_tokens)
+        self.assertEqual(TokenKind.PUNCTUATION, tokens[4].kind)
+        self.assertEqual(TokenKind.OPERATOR, rse_tokens[4].kind)
+        self.assertEqual(11, posnett_lexer.program_length)
+
+    def test_alternating_code_is_cached(self):
+        counting_lexer = CountingLexer()
+        cached_lexer = CachedLexer(counting_lexer)
+        code = 'int main() { return 0; } // comment'
+        code_without_comments = 'int main() { return 0; } '
+
+        for _ in range(3):
+            self.assertEqual(10, len(cached_lexer.lexing(code)))
+            self.assertEqual(9, len(cached_lexer.lexing(code_without_comments)))
+
+        self.assertEqual(2, counting_lexer.calls)
+        self.assertEqual({'hits': 4, 'misses': 2, 'size': 2, 'max_size': TokenCache.DEFAULT_MAX_SIZE},
+                         cached_lexer.cache.stats())
+
+    def test_shared_cache(self):
+        counting_lexer = CountingLexer()
+        cache = TokenCache()
+        CachedLexer(counting_lexer, cache).lexing('int a;')
+        CachedLexer(counting_lexer, cache).lexing('int a;')
+        self.assertEqual(1, counting_lexer.calls)
+        self.assertEqual(1, cache.hits)
+
+
+class TestTokenCache(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = TokenCache(max_size=2)
+        cache.put('a', [])
+        cache.put('b', [])
+        cache.get('a')
+        cache.put('c', [])
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(3, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+
+class TestTokenTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.lexer = CLangLexer()
+
+    def test_from_tokens(self):
+        tokens = list(self.lexer.lexing('int a = 1; // b\nchar* c = "d";').tokens)
+        table = TokenTable.from_tokens(tokens)
+
+        self.assertEqual(len(tokens), len(table))
+        self.assertEqual(tokens, table)
+        self.assertEqual(tokens[3], table[3])
+        self.assertEqual(tokens[2:5], list(table[2:5]))
+        self.assertIs(table, TokenTable.from_tokens(table))
+
+    def test_values_are_interned(self):
+        table = self.lexer.lexing('a = a + a;')
+        self.assertIs(table.values[0], table.values[2])
+        self.assertIs(table.values[0], table.values[4])
+
+    def test_with_kinds(self):
+        table = self.lexer.lexing('int a = 1;')
+        kinds = table.kinds.copy()
+        kinds[:] = TokenKind.OTHER.value
+        other = table.with_kinds(kinds)
+
+        self.assertIs(table.start_lines, other.start_lines)
+        self.assertEqual(TokenKind.KEYWORD, table[0].kind)
+        self.assertEqual([TokenKind.OTHER] * len(table), [token.kind for token in other])
+
+    def test_line_offsets(self):
+        table = self.lexer.lexing('int a;\n\nint b = a\n  + 1;\n')
+        offsets = table.line_offsets(4)
+
+        self.assertEqual([0, 3, 3, 7, 10], offsets.tolist())
+        self.assertIs(offsets, table.with_kinds(table.kinds).line_offsets(4))
+        self.assertEqual([1, 0, 1, 0], table.count_by_line(table.kinds == TokenKind.KEYWORD.value, 4).tolist())
+
+
+class TestLexicalOnlyCLangLexer(unittest.TestCase):
+    FIXTURES = [
+        test_analyzer.code,
+        test_analyzer.comment_range_example,
+        test_buse_weimer.CODE,
+        test_posnett.lines_test_txt,
+        test_posnett.rules_22_txt,
+        test_posnett.entropy_test_txt,
+        test_posnett.checkunusedvar_2_txt,
+        test_posnett.volume_test_code,
+        """#include <vector>
+#include "missing.h"
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+int size(std::vector<int> v) { return MAX(v.size(), 0u); }""",
+    ]
+
+    def test_same_tokens_as_full_parse(self):
+        lexer = CLangLexer()
+        lexical_lexer = CLangLexer(lexical_only=True)
+        for code in self.FIXTURES:
+            self.assertEqual(lexer.lexing(code), lexical_lexer.lexing(code))
@@ -1,10 +1,16 @@
 import os
+import tempfile
 import unittest
+from pathlib import Path
 
 import clang
 from clang.cindex import Config
 
-from code_processing.parser import ClangParser
+from code_processing.clang_index import INDEX_POOL
+from code_processing.lexer import CLangLexer
+from code_processing.parser import ClangParser, SourceFiles
+from metrics import factory
+from metrics.feature_calculator import FeatureCalculator
 
 example = """class Foo
 {
@@ -27,6 +33,13 @@ void Foo::another(int input, double & output)
   output = input * 1.2345;
 }"""
 
+# Tokens after tabs and in multi-line comments
+tabbed_example = """void scale(int input, double & output)
+{
+\toutput = input * 1.2345; /* multi
+\t  line */
+}"""
+
 CLANG_LIB_PATH = os.path.join(os.path.dirname(os.path.realpath(clang.__file__)), 'native')
 Config.set_library_path(CLANG_LIB_PATH)
 
@@ -40,3 +53,67 @@ class TestClangParser(unittest.TestCase):
         methods = self.parser.extract_methods()
         self.assertEqual(2, len(methods), "There must be 2 methods")
         self.assertEqual('another', methods[1].name, "There must be 2 methods")
+
+    def test_extract_methods_lines(self):
+        methods = self.parser.extract_methods()
+        self.assertEqual([(11, 14), (16, 20)], [(method.start_line, method.end_line) for method in methods])
+        self.assertEqual([None, None], [method.file for method in methods])
+
+    def test_extract_methods_tokens(self):
+        lexer = CLangLexer(lexical_only=True)
+        tabbed_parser = ClangParser(clang_args=['-x', 'c++'])
+        tabbed_parser.parsing(tabbed_example)
+        for method in self.parser.extract_methods() + tabbed_parser.extract_methods():
+            self.assertEqual(lexer.lexing(method.content), method.tokens)
+            code = FeatureCalculator.expand_tabs(method.content)
+            self.assertEqual(lexer.lexing(code), method.tokens.expand_tabs(method.content, 4))
+
+    def test_method_is_not_lexed_again(self):
+        method = self.parser.extract_methods()[1]
+        translation_units_created = INDEX_POOL.translation_units_created
+        calculators = factory.get_all_feature_calculators(method.content, 'cpp', tokens=method.tokens)
+        calculators['BW AVG keywords'].calculate_metric()
+        calculators['Dorn DFT Keywords'].calculate_metric()
+        self.assertEqual(translation_units_created, INDEX_POOL.translation_units_created)
+
+
+class TestSourceFiles(unittest.TestCase):
+    HEADER = """struct Point {
+    int norm() const
+    {
+        return 1;
+    }
+};
+"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name).resolve()
+        self.header = self.dir / 'point.h'
+        self.header.write_text(self.HEADER)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def extract_methods(self, sources: SourceFiles, unit: int):
+        parser = ClangParser(clang_args=['-x', 'c++', f'-I{self.dir}'])
+        parser.parsing('#include "point.h"\n' + example)
+        return [(method.name, method.file) for method in parser.extract_methods(sources, unit)]
+
+    def test_header_is_extracted_once(self):
+        header_method = ('norm', str(self.header))
+        sources = SourceFiles.below(self.dir)
+        self.assertIn(header_method, self.extract_methods(sources, 1))
+        # An earlier translation unit takes over the header
+        self.assertIn(header_method, self.extract_methods(sources, 0))
+        self.assertNotIn(header_method, self.extract_methods(sources, 2))
+        self.assertTrue(sources.is_owner(str(self.header), 0))
+        self.assertFalse(sources.is_owner(str(self.header), 1))
+
+    def test_files_of_interest(self):
+        self.assertEqual(
+            [('bar', None), ('another', None)],
+            self.extract_methods(SourceFiles(lambda path: False), 0),
+        )
+        self.assertNotIn(('norm', str(self.header)), self.extract_methods(SourceFiles.below(self.dir / 'other'), 0))
+
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from code_processing.parser import ClangParser
+from code_processing.precompiled_header import PrecompiledHeader, find_included_headers
+
+HEADER = """#pragma once
+struct Point {
+    int x;
+    int norm() const
+    {
+        return x * x;
+    }
+};
+"""
+
+SOURCE = """#include "common.h"
+#include "missing.h"
+struct Foo {
+    int bar(const Point& p);
+};
+
+int Foo::bar(const Point& p)
+{
+    return p.norm() + 1;
+}
+"""
+
+
+class TestPrecompiledHeader(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name).resolve()
+        (self.dir / 'include').mkdir()
+        (self.dir / 'include' / 'common.h').write_text(HEADER)
+        self.cpp_files = [self.dir / 'a.cpp', self.dir / 'b.cpp', self.dir / 'c.cpp']
+        self.cpp_files[0].write_text(SOURCE)
+        self.cpp_files[1].write_text(SOURCE.replace('Foo', 'Bar'))
+        self.cpp_files[2].write_text('int main() { return 0; }\n')
+        self.include_paths = [self.dir / 'include']
+        self.clang_args = ['-x', 'c++', f'-I{self.dir / "include"}']
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_find_included_headers(self):
+        self.assertEqual(
+            [self.dir / 'include' / 'common.h'],
+            find_included_headers(self.cpp_files[0], self.include_paths),
+        )
+
+    def test_create(self):
+        pch = PrecompiledHeader.create(self.cpp_files, self.include_paths)
+        self.assertEqual([self.dir / 'include' / 'common.h'], pch.headers)
+        self.assertEqual(set(self.cpp_files[:2]), pch.cpp_files)
+        self.assertEqual([], pch.get_clang_args(self.cpp_files[2]))
+        pch.dispose()
+
+        self.assertIsNone(PrecompiledHeader.create(self.cpp_files[1:], self.include_paths))
+
+    def test_same_methods(self):
+        pch = PrecompiledHeader.create(self.cpp_files, self.include_paths)
+        self.assertTrue(pch.build(self.clang_args))
+        self.assertIn(str(self.dir / 'include' / 'common.h'), pch.included_files)
+
+        plain_parser = ClangParser(self.clang_args)
+        plain_parser.parsing(SOURCE)
+        pch_parser = ClangParser(self.clang_args + pch.get_clang_args(self.cpp_files[0]))
+        pch_parser.parsing(SOURCE)
+        self.assertEqual(plain_parser.extract_methods(), pch_parser.extract_methods())
+        pch.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,3 +24,8 @@ class TestRSELexer(unittest.TestCase):
 
         self.assertEqual('::', tokens[-6].value)
         self.assertEqual('->', tokens[12].value)
+
+    def test_transform_table(self):
+        code = 'int main() { int a = 1 + 2; /* c */ return a->b ? "s" : 0x1; }'
+        table = self.lexer.lexer.lexing(code)
+        self.assertEqual(list(self.lexer.transform(table)), self.lexer.transform_table(table))
@@ -1,9 +1,11 @@
 import unittest
+from unittest import mock
 
 from code_processing.analyzer import CppCodeAnalyzer
 from code_processing.lexer import Token, TokenKind, Location, CLangLexer
 from metrics import buse_weimer
 from metrics.buse_weimer import Aggregation
+from metrics.snippet_context import SnippetContext
 
 CODE = """int main() {
     /*
@@ -527,3 +529,28 @@ class TestPeriodBWFC(unittest.TestCase):
         fc = buse_weimer.PeriodBWFC(
             aggregation=Aggregation.AVG, analyzer=ANALYZER, code=CODE, lexer=CLangLexer())
         self.assertEqual(1 / 11., fc.calculate_metric())
+
+
+class TestLineMatrix(unittest.TestCase):
+    def test_line_matrix(self):
+        code = ANALYZER.delete_comments(CODE)
+        lines = code.splitlines(keepends=True)
+        matrix = buse_weimer.LineMatrix(lines, CLangLexer().lexing(code), tab_size=4)
+        self.assertEqual((len(lines), len(buse_weimer.LineMatrix.CATEGORIES)), matrix.counts.shape)
+        self.assertEqual([0, 0, 1, 1, 0, 0, 0, 0, 1, 0, 0], matrix.column('assignment').tolist())
+        self.assertEqual([0, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0], matrix.column('comparison').tolist())
+        self.assertEqual(len(lines[4]) - len(lines[4].lstrip(' ')), matrix.indentations[4])
+        self.assertEqual(len(lines[4].strip('\n')), matrix.lengths[4])
+
+    def test_shared_matrix(self):
+        context = SnippetContext()
+        lexer = CLangLexer()
+        fcs = [
+            cls(ANALYZER, aggregation, CODE, lexer, context=context)
+            for cls in [buse_weimer.KeywordBWFC, buse_weimer.SpaceBWFC]
+            for aggregation in Aggregation
+        ]
+        with mock.patch.object(buse_weimer, 'LineMatrix', wraps=buse_weimer.LineMatrix) as line_matrix:
+            for fc in fcs:
+                fc.calculate_metric()
+        line_matrix.assert_called_once()
@@ -1,9 +1,12 @@
 import unittest
 
+import numpy as np
+
 from code_processing.analyzer import CppCodeAnalyzer
 from code_processing.lexer import CLangLexer, TokenKind
 from code_processing.rse_lexer import RSELexer
 from metrics import dorn
+from metrics.snippet_context import SnippetContext
 
 
 class TestCharactersAlignment(unittest.TestCase):
@@ -81,6 +84,35 @@ class TestVisualFeatureCalculator(unittest.TestCase):
             [4, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
         ])
 
+    def test_color_raster(self):
+        context = SnippetContext()
+        fc = dorn.VisualFeatureCalculator(code=self.code, lexer=self.lexer, context=context)
+        other_fc = dorn.VisualFeatureCalculator(code=self.code, lexer=self.lexer, context=context)
+        self.assertEqual(np.uint8, fc.color_raster.dtype)
+        self.assertEqual((7, 26), fc.color_raster.shape)
+        self.assertIs(fc.color_raster, other_fc.color_raster)
+
+    def test_color_raster_of_non_ascii_code(self):
+        # The columns of the tokens count bytes, the raster counts characters
+        code = 'int f()\n{\n    return g("äöüäöü"); /* ä\n     ö */\n}\n'
+        ascii_code = code.replace('ä', 'a').replace('ö', 'o').replace('ü', 'u')
+        fc = dorn.VisualFeatureCalculator(code=code, lexer=self.lexer)
+        ascii_fc = dorn.VisualFeatureCalculator(code=ascii_code, lexer=self.lexer)
+        np.testing.assert_array_equal(ascii_fc.color_raster, fc.color_raster)
+        self.assertEqual(
+            dorn.ColorsAreas(kind=TokenKind.KEYWORD, code=ascii_code, lexer=self.lexer).calculate_metric(),
+            dorn.ColorsAreas(kind=TokenKind.KEYWORD, code=code, lexer=self.lexer).calculate_metric(),
+        )
+
+    def test_area_counts(self):
+        fc = dorn.VisualFeatureCalculator(code='int a;  \n\n  b;', lexer=self.lexer)
+        area_counts = fc.area_counts
+        # The trailing spaces and the blank line are not part of the area
+        self.assertEqual(10, area_counts.sum())
+        self.assertEqual(3, area_counts[0])
+        self.assertEqual(3, area_counts[TokenKind.KEYWORD.value])
+        self.assertEqual(2, area_counts[TokenKind.IDENTIFIER.value])
+
 
 class TestColorsAreas(unittest.TestCase):
     def setUp(self):
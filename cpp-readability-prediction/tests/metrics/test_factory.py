@@ -0,0 +1,67 @@
+import sys
+import unittest
+from unittest import mock
+
+from metrics import factory, posnett, tc
+from metrics.catalogue import Cost, Input
+
+CODE = """int main()
+{
+\t// Comment
+\treturn 0;
+}"""
+
+
+class TestFactory(unittest.TestCase):
+    def test_get_all_metrics(self):
+        metrics = factory.get_all_metrics()
+        self.assertEqual(109, len(metrics))
+        self.assertEqual(
+            ['Posnett lines', 'Posnett entropy', 'Posnett volume'],
+            [name for name in metrics if name.startswith('Posnett')],
+        )
+        self.assertEqual(list(factory.get_all_feature_calculators(CODE, 'cpp')), metrics)
+
+    def test_catalogue(self):
+        calculators = factory.get_all_feature_calculators(CODE, 'cpp')
+        for name, feature in factory.FEATURES.items():
+            fc = calculators[name]
+            # Some calculators name their feature with a method
+            self.assertEqual(name, fc.name() if callable(fc.name) else fc.name)
+            self.assertEqual(sys.modules[type(fc).__module__].FAMILY, feature.family)
+
+    def test_only_requested_features(self):
+        calculators = factory.get_all_feature_calculators(CODE, 'cpp')
+        with mock.patch.object(tc, 'TextualCoherenceFC') as tc_class:
+            fc = calculators['Posnett volume']
+            self.assertIs(fc, calculators['Posnett volume'])
+            self.assertIsInstance(fc, posnett.PosnettVolumeFC)
+            fc.calculate_metric()
+            tc_class.assert_not_called()
+        self.assertEqual(['Posnett volume'], list(calculators._calculators))
+
+    def test_unknown_feature(self):
+        with self.assertRaises(KeyError):
+            factory.get_all_feature_calculators(CODE, 'cpp')['Unknown']
+
+    def test_plan(self):
+        groups = factory.plan(['Text Coherence MIN', 'BW AVG keywords', 'Text Coherence MAX', 'BW MAX keywords',
+                               'Posnett lines', 'BW AVG blank lines'])
+        self.assertEqual(
+            [['BW AVG keywords', 'BW MAX keywords'], ['Posnett lines', 'BW AVG blank lines'],
+             ['Text Coherence MIN', 'Text Coherence MAX']],
+            [[feature.name for feature in group.features] for group in groups],
+        )
+        self.assertEqual(frozenset({Input.LINES}), groups[1].inputs)
+        self.assertEqual(Cost.HIGH, groups[2].cost)
+
+    def test_calculate(self):
+        names = ['Text Coherence MIN', 'Posnett lines', 'BW AVG keywords']
+        values = factory.get_all_feature_calculators(CODE, 'cpp').calculate(names)
+        self.assertEqual(names, list(values))
+        calculators = factory.get_all_feature_calculators(CODE, 'cpp')
+        self.assertEqual({name: calculators[name].calculate_metric() for name in names}, values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from code_processing.analyzer import CppCodeAnalyzer
+from code_processing.lexer import CLangLexer
+from metrics import buse_weimer, factory
+from metrics.snippet_context import SnippetContext
+
+CODE = """int main()
+{
+\t// Comment
+\treturn 0;
+}"""
+
+
+class TestSnippetContext(unittest.TestCase):
+    def test_memoize(self):
+        context = SnippetContext()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return [1]
+
+        self.assertIs(context.memoize(('view', CODE), compute), context.memoize(('view', CODE), compute))
+        self.assertEqual(1, len(calls))
+        context.memoize(('view', 'other code'), compute)
+        self.assertEqual(2, len(calls))
+
+    def test_shared_views(self):
+        context = SnippetContext()
+        analyzer = CppCodeAnalyzer()
+        lexer = CLangLexer()
+        fc = buse_weimer.LineLengthBWFC(analyzer, buse_weimer.Aggregation.MAX, CODE, lexer, context=context)
+        other_fc = buse_weimer.SpaceBWFC(analyzer, buse_weimer.Aggregation.AVG, CODE, lexer, context=context)
+        self.assertEqual(CODE.replace('\t', '    '), fc.code_with_comments)
+        self.assertIs(fc.code, other_fc.code)
+        self.assertIs(fc.lines, other_fc.lines)
+        self.assertIs(fc.tokens, other_fc.tokens)
+
+    def test_reassigned_code(self):
+        fc = buse_weimer.AvgBlankLineBWFC(code=CODE, lexer=CLangLexer())
+        self.assertEqual(0., fc.calculate_metric())
+        fc.code = 'int a;\n\nint b;'
+        self.assertEqual(['int a;\n', '\n', 'int b;'], fc.lines)
+
+    def test_same_metrics(self):
+        calculators = factory.get_all_feature_calculators(CODE, 'cpp')
+        for name, fc in calculators.items():
+            # A calculator with its own context computes the same metric
+            fc.context = SnippetContext()
+            own_value = fc.calculate_metric()
+            self.assertEqual(own_value, factory.get_all_feature_calculators(CODE, 'cpp')[name].calculate_metric(), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
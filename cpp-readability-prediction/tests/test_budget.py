@@ -0,0 +1,68 @@
+import os
+import time
+import unittest
+
+from budget import Budget, BudgetedPool
+
+
+def square(x: int) -> int:
+    if x < 0:
+        # Blows up the budget
+        time.sleep(60)
+    elif x == 0:
+        # Crashes the worker
+        os._exit(3)
+    elif x == 5:
+        raise ValueError('five')
+    return x * x
+
+
+# Memory held by a worker
+_allocated = []
+
+
+def allocate(megabytes: int) -> int:
+    # Filled, so that the memory is resident
+    _allocated.append(b'x' * megabytes * 1024 * 1024)
+    # Long enough for the budget to be checked
+    time.sleep(0.5)
+    return megabytes
+
+
+class TestBudgetedPool(unittest.TestCase):
+    def test_imap(self):
+        pool = BudgetedPool(square, Budget(time_limit=1.0), workers=2)
+        results = list(pool.imap([1, -1, 2, 0, 3, 5]))
+
+        self.assertEqual(list(range(6)), [result.index for result in results])
+        self.assertEqual([1, None, 4, None, 9, None], [result.value for result in results])
+        self.assertEqual([False, True, False, False, False, False], [result.over_budget for result in results])
+        self.assertIn('exit code 3', results[3].error)
+        self.assertEqual('ValueError: five', results[5].error)
+
+    def test_imap_unordered(self):
+        pool = BudgetedPool(square, Budget(time_limit=1.0), workers=2)
+        results = list(pool.imap([-1, 2, 3], ordered=False))
+
+        self.assertEqual(0, results[-1].index)
+        self.assertCountEqual([0, 1, 2], [result.index for result in results])
+
+    def test_memory_limit(self):
+        # The memory of the warm-up does not count to the budget of a task
+        pool = BudgetedPool(allocate, Budget(memory_limit=16.0), initializer=allocate, initargs=(32,))
+        results = list(pool.imap([1, 64, 2]))
+
+        self.assertEqual([1, None, 2], [result.value for result in results])
+        self.assertEqual([False, True, False], [result.over_budget for result in results])
+
+    def test_memory_limit_per_task(self):
+        # The worker keeps the memory of every task, together they exceed the budget of a single task
+        pool = BudgetedPool(allocate, Budget(memory_limit=16.0))
+        results = list(pool.imap([8, 8, 8, 8]))
+
+        self.assertEqual([8, 8, 8, 8], [result.value for result in results])
+        self.assertEqual([False] * 4, [result.over_budget for result in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import crawl_cmd
+from code_processing.parser import SourceFiles
+from manifest import Manifest
+
+SHAPE_HEADER = """#pragma once
+struct Shape {
+    int w, h;
+    int area() const
+    {
+        return w * h;
+    }
+};
+"""
+
+
+class TestParseFiles(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cpp_files = []
+        for i in range(6):
+            path = Path(cls.directory.name) / f'file{i}.cpp'
+            methods = '\n'.join(f'int A{i}::f{j}() {{\n  return {j};\n}}' for j in range(i + 1))
+            path.write_text(f'class A{i} {{\n' + ''.join(f'  int f{j}();\n' for j in range(i + 1)) + '};\n' + methods)
+            cls.cpp_files.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_parse_threads_keep_order(self):
+        expected = list(crawl_cmd.parse_files(self.cpp_files, ['-x', 'c++']))
+        actual = list(crawl_cmd.parse_files(self.cpp_files, ['-x', 'c++'], parse_threads=3))
+
+        self.assertEqual(self.cpp_files, [cpp_file for cpp_file, _, _ in actual])
+        self.assertEqual(
+            [[(method.name, method.content) for method in methods] for _, _, methods in expected],
+            [[(method.name, method.content) for method in methods] for _, _, methods in actual],
+        )
+        self.assertEqual([i + 1 for i in range(6)], [len(methods) for _, _, methods in actual])
+
+
+class TestPrecompiledHeader(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name).resolve()
+        (self.root / 'src').mkdir()
+        (self.root / 'src' / 'shape.h').write_text(SHAPE_HEADER)
+        self.cpp_files = [self.root / 'src' / 'a.cpp', self.root / 'src' / 'b.cpp']
+        for i, cpp_file in enumerate(self.cpp_files):
+            cpp_file.write_text(f'#include "shape.h"\nint twice{i}(const Shape& s)\n{{\n    return 2 * s.area();\n}}\n')
+        self.clang_args = ['-x', 'c++', f'-I{self.root}']
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def parse_methods(self, pch=None):
+        files = crawl_cmd.parse_files(self.cpp_files, self.clang_args, pch=pch, sources=SourceFiles.below(self.root))
+        return [[(method.name, method.content) for method in methods] for _, _, methods in files]
+
+    def test_quoted_includes_with_and_without_pch(self):
+        pch = crawl_cmd.create_precompiled_header(self.cpp_files, self.root, self.clang_args)
+        self.assertIsNotNone(pch)
+        self.addCleanup(pch.dispose)
+
+        methods = self.parse_methods()
+        self.assertIn('area', [name for name, _ in methods[0]])
+        self.assertEqual(methods, self.parse_methods(pch))
+
+
+class TestIncrementalParseFiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name).resolve()
+        (self.root / 'h.h').write_text('#pragma once\nstruct H {\n    int f()\n    {\n        return 1;\n    }\n};\n')
+        self.cpp_files = [self.root / 'a.cpp', self.root / 'b.cpp']
+        for i, cpp_file in enumerate(self.cpp_files):
+            cpp_file.write_text(f'#include "h.h"\nint g{i}()\n{{\n    return H().f();\n}}\n')
+        self.manifest_path = self.root / 'output.manifest.json'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def parse_methods(self, parse_threads: int = 1):
+        manifest = Manifest.load(self.manifest_path)
+        clang_args = ['-x', 'c++', f'-I{self.root}']
+        files = crawl_cmd.parse_files(
+            self.cpp_files, clang_args, parse_threads, manifest, sources=SourceFiles.below(self.root),
+        )
+        methods = [(cpp_file.name, method.name) for cpp_file, _, file_methods in files for method in file_methods]
+        manifest.save()
+        return methods
+
+    def test_header_is_taken_over_from_changed_file(self):
+        for parse_threads in (1, 2):
+            with self.subTest(parse_threads=parse_threads):
+                self.manifest_path.unlink(missing_ok=True)
+                self.cpp_files[0].write_text('#include "h.h"\n')
+                self.assertEqual([('a.cpp', 'f')], self.parse_methods(parse_threads))
+                # The other file is unchanged, but now it owns the header
+                self.cpp_files[0].write_text('int a;\n')
+                self.assertEqual([('b.cpp', 'f')], self.parse_methods(parse_threads))
+                self.assertEqual([('b.cpp', 'f')], self.parse_methods(parse_threads))
+                # The changed file takes the header back
+                self.cpp_files[0].write_text('#include "h.h"\n')
+                self.assertEqual([('a.cpp', 'f')], self.parse_methods(parse_threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from git_diff import FileChange, get_changes, is_touched, parse_diff, show_file
+
+
+class TestGitDiff(unittest.TestCase):
+    DIFF = '\n'.join([
+        'diff --git a/a.cpp b/a.cpp',
+        'index 1111111..2222222 100644',
+        '--- a/a.cpp',
+        '+++ b/a.cpp',
+        '@@ -3 +3,2 @@ int f()',
+        '-    return 1;',
+        '+    int x = 1;',
+        '+    return x;',
+        '@@ -10,2 +10,0 @@ int g()',
+        '-    a();',
+        '-    b();',
+        'diff --git a/new.cpp b/new.cpp',
+        'new file mode 100644',
+        '--- /dev/null',
+        '+++ b/new.cpp',
+        '@@ -0,0 +1 @@',
+        '+int x;',
+        'diff --git a/old.cpp b/renamed.cpp',
+        'similarity index 100%',
+        'rename from old.cpp',
+        'rename to renamed.cpp',
+    ])
+
+    def test_parse_diff(self):
+        self.assertEqual([
+            FileChange('a.cpp', 'a.cpp', [(3, 1), (10, 2)], [(3, 2), (10, 0)]),
+            FileChange(None, 'new.cpp', [(0, 0)], [(1, 1)]),
+        ], parse_diff(self.DIFF))
+
+    def test_is_touched(self):
+        self.assertTrue(is_touched(1, 5, [(3, 2)]))
+        self.assertTrue(is_touched(4, 8, [(3, 2)]))
+        self.assertFalse(is_touched(5, 8, [(3, 2)]))
+        self.assertFalse(is_touched(1, 2, [(3, 2)]))
+        # Lines removed after line 10
+        self.assertTrue(is_touched(8, 12, [(10, 0)]))
+        self.assertFalse(is_touched(4, 10, [(10, 0)]))
+        self.assertFalse(is_touched(11, 12, [(10, 0)]))
+
+    def test_get_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+
+            def git(*args: str):
+                subprocess.run(
+                    ['git', '-C', temp_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                    check=True, capture_output=True,
+                )
+
+            (repo_path / 'src').mkdir()
+            (repo_path / 'src' / 'a.cpp').write_text('int a;\nint b;\nint c;\n')
+            (repo_path / 'README').write_text('readme\n')
+            git('init', '-q')
+            git('add', '.')
+            git('commit', '-q', '-m', 'base')
+            (repo_path / 'src' / 'a.cpp').write_text('int a;\nint bb;\nint c;\n')
+            (repo_path / 'README').write_text('changed\n')
+            git('commit', '-q', '-a', '-m', 'head')
+
+            self.assertEqual(
+                [FileChange('a.cpp', 'a.cpp', [(2, 1)], [(2, 1)])],
+                get_changes(repo_path / 'src', 'HEAD~1', 'HEAD', ['*.cpp']),
+            )
+            self.assertEqual('int a;\nint b;\nint c;\n', show_file(repo_path / 'src', 'HEAD~1', 'a.cpp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from manifest import Manifest
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.source = self.dir / 'a.cpp'
+        self.source.write_text('int a;')
+        self.header = self.dir / 'a.h'
+        self.header.write_text('int b;')
+        self.path = Manifest.get_path(self.dir / 'out.csv')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def record(self):
+        manifest = Manifest.load(self.path)
+        results, unchanged = manifest.lookup(self.source)
+        self.assertFalse(unchanged)
+        results['methods'] = ['a']
+        manifest.set_dependencies(self.source, [str(self.header)])
+        manifest.save()
+
+    def lookup(self):
+        return Manifest.load(self.path).lookup(self.source)
+
+    def test_get_path(self):
+        self.assertEqual(self.dir / 'out.csv.manifest.json', self.path)
+
+    def test_unchanged(self):
+        self.record()
+        self.assertEqual(({'methods': ['a']}, True), self.lookup())
+
+    def test_touched(self):
+        self.record()
+        stat = self.source.stat()
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(({'methods': ['a']}, True), self.lookup())
+
+    def test_changed(self):
+        self.record()
+        self.source.write_text('int c;')
+        self.assertEqual(({}, False), self.lookup())
+
+    def test_dependency_changed(self):
+        self.record()
+        self.header.write_text('int bb;')
+        self.assertEqual(({}, False), self.lookup())
+
+    def test_save_drops_unseen_files(self):
+        self.record()
+        manifest = Manifest.load(self.path)
+        manifest.save()
+        self.assertEqual(({}, False), self.lookup())
+
+    def test_project_results(self):
+        manifest = Manifest.load(self.path)
+        manifest.project['scores'] = {'model': {'key': 0.5}}
+        manifest.save()
+        self.assertEqual({'scores': {'model': {'key': 0.5}}}, Manifest.load(self.path).project)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from pathlib import Path
+
+from code_processing.parser import Method
+from method_index import MethodIndex
+
+
+class TestMethodIndex(unittest.TestCase):
+    def setUp(self):
+        self.cpp_file = Path('/project/a.cpp')
+        self.method = Method('bar', 'int Foo::bar()\n{\n    return 1;\n}', start_line=3, end_line=6)
+        self.header_method = Method('norm', 'int norm()\n{\n    return 0;\n}', start_line=2, end_line=5,
+                                    file='/project/point.h')
+
+    def test_key(self):
+        key = MethodIndex.key(self.method, self.cpp_file)
+        self.assertEqual(key, MethodIndex.key(
+            Method('bar', self.method.content.replace('\n', '\r\n'), start_line=3, end_line=6), self.cpp_file,
+        ))
+        # Same first line, but another method
+        self.assertNotEqual(key, MethodIndex.key(
+            Method('bar', 'int Foo::bar()\n{\n    return 2;\n}', start_line=3, end_line=6), self.cpp_file,
+        ))
+        self.assertNotEqual(key, MethodIndex.key(self.method, Path('/project/b.cpp')))
+        # The file of a header method does not depend on the parsed file
+        self.assertEqual(
+            MethodIndex.key(self.header_method, self.cpp_file),
+            MethodIndex.key(self.header_method, Path('/project/b.cpp')),
+        )
+
+    def test_add(self):
+        index = MethodIndex()
+        key = index.key(self.header_method, self.cpp_file)
+        self.assertTrue(index.add(key))
+        self.assertFalse(index.add(key))
+
+    def test_scores(self):
+        key = MethodIndex.key(self.method, self.cpp_file)
+        header_key = MethodIndex.key(self.header_method, self.cpp_file)
+        index = MethodIndex({key: 0.5, header_key: 0.25})
+        self.assertEqual(0.5, index.get_score(key))
+
+        index.add(header_key)
+        self.assertEqual(0.25, index.get_score(header_key))
+        new_key = MethodIndex.key(self.method, Path('/project/b.cpp'))
+        index.add(new_key)
+        self.assertIsNone(index.get_score(new_key))
+        index.set_score(new_key, 0.75)
+        # The scores of methods that were not added in this run are dropped
+        self.assertEqual({header_key: 0.25, new_key: 0.75}, index.get_scores())
+
+
+if __name__ == '__main__':
+    unittest.main()
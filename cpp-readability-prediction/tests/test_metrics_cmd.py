@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from nltk.corpus import wordnet as wn
+
+import metrics_cmd
+
+
+class ParentDataFile:
+    """
+    A data file of WordNet that fails when it is read by a forked child, which shares its offset with the parent.
+    """
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.pid = os.getpid()
+
+    def close(self):
+        self.data_file.close()
+
+    def __getattr__(self, name):
+        if os.getpid() != self.pid:
+            raise RuntimeError('Data file of WordNet read by a forked child')
+        return getattr(self.data_file, name)
+
+
+class TestExtractSnippetsFeatures(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        for i in range(4):
+            code = (f'int add_offset{i}(int value)\n{{\n    // add the offset {i}\n    if (value > 0) {{\n'
+                    f'        return value + {i};\n    }}\n    return 0;\n}}\n')
+            (Path(cls.directory.name) / f'snippet{i}.cpp').write_text(code)
+        # Features of an empty snippet cannot be computed
+        (Path(cls.directory.name) / 'empty.cpp').write_text('')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_workers(self):
+        path = Path(self.directory.name)
+        expected = list(metrics_cmd.extract_snippets_features(path))
+        ordered = list(metrics_cmd.extract_snippets_features(path, workers=2, chunk_size=2))
+        unordered = list(metrics_cmd.extract_snippets_features(path, workers=2, ordered=False))
+
+        self.assertEqual(expected, ordered)
+        self.assertCountEqual([result.filepath for result in expected], [result.filepath for result in unordered])
+
+    def test_failed_snippets_are_reported(self):
+        results = list(metrics_cmd.extract_snippets_features(Path(self.directory.name), workers=2))
+        failed = [result for result in results if result.error is not None]
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(['empty.cpp'], [result.filepath.name for result in failed])
+        self.assertIsNone(failed[0].features)
+        self.assertIn('ZeroDivisionError', failed[0].error)
+
+    def test_workers_forked_after_extraction(self):
+        # The parent has opened the data files of WordNet, forked workers must open their own files.
+        # WordNet caches the synsets it read, so the workers read other words than the parent and the other tests.
+        list(metrics_cmd.extract_snippets_features(Path(self.directory.name)))
+        self.assertTrue(wn._data_file_map)
+        self.addCleanup(wn._data_file_map.update, dict(wn._data_file_map))
+        for pos, data_file in wn._data_file_map.items():
+            wn._data_file_map[pos] = ParentDataFile(data_file)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            for i, (noun, verb) in enumerate([('horse', 'gallop'), ('river', 'flow'), ('garden', 'grow')]):
+                (path / f'{noun}.cpp').write_text(f'int {verb}_{noun}(int {noun})\n{{\n    return {noun} + {i};\n}}\n')
+            results = {
+                preload: list(metrics_cmd.extract_snippets_features(path, workers=2, chunk_size=1, preload=preload))
+                for preload in (False, True)
+            }
+            expected = list(metrics_cmd.extract_snippets_features(path))
+        self.assertEqual(expected, results[False])
+        self.assertEqual(expected, results[True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import readability_cmd
+import utils
+from budget import Budget, SKIPPED_ERROR
+
+
+class TestCreateBudgetedExportRows(unittest.TestCase):
+    def test_failed_snippets_are_skipped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            (path / 'snippet.cpp').write_text('int one()\n{\n    return 1;\n}\n')
+            # The readability of an empty snippet cannot be computed
+            (path / 'empty.cpp').write_text('')
+            paths = [path / 'snippet.cpp', path / 'empty.cpp']
+            rows = list(readability_cmd.create_budgeted_export_rows(
+                paths, path, utils.MODELS['open_source']['bw'], Budget(time_limit=60.0),
+            ))
+
+        self.assertEqual(['snippet.cpp', 'empty.cpp'], [row['File'] for row in rows])
+        self.assertIsInstance(rows[0]['Score'], float)
+        self.assertEqual(SKIPPED_ERROR, rows[1]['Score'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,19 @@
+import unittest
+
+import utils
+from readability.readability_calculator import PickleReadabilityCalculator
+from warmup import warm_up
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_model_is_loaded_once(self):
+        model_path = utils.MODELS['open_source']['bw']
+        self.assertGreaterEqual(warm_up(model_path), 0.0)
+        self.assertIs(
+            PickleReadabilityCalculator.load_model(model_path),
+            PickleReadabilityCalculator(model_path).loaded,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import os
 import unittest
 
+from nltk.corpus import wordnet as wn
+
 import wordnet
 
 
@@ -8,3 +11,23 @@ class TestWordnet(unittest.TestCase):
         pos, normalized_word = wordnet.get_best_pos('_must_')
         self.assertEqual('n', pos)
         self.assertEqual('must', normalized_word)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_forked_child_opens_its_own_data_files(self):
+        hypernyms = wordnet.get_hypernyms('car', 'n')
+        data_file = wn._data_file_map['n']
+        # The offset of the descriptor, which a forked child shares with its parent
+        offset = os.lseek(data_file.stream.fileno(), 0, os.SEEK_CUR)
+        pid = os.fork()
+        if pid == 0:
+            forgotten = not wn._data_file_map and data_file.closed
+            ok = forgotten and wordnet.get_hypernyms('house', 'n') and wn._data_file_map['n'] is not data_file
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(0, os.waitstatus_to_exitcode(status))
+        self.assertEqual(offset, os.lseek(data_file.stream.fileno(), 0, os.SEEK_CUR))
+        self.assertEqual(hypernyms, wordnet.get_hypernyms('car', 'n'))
+
+
+if __name__ == '__main__':
+    unittest.main()